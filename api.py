@@ -1,13 +1,31 @@
-from fastapi import FastAPI, File, Form, UploadFile
-from parser_utils import run_parser
+from typing import List
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from parser_utils import run_parser_async, PartialResultMerger
+from prompt_utils import get_merge_policies
+from upload_store import UploadStore
+from async_extractor import close_async_client
+from executor_utils import run_blocking
+from contextlib import asynccontextmanager
 import os
+import json
+import asyncio
 import uvicorn
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # LLM'e açık keep-alive bağlantıları kapatılır
+    await close_async_client()
 
-# Dosyaların kaydedileceği dizin
-UPLOAD_FOLDER = "./uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+app = FastAPI(lifespan=lifespan)
+
+# Dosyalar içerik hash'i ile ./uploads altında saklanır; aynı dosya iki kez yüklenirse tek kopya tutulur
+upload_store = UploadStore()
+
+# /api/extract-batch isteğinde aynı anda işlenecek en fazla dosya sayısı
+BATCH_MAX_PARALLEL = int(os.environ.get("BATCH_MAX_PARALLEL", 8))
 
 @app.post("/api/extract")
 async def gpt_controller(file: UploadFile = File(...), url: str = Form("https://api.openai.com/v1/chat/completions"),
@@ -16,17 +34,184 @@ async def gpt_controller(file: UploadFile = File(...), url: str = Form("https://
                          query: str = Form("*"),
                          type: str = Form("schema"),
                          schema: str = Form("*")):
-    # Dosyayı kaydet
-    file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    # Dosyayı parça parça diske yazarken hash'ini hesapla
+    file_path, file_hash = await upload_store.save(file)
 
-    # run_parser'ı çağır
-    result = run_parser(file_path, url, model=model, api_key=api_key, query=query, type=type, schema=schema)
+    # run_parser_async event loop'u bloklamadan çalışır; diğer istekler beklemez
+    with upload_store.holding(file_path):
+        result = await run_parser_async(file_path, url, model=model, api_key=api_key, query=query, type=type,
+                                        schema=schema, file_hash=file_hash, file_name=file.filename)
 
     return result
 
 
+@app.post("/api/extract-stream")
+async def stream_controller(file: UploadFile = File(...), url: str = Form("https://api.openai.com/v1/chat/completions"),
+                            model: str = Form("gpt-4o-mini"),
+                            api_key: str = Form(os.getenv('OPENAI_API_KEY')),
+                            query: str = Form("*"),
+                            type: str = Form("schema"),
+                            schema: str = Form("*")):
+    """Server-sent events: a "batch" event per completed page batch, then a "result" event.
+
+    Each batch event carries that batch's JSON and the merged result of the batches
+    received so far; the final event is the same document /api/extract returns.
+    """
+    file_path, file_hash = await upload_store.save(file)
+
+    loop = asyncio.get_running_loop()
+    batches = asyncio.Queue()
+
+    def on_batch(index, page_numbers, result):
+        loop.call_soon_threadsafe(batches.put_nowait, (index, page_numbers, result))
+
+    task = asyncio.create_task(run_parser_async(
+        file_path, url, model=model, api_key=api_key, query=query, type=type, schema=schema,
+        file_hash=file_hash, file_name=file.filename, on_batch=on_batch
+    ))
+    task.add_done_callback(lambda _: loop.call_soon_threadsafe(batches.put_nowait, None))
+    _hold_until_done(task, file_path)
+
+    async def events():
+        merger = PartialResultMerger(await run_blocking(get_merge_policies, schema))
+        try:
+            while True:
+                batch = await batches.get()
+                if batch is None:
+                    break
+                index, page_numbers, result = batch
+                parsed, merged = await run_blocking(merger.add, index, result)
+                yield _sse_event("batch", {"batch": index, "pages": page_numbers, "result": parsed, "merged": merged})
+
+            try:
+                yield _sse_event("result", task.result())
+            except Exception as e:
+                print(f"[!] {file.filename} işlenemedi: {e}")
+                yield _sse_event("error", {"error": str(e)})
+        finally:
+            # İstemci bağlantıyı kapatırsa kalan batch'ler için LLM çağrısı yapılmaz
+            task.cancel()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _hold_until_done(task, path):
+    """Keep an uploaded file out of the store's GC until the task reading it finishes or is cancelled."""
+    upload_store.hold(path)
+    task.add_done_callback(lambda _: upload_store.release(path))
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@app.post("/api/extract-batch")
+async def batch_controller(files: List[UploadFile] = File(...),
+                           url: str = Form("https://api.openai.com/v1/chat/completions"),
+                           model: str = Form("gpt-4o-mini"),
+                           api_key: str = Form(os.getenv('OPENAI_API_KEY')),
+                           query: str = Form("*"),
+                           type: str = Form("schema"),
+                           schema: str = Form("*"),
+                           parallelism: int = Form(BATCH_MAX_PARALLEL),
+                           stream: bool = Form(False)):
+    """Extract many files in one request; zip archives are expanded into their files.
+
+    Results are returned in upload order, or with stream=true written as NDJSON lines
+    in completion order. A failing file yields an "error" entry without failing the batch.
+    """
+    documents = await _store_batch_files(files)
+    if not documents:
+        raise HTTPException(status_code=400, detail="İşlenecek dosya bulunamadı")
+
+    # Dosyalar arası paralellik sınırlanır; her dosyanın batch'leri extractor içinde ayrıca sınırlıdır
+    slots = asyncio.Semaphore(max(1, min(parallelism, BATCH_MAX_PARALLEL)))
+    params = {"api_url": url, "model": model, "api_key": api_key, "query": query, "type": type, "schema": schema}
+    tasks = []
+    for index, document in enumerate(documents):
+        task = asyncio.create_task(_extract_batch_item(index, document, params, slots))
+        if "path" in document:
+            # Sırada bekleyen dosyalar da işlenene kadar temizlikten korunur
+            _hold_until_done(task, document["path"])
+        tasks.append(task)
+
+    if stream:
+        async def lines():
+            try:
+                for task in asyncio.as_completed(tasks):
+                    yield json.dumps(await task, ensure_ascii=False, default=str) + "\n"
+            finally:
+                # İstemci bağlantıyı kapatırsa kalan dosyalar için LLM çağrısı yapılmaz
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    results = await asyncio.gather(*tasks)
+    return {
+        "results": results,
+        "meta": {
+            "files": len(results),
+            "errors": sum(1 for item in results if _is_failed_item(item))
+        }
+    }
+
+
+def _is_failed_item(item):
+    """A file failed if it raised or its extraction came back with an "error" payload."""
+    result = item.get("result")
+    return "error" in item or (isinstance(result, dict) and "error" in result)
+
+
+async def _store_batch_files(files):
+    """Save the uploads; return [{"file", "path", "hash"}] or [{"file", "error"}] per document."""
+    documents = []
+    for upload in files:
+        try:
+            path, file_hash = await upload_store.save(upload)
+        except Exception as e:
+            documents.append({"file": upload.filename, "error": str(e)})
+            continue
+
+        if not (upload.filename or "").lower().endswith(".zip"):
+            documents.append({"file": upload.filename, "path": path, "hash": file_hash})
+            continue
+
+        try:
+            members = await run_blocking(upload_store.extract_archive, path)
+        except Exception as e:
+            # Bozuk, şifreli veya desteklenmeyen sıkıştırmalı arşiv yalnızca kendi kaydında hata olarak döner
+            print(f"[!] {upload.filename} arşivi açılamadı: {e}")
+            documents.append({"file": upload.filename, "error": f"Zip arşivi açılamadı: {e}"})
+            continue
+        for name, member_path, member_hash in members:
+            documents.append({"file": f"{upload.filename}/{name}", "path": member_path, "hash": member_hash})
+    return documents
+
+
+async def _extract_batch_item(index, document, params, slots):
+    item = {"index": index, "file": document["file"]}
+    if "error" in document:
+        item["error"] = document["error"]
+        return item
+
+    async with slots:
+        try:
+            result = await run_parser_async(document["path"], file_hash=document["hash"],
+                                            file_name=os.path.basename(document["file"]), **params)
+        except Exception as e:
+            print(f"[!] {document['file']} işlenemedi: {e}")
+            item["error"] = str(e)
+            return item
+
+    if isinstance(result, dict) and "error" in result and "meta" not in result:
+        item["error"] = result["error"]
+    else:
+        item["result"] = result
+    return item
+
+
 if __name__ == "__main__":
     # Uvicorn'u otomatik olarak çalıştır
-    uvicorn.run("api:app", host="127.0.0.1", port=5000, reload=True)
\ No newline at end of file
+    uvicorn.run("api:app", host="127.0.0.1", port=5000, reload=True)
@@ -0,0 +1,132 @@
+# async_extractor.py
+import os
+import time
+import asyncio
+import weakref
+
+import httpx
+
+from extractor import Extractor
+from executor_utils import run_blocking
+from http_session import CONNECT_TIMEOUT, LLM_READ_TIMEOUT, DEFAULT_POOL_SIZE
+
+# Bir API sürecinin LLM'e aynı anda açabileceği en fazla bağlantı
+ASYNC_MAX_CONNECTIONS = int(os.environ.get("ASYNC_HTTP_MAX_CONNECTIONS", 100))
+
+# Kapanan event loop'un istemcisi sözlükte tutulmaz
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Return the shared httpx.AsyncClient of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=max(DEFAULT_POOL_SIZE, ASYNC_MAX_CONNECTIONS // 2)
+            )
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_client():
+    """Close the running event loop's shared client; call on application shutdown."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+class AsyncExtractor(Extractor):
+    """Extractor whose LLM calls are non-blocking and whose CPU work runs on CPU_EXECUTOR.
+
+    Batch planning, filtering, encoding and caching are shared with Extractor; only
+    the dispatch loop and the HTTP call differ.
+    """
+
+    async def run_inference_async(self, api_url, model, api_key, input_data):
+        if not input_data or not input_data[0].get("file_path"):
+            return [], 0
+
+        self._start_run()
+        prompt = input_data[0].get("text_input", "")
+        batches, num_pages = await run_blocking(self._plan_batches, model, input_data)
+        results = await self._dispatch_batches_async(api_url, model, api_key, batches, prompt)
+        self._finish_run()
+        # Tüm sayfalar elendiyse LLM çağrısı yapılmaz
+        return results or [{}], num_pages
+
+    async def _dispatch_batches_async(self, api_url, model, api_key, batches, prompt):
+        """Async counterpart of _dispatch_batches with the same ordering and memory bounds."""
+        slots = asyncio.Semaphore(self.max_concurrency)
+        batches = iter(batches)
+        tasks = []
+        cache_hits = 0
+
+        index = 0
+        completed = False
+        try:
+            while True:
+                await slots.acquire()
+                # Bir sonraki batch'in rasterize/encode edilmesi event loop'u bloklamaz
+                batch = await run_blocking(next, batches, None)
+                if batch is None:
+                    slots.release()
+                    break
+
+                page_numbers = [page.get("page") for page in batch]
+                cache_key, cached_result = await run_blocking(self._lookup_page_cache, batch, prompt, model)
+                if cached_result is not None:
+                    slots.release()
+                    tasks.append(asyncio.ensure_future(asyncio.sleep(0, result=cached_result)))
+                    cache_hits += 1
+                    self._notify_batch(index, page_numbers, cached_result)
+                else:
+                    tasks.append(asyncio.create_task(self._call_api_cached_async(
+                        api_url, model, api_key, batch, prompt, cache_key, slots, index, page_numbers
+                    )))
+                index += 1
+
+            if self.page_cache:
+                self.stats["page_cache"] = {"hits": cache_hits, "misses": len(tasks) - cache_hits}
+
+            results = list(await asyncio.gather(*tasks))
+            completed = True
+            return results
+        finally:
+            # Sayfa üretimi hata verir ya da istek iptal edilirse başlamış çağrılar sahipsiz kalmaz
+            if not completed:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _call_api_cached_async(self, api_url, model, api_key, pages, prompt, cache_key, slots, index,
+                                     page_numbers):
+        started = time.perf_counter()
+        try:
+            result = await self._call_api_async(api_url, model, api_key, pages, prompt)
+        finally:
+            slots.release()
+        self._llm_timings.append(time.perf_counter() - started)
+        self._notify_batch(index, page_numbers, result)
+        await run_blocking(self._store_page_cache, cache_key, result)
+        return result
+
+    async def _call_api_async(self, api_url, model, api_key, pages, prompt):
+        headers, data = self._build_request(model, api_key, pages, prompt)
+        client = get_async_client()
+
+        try:
+            # 429/5xx yanıtları ve bağlantı hataları doküman bütçesi dahilinde yeniden denenir
+            response = await self.retry_policy.send_async(
+                lambda: client.post(api_url, headers=headers, json=data),
+                budget=self.retry_budget,
+                retry_exceptions=(httpx.TransportError,)
+            )
+            return self._read_response(response)
+        except Exception as e:
+            print(f"[!] API hatası: {e}")
+            return {"error": str(e)}
@@ -0,0 +1,144 @@
+# batch_planner.py
+import os
+import math
+
+# Model başına istek bütçeleri. Anahtarlar model adının önekiyle eşleştirilir (en uzun önek kazanır).
+# base_tokens/tile_tokens: 512px karo başına görüntü token maliyeti (OpenAI "high detail" hesabı).
+MODEL_BUDGETS = {
+    "default": {"max_tokens": 32000, "max_bytes": 15 * 1024 * 1024, "max_pages": 8,
+                "base_tokens": 85, "tile_tokens": 170},
+    "gpt-4o": {"max_tokens": 120000, "max_bytes": 20 * 1024 * 1024, "max_pages": 16,
+               "base_tokens": 85, "tile_tokens": 170},
+    "gpt-4o-mini": {"max_tokens": 120000, "max_bytes": 20 * 1024 * 1024, "max_pages": 16,
+                    "base_tokens": 2833, "tile_tokens": 5667},
+    "gpt-4.1": {"max_tokens": 900000, "max_bytes": 20 * 1024 * 1024, "max_pages": 16,
+                "base_tokens": 85, "tile_tokens": 170},
+}
+# Yanıt için ayrılan token payı
+OUTPUT_TOKEN_RESERVE = int(os.environ.get("BATCH_OUTPUT_TOKEN_RESERVE", 4096))
+# Ortam değişkenleri ile tüm modeller için bütçe üst sınırı verilebilir
+TOKEN_BUDGET_OVERRIDE = int(os.environ.get("BATCH_TOKEN_BUDGET", 0))
+BYTE_BUDGET_OVERRIDE = int(os.environ.get("BATCH_BYTE_BUDGET", 0))
+
+# Basit gecikme modeli: bir çağrı ≈ LATENCY_BASE + sayfa sayısı * LATENCY_PER_PAGE saniye
+LATENCY_TARGET = float(os.environ.get("BATCH_LATENCY_TARGET", 30))
+LATENCY_BASE = float(os.environ.get("BATCH_LATENCY_BASE", 2.0))
+LATENCY_PER_PAGE = float(os.environ.get("BATCH_LATENCY_PER_PAGE", 3.0))
+
+CHARS_PER_TOKEN = 4
+
+
+def get_model_budget(model):
+    model = (model or "").lower()
+    matches = [name for name in MODEL_BUDGETS if name != "default" and model.startswith(name)]
+    budget = dict(MODEL_BUDGETS[max(matches, key=len)] if matches else MODEL_BUDGETS["default"])
+    if TOKEN_BUDGET_OVERRIDE:
+        budget["max_tokens"] = min(budget["max_tokens"], TOKEN_BUDGET_OVERRIDE)
+    if BYTE_BUDGET_OVERRIDE:
+        budget["max_bytes"] = min(budget["max_bytes"], BYTE_BUDGET_OVERRIDE)
+    return budget
+
+
+def estimate_text_tokens(text):
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def estimate_image_tokens(width, height, base_tokens=85, tile_tokens=170):
+    """Estimate image tokens: fit into 2048x2048, scale the short side to 768, count 512px tiles."""
+    if not width or not height:
+        # Boyutu bilinmeyen görüntüler için A4 sayfa varsayımı (2x3 karo)
+        return base_tokens + 6 * tile_tokens
+
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return base_tokens + tiles * tile_tokens
+
+
+class BatchPlanner:
+    """Packs encoded pages into requests within a model's token, byte and page budgets."""
+
+    def __init__(self, model, prompt="", max_concurrency=1, latency_target=LATENCY_TARGET):
+        self.budget = get_model_budget(model)
+        self.prompt_tokens = estimate_text_tokens(prompt)
+        self.prompt_bytes = len(prompt.encode("utf-8"))
+        self.max_concurrency = max(1, max_concurrency)
+        self.latency_target = latency_target
+        self.pages_per_batch = self.budget["max_pages"]
+        self.stats = {"batches": 0, "pages": 0, "estimated_tokens": 0, "bytes": 0}
+
+    def page_tokens(self, page):
+        if "text" in page:
+            return estimate_text_tokens(page["text"])
+        return estimate_image_tokens(
+            page.get("width"),
+            page.get("height"),
+            self.budget["base_tokens"],
+            self.budget["tile_tokens"]
+        )
+
+    def page_bytes(self, page):
+        if "text" in page:
+            return len(page["text"].encode("utf-8"))
+        return len(page.get("data", ""))
+
+    def plan(self, num_pages):
+        """Choose how many pages to put in one request for a document of num_pages pages.
+
+        Fewer, larger calls repeat the prompt less often; more, smaller calls finish
+        sooner when they can run in parallel. The largest batch size whose estimated
+        document latency meets the latency target is chosen; if none does, the size
+        with the lowest estimated latency is used.
+        """
+        max_pages = max(1, min(self.budget["max_pages"], num_pages or 1))
+        estimates = []
+        for pages_per_batch in range(1, max_pages + 1):
+            num_batches = math.ceil(max(num_pages, 1) / pages_per_batch)
+            waves = math.ceil(num_batches / self.max_concurrency)
+            latency = waves * (LATENCY_BASE + pages_per_batch * LATENCY_PER_PAGE)
+            estimates.append((latency, pages_per_batch))
+
+        within_target = [size for latency, size in estimates if latency <= self.latency_target]
+        if within_target:
+            pages_per_batch = max(within_target)
+        else:
+            pages_per_batch = min(estimates, key=lambda item: (item[0], -item[1]))[1]
+
+        # Aynı sayıda çağrı için sayfalar batch'lere eşit dağıtılır (ör. 10 sayfa: 9+1 yerine 5+5)
+        num_batches = math.ceil(max(num_pages, 1) / pages_per_batch)
+        self.pages_per_batch = math.ceil(max(num_pages, 1) / num_batches)
+        return self.pages_per_batch
+
+    def pack(self, pages):
+        """Yield batches from an iterable of pages, in order, as soon as each batch is full."""
+        token_budget = self.budget["max_tokens"] - OUTPUT_TOKEN_RESERVE - self.prompt_tokens
+        byte_budget = self.budget["max_bytes"] - self.prompt_bytes
+
+        batch, batch_tokens, batch_bytes = [], 0, 0
+        for page in pages:
+            tokens = self.page_tokens(page)
+            size = self.page_bytes(page)
+            # Bütçeyi aşacak sayfa yeni batch'e geçer; tek başına aşan sayfa yine de kendi batch'inde gönderilir
+            if batch and (len(batch) >= self.pages_per_batch
+                          or batch_tokens + tokens > token_budget
+                          or batch_bytes + size > byte_budget):
+                yield self._close(batch, batch_tokens, batch_bytes)
+                batch, batch_tokens, batch_bytes = [], 0, 0
+            batch.append(page)
+            batch_tokens += tokens
+            batch_bytes += size
+
+        if batch:
+            yield self._close(batch, batch_tokens, batch_bytes)
+
+    def _close(self, batch, batch_tokens, batch_bytes):
+        self.stats["batches"] += 1
+        self.stats["pages"] += len(batch)
+        self.stats["estimated_tokens"] += batch_tokens + self.prompt_tokens
+        self.stats["bytes"] += batch_bytes
+        return batch
+
+    def get_stats(self):
+        return dict(self.stats, pages_per_batch=self.pages_per_batch)
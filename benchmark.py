@@ -0,0 +1,340 @@
+# benchmark.py - End-to-end throughput benchmark for the coordinator/worker pipeline
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+
+import redis
+import requests
+from pymongo import MongoClient
+from PIL import Image, ImageDraw
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+PERCENTILES = (50, 90, 95, 99)
+# coordinator.py ile aynı Redis anahtarları
+PROCESSED_COUNTER = "processed_documents_count"
+DEAD_LETTER_QUEUE = "dead_letter_documents"
+
+
+def generate_corpus(directory, documents, pdf_ratio=0.5, min_pages=1, max_pages=5, seed=0):
+    """Write synthetic invoice-like PDFs and PNGs; return [(path, page count)]."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    corpus = []
+    for index in range(documents):
+        is_pdf = rng.random() < pdf_ratio
+        num_pages = rng.randint(min_pages, max_pages) if is_pdf else 1
+        pages = [_synthetic_page(rng, index, page) for page in range(num_pages)]
+        if is_pdf:
+            path = os.path.join(directory, f"doc_{index:05d}.pdf")
+            pages[0].save(path, "PDF", resolution=150, save_all=True, append_images=pages[1:])
+        else:
+            path = os.path.join(directory, f"doc_{index:05d}.png")
+            pages[0].save(path, "PNG")
+        corpus.append((os.path.abspath(path), num_pages))
+    return corpus
+
+
+def _synthetic_page(rng, document, page):
+    # A4 @150 DPI; her sayfa farklı içerik taşır ki tekrar eden sayfa filtresi devreye girmesin
+    image = Image.new("RGB", (1240, 1754), "white")
+    draw = ImageDraw.Draw(image)
+    draw.text((80, 80), f"FATURA No: BNC{document:05d}-{page + 1}", fill="black")
+    draw.text((80, 120), f"Tarih: {rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2025", fill="black")
+    for line in range(rng.randint(10, 40)):
+        y = 200 + line * 36
+        draw.text((80, y), f"Kalem {line + 1}  Miktar {rng.randint(1, 50)}", fill="black")
+        draw.text((900, y), f"{rng.uniform(1, 5000):.2f} TL", fill="black")
+    return image
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    summary = {f"p{p}": round(values[min(len(values) - 1, int(len(values) * p / 100))], 3) for p in PERCENTILES}
+    summary["mean"] = round(sum(values) / len(values), 3)
+    summary["max"] = round(values[-1], 3)
+    summary["count"] = len(values)
+    return summary
+
+
+def redis_command_counts(client):
+    """Per-command call counts from INFO commandstats."""
+    return {name.replace("cmdstat_", ""): stats["calls"] for name, stats in client.info("commandstats").items()}
+
+
+class ProgressProbe:
+    """Counts finished documents (processed or dead-lettered) and the Redis commands it sends.
+
+    INFO commandstats is server-wide, so the probe's own polling is subtracted from the
+    reported counts with own_commands().
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = Counter()
+        self.processed_before, self.dead_before = self._read()
+
+    def _read(self):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(PROCESSED_COUNTER)
+        pipe.llen(DEAD_LETTER_QUEUE)
+        processed, dead = pipe.execute()
+        self.calls.update(("get", "llen"))
+        return int(processed or 0), dead
+
+    def progress(self):
+        """Return (processed, dead-lettered) since the probe was created."""
+        processed, dead = self._read()
+        return processed - self.processed_before, dead - self.dead_before
+
+    def start_counting(self):
+        """Forget earlier calls; the INFO that takes the "before" snapshot is counted as our own."""
+        self.calls = Counter(info=1)
+
+    def own_commands(self):
+        return dict(self.calls)
+
+
+def mongo_opcounters(client):
+    return dict(client.admin.command("serverStatus")["opcounters"])
+
+
+def counter_delta(before, after, exclude=None):
+    exclude = exclude or {}
+    delta = {key: after.get(key, 0) - before.get(key, 0) - exclude.get(key, 0) for key in after}
+    return {key: value for key, value in sorted(delta.items()) if value}
+
+
+def wait_until(check, timeout, interval=0.5, what="servis"):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if check():
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(interval)
+    raise TimeoutError(f"{what} {timeout} saniyede hazır olmadı")
+
+
+class Pipeline:
+    """Starts the mock LLM, the coordinator and N workers as subprocesses and stops them again."""
+
+    def __init__(self, args, log_dir):
+        self.args = args
+        self.log_dir = log_dir
+        self.processes = []
+        self.coordinator_url = f"http://127.0.0.1:{args.coordinator_port}"
+        self.llm_url = args.llm_url or f"http://127.0.0.1:{args.llm_port}/v1/chat/completions"
+        self.env = dict(os.environ, MONGO_URI=args.mongo_uri)
+        if not args.use_cache:
+            # Tekrarlanan koşular önbellekten dönmesin; ölçülen iş gerçek işleme olsun
+            self.env.setdefault("RESULT_CACHE_BACKEND", "none")
+            self.env.setdefault("PAGE_CACHE_BACKEND", "none")
+
+    def _spawn(self, name, command):
+        log = open(os.path.join(self.log_dir, f"{name}.log"), "w")
+        process = subprocess.Popen(command, cwd=ROOT_DIR, env=self.env, stdout=log, stderr=subprocess.STDOUT)
+        self.processes.append((name, process, log))
+        return process
+
+    def start(self):
+        args = self.args
+        if not args.llm_url:
+            command = [sys.executable, "mock_llm_server.py", "--port", str(args.llm_port),
+                       "--latency", args.llm_latency, "--latency-per-page", str(args.llm_latency_per_page),
+                       "--error-rate", str(args.llm_error_rate), "--throttle-rate", str(args.llm_throttle_rate),
+                       "--seed", str(args.seed)]
+            if args.cassette:
+                command += ["--cassette", args.cassette, "--replay-fallback"]
+            self._spawn("mock_llm", command)
+            stats_url = self.llm_url.replace("/v1/chat/completions", "/stats")
+            wait_until(lambda: requests.get(stats_url, timeout=1).ok, 30, what="Mock LLM")
+
+        self._spawn("coordinator", [sys.executable, "-m", "uvicorn", "coordinator:app",
+                                    "--host", "127.0.0.1", "--port", str(args.coordinator_port),
+                                    "--log-level", "warning"])
+        wait_until(lambda: requests.get(self.coordinator_url, timeout=1).ok, 30, what="Coordinator")
+
+        for index in range(args.workers):
+            self._spawn(f"worker_{index}", [sys.executable, "worker.py",
+                                            "--coordinator", self.coordinator_url,
+                                            "--name", f"bench-{index}",
+                                            "--api-url", self.llm_url,
+                                            "--model", args.model,
+                                            "--api-key", args.api_key])
+        wait_until(lambda: len(self.worker_ids()) >= args.workers, 60, what="Worker'lar")
+
+    def worker_ids(self):
+        status = requests.get(f"{self.coordinator_url}/api/system-status", timeout=5).json()
+        return [worker["id"] for worker in status.get("workers", []) if worker.get("name", "").startswith("bench-")]
+
+    def llm_stats(self):
+        if self.args.llm_url:
+            return None
+        try:
+            return requests.get(self.llm_url.replace("/v1/chat/completions", "/stats"), timeout=5).json()
+        except requests.RequestException:
+            return None
+
+    def stop(self):
+        try:
+            for worker_id in self.worker_ids():
+                requests.delete(f"{self.coordinator_url}/api/force-remove-worker/{worker_id}", timeout=5)
+        except requests.RequestException:
+            pass
+        for name, process, log in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+
+
+def run_benchmark(args):
+    work_dir = tempfile.mkdtemp(prefix="docparser-bench-")
+    corpus_dir = args.corpus_dir or os.path.join(work_dir, "corpus")
+    corpus = generate_corpus(corpus_dir, args.documents, args.pdf_ratio, args.min_pages, args.max_pages, args.seed)
+    print(f"[i] {len(corpus)} doküman, {sum(pages for _, pages in corpus)} sayfa üretildi: {corpus_dir}",
+          file=sys.stderr)
+
+    # Coordinator ve worker'lar localhost:6379 üzerindeki Redis'i kullanır
+    redis_client = redis.Redis(host="localhost", port=6379, decode_responses=True)
+    mongo_client = MongoClient(args.mongo_uri)
+    database = mongo_client["document_processing"]
+
+    pipeline = Pipeline(args, work_dir)
+    try:
+        pipeline.start()
+
+        probe = ProgressProbe(redis_client)
+        probe.start_counting()
+        redis_before = redis_command_counts(redis_client)
+        mongo_before = mongo_opcounters(mongo_client)
+
+        started = time.time()
+        enqueued_at = {}
+        for path, _ in corpus:
+            enqueued_at[path] = time.time()
+            response = requests.post(f"{pipeline.coordinator_url}/api/enqueue",
+                                     params={"file_path": path, "schema_name": args.schema}, timeout=10)
+            response.raise_for_status()
+        enqueue_seconds = time.time() - started
+
+        # Hatalı dokümanlar da sayaçta artar; deneme hakkı biten dokümanlar ise dead-letter kuyruğuna düşer
+        wait_until(lambda: sum(probe.progress()) >= len(corpus), args.timeout, interval=0.2,
+                   what="Doküman işleme")
+        wall_seconds = time.time() - started
+
+        own_commands = probe.own_commands()
+        redis_after = redis_command_counts(redis_client)
+        _, dead_lettered = probe.progress()
+        mongo_after = mongo_opcounters(mongo_client)
+        llm_stats = pipeline.llm_stats()
+    finally:
+        pipeline.stop()
+
+    paths = list(enqueued_at)
+    results = list(database["processing_results"].find({"file_path": {"$in": paths}}))
+    errors = list(database["processing_errors"].find({"file_path": {"$in": paths}}))
+
+    stages = {"end_to_end": [], "queue_wait": [], "parse": [], "inference": [], "llm_call_total": [],
+              "merge": []}
+    pages = 0
+    for document in results + errors:
+        end_to_end = document["processed_at"] - enqueued_at[document["file_path"]]
+        stages["end_to_end"].append(end_to_end)
+        meta = (document.get("result") or {}).get("meta") or {}
+        pages += meta.get("num_pages", 0)
+        timings = meta.get("timings") or {}
+        if "total" in timings:
+            # İşleme dışındaki süre: kuyrukta bekleme, atanma ve sonucun yazılması
+            stages["queue_wait"].append(max(0.0, end_to_end - timings["total"]))
+            stages["parse"].append(timings["total"])
+        for stage in ("inference", "llm_call_total", "merge"):
+            if stage in timings:
+                stages[stage].append(timings[stage])
+
+    # Benchmark'ın kendi sorguları (ilerleme yoklaması, INFO) sayımdan çıkarılır
+    redis_delta = counter_delta(redis_before, redis_after, own_commands)
+    report = {
+        "config": {
+            "documents": len(corpus),
+            "workers": args.workers,
+            "model": args.model,
+            "llm": args.llm_url or {"latency": args.llm_latency, "latency_per_page": args.llm_latency_per_page,
+                                    "error_rate": args.llm_error_rate, "throttle_rate": args.llm_throttle_rate},
+            "pdf_ratio": args.pdf_ratio,
+            "pages": [args.min_pages, args.max_pages],
+            "seed": args.seed,
+            "use_cache": args.use_cache
+        },
+        "documents": len(results) + len(errors),
+        "errors": len(errors),
+        "dead_lettered": dead_lettered,
+        "pages": pages,
+        "wall_seconds": round(wall_seconds, 3),
+        "enqueue_seconds": round(enqueue_seconds, 3),
+        "docs_per_sec": round(len(corpus) / wall_seconds, 3),
+        "pages_per_sec": round(pages / wall_seconds, 3),
+        "latency": {stage: percentiles(values) for stage, values in stages.items()},
+        "redis": {"total": sum(redis_delta.values()), "commands": redis_delta},
+        "mongo": {"opcounters": counter_delta(mongo_before, mongo_after)},
+        "llm": llm_stats
+    }
+
+    if not args.keep_files:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    else:
+        print(f"[i] Loglar ve corpus: {work_dir}", file=sys.stderr)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Coordinator/worker throughput benchmark")
+    parser.add_argument("--documents", type=int, default=50, help="Number of synthetic documents")
+    parser.add_argument("--workers", type=int, default=2, help="Number of worker processes")
+    parser.add_argument("--pdf-ratio", type=float, default=0.5, help="Fraction of documents that are PDFs")
+    parser.add_argument("--min-pages", type=int, default=1, help="Minimum pages per PDF")
+    parser.add_argument("--max-pages", type=int, default=5, help="Maximum pages per PDF")
+    parser.add_argument("--corpus-dir", help="Write the corpus here instead of a temp directory")
+    parser.add_argument("--schema", default="*", help="Schema name sent with every document")
+    parser.add_argument("--model", default="gpt-4o-mini", help="Model name sent to the LLM")
+    parser.add_argument("--api-key", default="benchmark", help="API key sent to the LLM")
+    parser.add_argument("--llm-url", help="Use this chat completions URL instead of starting the mock LLM")
+    parser.add_argument("--llm-port", type=int, default=8100, help="Mock LLM port")
+    parser.add_argument("--llm-latency", default="normal:1.5,0.4", help="Mock LLM latency distribution")
+    parser.add_argument("--llm-latency-per-page", type=float, default=0.5, help="Mock LLM seconds per page")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Mock LLM 500 rate")
+    parser.add_argument("--llm-throttle-rate", type=float, default=0.0, help="Mock LLM 429 rate")
+    parser.add_argument("--cassette", help="Replay mock LLM answers from this cassette")
+    parser.add_argument("--coordinator-port", type=int, default=8000, help="Coordinator port")
+    parser.add_argument("--mongo-uri", default=os.environ.get("MONGO_URI", "mongodb://localhost:27017/"),
+                        help="MongoDB URI used by the coordinator")
+    parser.add_argument("--use-cache", action="store_true", help="Keep result and page caches enabled")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for the corpus to finish")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for corpus and mock LLM")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--keep-files", action="store_true", help="Keep corpus and process logs")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,51 @@
 # coordinator.py
 import os
 import time
-import redis
-from redis import ConnectionPool
+import asyncio
+import redis.asyncio as redis
+from redis.asyncio import BlockingConnectionPool
 import json
 import uuid
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, File, UploadFile, Form, BackgroundTasks, HTTPException, Request
 from pydantic import BaseModel
 import uvicorn
 from pathlib import Path
 from enum import Enum
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient
 
 # Add MongoDB connection setup after Redis setup
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/")
-mongo_client = MongoClient(MONGO_URI)
+# Async clients keep Redis/Mongo round trips from blocking the event loop for other requests
+mongo_client = AsyncMongoClient(MONGO_URI)
 documents_db = mongo_client["document_processing"]
 results_collection = documents_db["processing_results"]
 errors_collection = documents_db["processing_errors"]
 
-app = FastAPI(title="Document Processing Coordinator")
+@asynccontextmanager
+async def lifespan(app):
+    # Kira toplayıcı ve kuyruk bildirimi dinleyicisi uygulama ömrü boyunca çalışır
+    tasks = [asyncio.create_task(lease_reaper()), asyncio.create_task(queue_events_listener())]
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await redis_client.aclose()
+        await mongo_client.close()
+
+
+app = FastAPI(title="Document Processing Coordinator", lifespan=lifespan)
 
-# Initialize connection pool
-REDIS_POOL = ConnectionPool(
+# Initialize connection pool; shared by all requests, which wait for a free connection instead of failing
+REDIS_POOL = BlockingConnectionPool(
     host="localhost",
     port=6379,
     db=0,
     decode_responses=True,
     max_connections=20,  # Higher for coordinator as it handles more connections
+    timeout=5,
     socket_timeout=5,
     socket_connect_timeout=2
 )
@@ -37,12 +55,181 @@ redis_client = redis.Redis(connection_pool=REDIS_POOL)
 
 # Constants remain the same
 DOCUMENT_QUEUE = "document_queue"
-PROCESSING_SET = "processing_documents"
+INFLIGHT_DOCUMENTS = "inflight_documents"  # hash: document id -> document JSON
+INFLIGHT_WORKERS = "inflight_workers"  # hash: document id -> worker id
+DOCUMENT_LEASES = "document_leases"  # zset: document id -> lease deadline
+DOCUMENT_ATTEMPTS = "document_attempts"  # hash: document id -> expired leases so far
+DEAD_LETTER_QUEUE = "dead_letter_documents"
 PROCESSED_COUNTER = "processed_documents_count"
 ERROR_COUNTER = "error_documents_count"
 WORKERS_SET = "active_workers"
-WORKER_HEARTBEAT_TIMEOUT = 30
+# Bir belgenin kirası son heartbeat'ten bu kadar saniye sonra dolar
+WORKER_HEARTBEAT_TIMEOUT = float(os.environ.get("WORKER_HEARTBEAT_TIMEOUT", 30))
+# Kirası bu kadar kez dolan belge kuyruğa dönmez, dead-letter listesine taşınır
+DOCUMENT_MAX_ATTEMPTS = int(os.environ.get("DOCUMENT_MAX_ATTEMPTS", 3))
+LEASE_REAPER_INTERVAL = float(os.environ.get("LEASE_REAPER_INTERVAL", 5))
+LEASE_REAPER_BATCH = 100
+# Boş kuyrukta next-document isteği bir belge gelene ya da bu süre dolana kadar bekler (long-poll)
+NEXT_DOCUMENT_WAIT = float(os.environ.get("NEXT_DOCUMENT_WAIT", 20))
+NEXT_DOCUMENT_MAX_WAIT = float(os.environ.get("NEXT_DOCUMENT_MAX_WAIT", 60))
+# Kuyruğa belge eklendiğinde diğer coordinator süreçlerindeki bekleyen istekleri uyandırır
+DOCUMENTS_QUEUED_CHANNEL = "documents_queued"
+QUEUE_EVENTS_RETRY = 5  # seconds
+PROCESS_ID = uuid.uuid4().hex
 SCHEMAS_SET = "available_schemas"
+SCHEMA_VERSION_COUNTER = "schema_version"
+SCHEMA_UPDATES_CHANNEL = "schema_updates"  # prompt_utils.SchemaCache listens here
+
+# Claim and completion are single Redis scripts: one round trip, no scan over in-flight documents
+CLAIM_DOCUMENT_LUA = """
+-- KEYS: queue, inflight, inflight workers, leases, workers set, worker hash
+-- ARGV: worker id, now, lease deadline
+if redis.call('SISMEMBER', KEYS[5], ARGV[1]) == 0 then
+    return {'unregistered'}
+end
+redis.call('HSET', KEYS[6], 'last_heartbeat', ARGV[2])
+local state = redis.call('HGET', KEYS[6], 'status')
+if state == 'stopped' or state == 'error' or state == 'removing' then
+    return {'inactive', state}
+end
+local item = redis.call('RPOP', KEYS[1])
+if not item then
+    return {'empty'}
+end
+local document_id = cjson.decode(item)['id']
+redis.call('HSET', KEYS[2], document_id, item)
+redis.call('HSET', KEYS[3], document_id, ARGV[1])
+redis.call('ZADD', KEYS[4], ARGV[3], document_id)
+redis.call('HSET', KEYS[6], 'status', 'processing', 'current_document', document_id)
+return {'assigned', item}
+"""
+
+COMPLETE_DOCUMENT_LUA = """
+-- KEYS: inflight, inflight workers, leases, workers set, worker hash, processed counter, error counter, attempts
+-- ARGV: worker id, document id, is_error (1/0)
+if redis.call('SISMEMBER', KEYS[4], ARGV[1]) == 0 then
+    return -1
+end
+-- Kirası dolup başka bir worker'a geçmiş ya da zaten tamamlanmış belgeye dokunulmaz
+if redis.call('HGET', KEYS[2], ARGV[2]) ~= ARGV[1] then
+    return 0
+end
+redis.call('HDEL', KEYS[1], ARGV[2])
+redis.call('HDEL', KEYS[2], ARGV[2])
+redis.call('ZREM', KEYS[3], ARGV[2])
+redis.call('HDEL', KEYS[8], ARGV[2])
+redis.call('HSET', KEYS[5], 'status', 'idle', 'current_document', '')
+redis.call('INCR', KEYS[6])
+redis.call('HINCRBY', KEYS[5], 'processed_documents', 1)
+if ARGV[3] == '1' then
+    redis.call('INCR', KEYS[7])
+    redis.call('HINCRBY', KEYS[5], 'errors', 1)
+end
+return 1
+"""
+
+# Heartbeat yalnızca belgeyi hâlâ tutan worker'ın kirasını uzatır
+RENEW_LEASE_LUA = """
+-- KEYS: inflight workers, leases
+-- ARGV: worker id, document id, lease deadline
+if redis.call('HGET', KEYS[1], ARGV[2]) ~= ARGV[1] then
+    return 0
+end
+redis.call('ZADD', KEYS[2], 'XX', ARGV[3], ARGV[2])
+return 1
+"""
+
+REAP_LEASES_LUA = """
+-- KEYS: leases, inflight, inflight workers, queue, attempts, dead letter queue
+-- ARGV: now, max attempts, batch size
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[3]))
+local requeued, dead = 0, 0
+for _, document_id in ipairs(expired) do
+    local item = redis.call('HGET', KEYS[2], document_id)
+    redis.call('ZREM', KEYS[1], document_id)
+    redis.call('HDEL', KEYS[2], document_id)
+    redis.call('HDEL', KEYS[3], document_id)
+    if item then
+        local attempts = redis.call('HINCRBY', KEYS[5], document_id, 1)
+        if attempts >= tonumber(ARGV[2]) then
+            redis.call('HDEL', KEYS[5], document_id)
+            redis.call('LPUSH', KEYS[6], item)
+            dead = dead + 1
+        else
+            -- Kuyruğun RPOP ucuna eklenir, sıradaki claim bu belgeyi alır
+            redis.call('RPUSH', KEYS[4], item)
+            requeued = requeued + 1
+        end
+    end
+end
+return {requeued, dead, #expired}
+"""
+
+claim_document = redis_client.register_script(CLAIM_DOCUMENT_LUA)
+complete_document = redis_client.register_script(COMPLETE_DOCUMENT_LUA)
+renew_lease = redis_client.register_script(RENEW_LEASE_LUA)
+reap_leases = redis_client.register_script(REAP_LEASES_LUA)
+
+# Long-poll ile bekleyen next-document istekleri, en eskisi önce (değerler kullanılmaz)
+_document_waiters = {}
+
+
+def wake_document_waiters(count):
+    """Wake up to `count` parked next-document requests of this process, oldest first."""
+    while count > 0 and _document_waiters:
+        waiter = next(iter(_document_waiters))
+        del _document_waiters[waiter]
+        if not waiter.done():
+            waiter.set_result(True)
+            count -= 1
+
+
+def _queued_event(count):
+    return json.dumps({"origin": PROCESS_ID, "count": count})
+
+
+async def announce_documents(count):
+    """Wake waiters for `count` documents already in the queue, here and in other coordinators."""
+    await redis_client.publish(DOCUMENTS_QUEUED_CHANNEL, _queued_event(count))
+    wake_document_waiters(count)
+
+
+def _queue_events_client():
+    # Abonelik uzun süre boşta kalır; havuzdaki socket_timeout dinlemeyi keserdi
+    connection = REDIS_POOL.connection_kwargs
+    return redis.Redis(host=connection["host"], port=connection["port"], db=connection["db"],
+                       decode_responses=True, socket_connect_timeout=2, health_check_interval=30)
+
+
+async def queue_events_listener():
+    """Wake this process's waiters when another coordinator process queues documents."""
+    connected = True
+    while True:
+        client = _queue_events_client()
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(DOCUMENTS_QUEUED_CHANNEL)
+            connected = True
+            async for message in pubsub.listen():
+                event = json.loads(message["data"])
+                if event.get("origin") != PROCESS_ID:
+                    wake_document_waiters(int(event.get("count", 1)))
+            error = "abonelik sonlandı"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = e
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+        if connected:
+            print(f"[!] Kuyruk bildirimi aboneliği koptu, yeniden bağlanılacak: {error}")
+        connected = False
+        # Kopukken gelen belgeler kaçırılmış olabilir; bekleyenler kuyruğu yeniden dener
+        wake_document_waiters(len(_document_waiters))
+        await asyncio.sleep(QUEUE_EVENTS_RETRY)
+
 
 # Ensure results folder exists
 # os.makedirs(RESULTS_FOLDER, exist_ok=True)
@@ -104,13 +291,18 @@ async def enqueue_document(file_path: str, schema_name: str = None):
     if schema_name:
         document_data["schema_name"] = schema_name
 
-    # Add to queue
-    redis_client.lpush(DOCUMENT_QUEUE, json.dumps(document_data))
+    # Add to queue and announce it in one round trip; LPUSH returns the new queue length
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.lpush(DOCUMENT_QUEUE, json.dumps(document_data))
+        pipe.publish(DOCUMENTS_QUEUED_CHANNEL, _queued_event(1))
+        queue_length, _ = await pipe.execute()
+    # Yerel bekleyenler belge kuyruğa yazıldıktan sonra uyandırılır
+    wake_document_waiters(1)
 
     return {
         "status": "Document enqueued",
         "document_id": document_id,
-        "queue_position": redis_client.llen(DOCUMENT_QUEUE),
+        "queue_position": queue_length,
         "schema": schema_name if schema_name else "default"
     }
 
@@ -140,9 +332,12 @@ async def enqueue_folder(folder_path: str, schema_name: str = None):
                 document_data["schema_name"] = schema_name
 
             # Add to queue
-            redis_client.lpush(DOCUMENT_QUEUE, json.dumps(document_data))
+            await redis_client.lpush(DOCUMENT_QUEUE, json.dumps(document_data))
             enqueued += 1
 
+    if enqueued:
+        await announce_documents(enqueued)
+
     return {
         "status": "Folder documents enqueued",
         "count": enqueued,
@@ -174,8 +369,8 @@ async def register_worker(worker: WorkerRegistration):
     }
 
     # Register worker
-    redis_client.hset(f"worker:{worker_id}", mapping=worker_data)
-    redis_client.sadd(WORKERS_SET, worker_id)
+    await redis_client.hset(f"worker:{worker_id}", mapping=worker_data)
+    await redis_client.sadd(WORKERS_SET, worker_id)
 
     response = {
         "status": "Worker registered",
@@ -194,14 +389,14 @@ async def register_worker(worker: WorkerRegistration):
 @app.delete("/api/force-remove-worker/{worker_id}")
 async def force_remove_worker(worker_id: str):
     """Forcefully remove a worker from the system."""
-    if not redis_client.sismember(WORKERS_SET, worker_id):
+    if not await redis_client.sismember(WORKERS_SET, worker_id):
         return {"error": "Worker not found"}
 
     # Remove from active workers set
-    redis_client.srem(WORKERS_SET, worker_id)
+    await redis_client.srem(WORKERS_SET, worker_id)
 
     # Delete worker data
-    redis_client.delete(f"worker:{worker_id}")
+    await redis_client.delete(f"worker:{worker_id}")
 
     return {"status": "Worker forcefully removed", "worker_id": worker_id}
 
@@ -217,11 +412,19 @@ async def worker_heartbeat(request: Request):
         if not worker_id:
             return {"error": "Worker ID is required"}
 
-        if not redis_client.sismember(WORKERS_SET, worker_id):
+        if not await redis_client.sismember(WORKERS_SET, worker_id):
             return {"error": "Worker not registered"}
 
+        # Extend the lease of the document the worker is still processing
+        lease_extended = False
+        if document_id:
+            lease_extended = bool(await renew_lease(
+                keys=[INFLIGHT_WORKERS, DOCUMENT_LEASES],
+                args=[worker_id, document_id, time.time() + WORKER_HEARTBEAT_TIMEOUT]
+            ))
+
         # Get current worker state
-        current_state = redis_client.hget(f"worker:{worker_id}", "status")
+        current_state = await redis_client.hget(f"worker:{worker_id}", "status")
 
         # Handle state transitions
         if current_state == WorkerState.REMOVING:
@@ -229,7 +432,7 @@ async def worker_heartbeat(request: Request):
         elif current_state == WorkerState.STOPPED and status != WorkerState.ERROR:
             # If worker is stopped, don't update status unless it's an error report
             # Just update heartbeat
-            redis_client.hset(
+            await redis_client.hset(
                 f"worker:{worker_id}",
                 mapping={
                     "last_heartbeat": time.time()
@@ -238,7 +441,7 @@ async def worker_heartbeat(request: Request):
             return {"command": "stop"}
         else:
             # Update heartbeat and status
-            redis_client.hset(
+            await redis_client.hset(
                 f"worker:{worker_id}",
                 mapping={
                     "last_heartbeat": time.time(),
@@ -253,7 +456,10 @@ async def worker_heartbeat(request: Request):
         elif current_state == WorkerState.STOPPED:
             return {"command": "stop"}
 
-        return {"status": "Heartbeat received"}
+        response = {"status": "Heartbeat received"}
+        if document_id:
+            response["lease_extended"] = lease_extended
+        return response
     except Exception as e:
         print(f"Error processing heartbeat: {e}")
         return {"error": str(e)}
@@ -261,67 +467,85 @@ async def worker_heartbeat(request: Request):
 @app.post("/api/worker/stop/{worker_id}")
 async def stop_worker(worker_id: str):
     """Stop a worker from processing documents."""
-    if not redis_client.sismember(WORKERS_SET, worker_id):
+    if not await redis_client.sismember(WORKERS_SET, worker_id):
         return {"error": "Worker not found"}
 
     # Set worker to STOPPED state
-    redis_client.hset(f"worker:{worker_id}", "status", WorkerState.STOPPED)
+    await redis_client.hset(f"worker:{worker_id}", "status", WorkerState.STOPPED)
 
     return {"status": "Worker stopped", "worker_id": worker_id}
 
 @app.post("/api/worker/start/{worker_id}")
 async def start_worker(worker_id: str):
     """Start a stopped worker."""
-    if not redis_client.sismember(WORKERS_SET, worker_id):
+    if not await redis_client.sismember(WORKERS_SET, worker_id):
         return {"error": "Worker not found"}
 
-    current_status = redis_client.hget(f"worker:{worker_id}", "status")
+    current_status = await redis_client.hget(f"worker:{worker_id}", "status")
     if current_status not in [WorkerState.STOPPED, WorkerState.ERROR]:
         return {"error": f"Worker cannot be started from {current_status} state"}
 
     # Set worker to IDLE state
-    redis_client.hset(f"worker:{worker_id}", "status", WorkerState.IDLE)
+    await redis_client.hset(f"worker:{worker_id}", "status", WorkerState.IDLE)
 
     return {"status": "Worker started", "worker_id": worker_id}
 
-@app.get("/api/next-document/{worker_id}")
-async def get_next_document(worker_id: str):
-    """Get the next document for a worker to process."""
-    if not redis_client.sismember(WORKERS_SET, worker_id):
-        return {"error": "Worker not registered"}
-
-    # Always update heartbeat when worker requests a document
-    redis_client.hset(f"worker:{worker_id}", "last_heartbeat", time.time())
-
-    # Check worker state
-    worker_status = redis_client.hget(f"worker:{worker_id}", "status")
-    if worker_status in [WorkerState.STOPPED, WorkerState.ERROR, WorkerState.REMOVING]:
-        return {"status": "Worker is not in active state", "worker_state": worker_status}
+async def _claim_next_document(worker_id):
+    now = time.time()
+    # Registration/state check, heartbeat, dequeue and assignment happen in one script
+    return await claim_document(
+        keys=[DOCUMENT_QUEUE, INFLIGHT_DOCUMENTS, INFLIGHT_WORKERS, DOCUMENT_LEASES, WORKERS_SET,
+              f"worker:{worker_id}"],
+        args=[worker_id, now, now + WORKER_HEARTBEAT_TIMEOUT]
+    )
 
-    # Use Redis atomic operation to move item from queue to processing
-    document_data_str = redis_client.brpoplpush(DOCUMENT_QUEUE, PROCESSING_SET, timeout=1)
 
-    if not document_data_str:
+@app.get("/api/next-document/{worker_id}")
+async def get_next_document(worker_id: str, request: Request, wait: float = None):
+    """Get the next document for a worker to process.
+
+    With an empty queue the request waits up to `wait` seconds (NEXT_DOCUMENT_WAIT by default,
+    0 returns immediately) for a document to be enqueued or requeued. Parked requests run no
+    Redis commands until announce_documents wakes them.
+    """
+    wait = NEXT_DOCUMENT_WAIT if wait is None else max(0.0, min(wait, NEXT_DOCUMENT_MAX_WAIT))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    waiter = None
+    try:
+        while True:
+            # Kuyruk kontrolünden önce kaydolunur; kontrol ile bekleme arasında gelen belge kaçırılmaz
+            if waiter is None or waiter.done():
+                waiter = loop.create_future()
+                _document_waiters[waiter] = None
+
+            outcome = await _claim_next_document(worker_id)
+            if outcome[0] != "empty":
+                break
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.wait({waiter}, timeout=remaining)
+            # Bağlantısı kopan worker'a belge atanmaz
+            if await request.is_disconnected():
+                break
+    finally:
+        _document_waiters.pop(waiter, None)
+        # Kullanılmadan kalan uyandırma (ör. claim sürerken gelen) sıradaki bekleyene devredilir
+        if waiter is not None and waiter.done():
+            wake_document_waiters(1)
+
+    if outcome[0] == "unregistered":
+        return {"error": "Worker not registered"}
+    if outcome[0] == "inactive":
+        return {"status": "Worker is not in active state", "worker_state": outcome[1]}
+    if outcome[0] == "empty":
         return {"status": "No documents in queue"}
 
-    document_data = json.loads(document_data_str)
-    document_id = document_data["id"]
-
-    # Update worker state to PROCESSING
-    redis_client.hset(f"worker:{worker_id}", "status", WorkerState.PROCESSING)
-
-    # Assign document to worker
-    redis_client.hset(
-        f"document:{document_id}",
-        mapping={
-            "worker_id": worker_id,
-            "processing_started": time.time()
-        }
-    )
-
     return {
         "status": "Document assigned",
-        "document": document_data
+        "document": json.loads(outcome[1])
     }
 
 
@@ -330,20 +554,31 @@ async def document_processed(request: Request):
     # Get parameters from query params
     worker_id = request.query_params.get("worker_id")
     document_id = request.query_params.get("document_id")
-    result_data = await request.json()
 
     if not worker_id or not document_id:
         return {"error": "Missing required parameters: worker_id and document_id"}
 
-    if not redis_client.sismember(WORKERS_SET, worker_id):
-        return {"error": "Worker not registered"}
-
     # Get the result data from the request body
     try:
         result_data = await request.json()
-        is_error = result_data.get("is_error", False)
+    except Exception as e:
+        print(f"Error reading result body: {e}")
+        result_data = {}
+    is_error = bool(result_data.get("is_error", False))
+
+    # Remove from in-flight documents and update worker/system counters in one round trip
+    completed = await complete_document(
+        keys=[INFLIGHT_DOCUMENTS, INFLIGHT_WORKERS, DOCUMENT_LEASES, WORKERS_SET, f"worker:{worker_id}",
+              PROCESSED_COUNTER, ERROR_COUNTER, DOCUMENT_ATTEMPTS],
+        args=[worker_id, document_id, 1 if is_error else 0]
+    )
+    if completed == -1:
+        return {"error": "Worker not registered"}
+    if not completed:
+        # Yalnızca belgenin güncel sahibi sonucu kaydeder
+        raise HTTPException(status_code=409, detail=f"Worker does not hold the lease for document {document_id}")
 
-        # Define mongo_document before the conditional branches
+    try:
         mongo_document = {
             "worker_id": worker_id,
             "file_path": result_data.get("file_path"),
@@ -354,57 +589,22 @@ async def document_processed(request: Request):
 
         if is_error:
             # Store in errors collection
-            insert_result = errors_collection.insert_one(mongo_document)
-            redis_client.hincrby(f"worker:{worker_id}", "errors", 1)
-            redis_client.incr(ERROR_COUNTER)
+            await errors_collection.insert_one(mongo_document)
         else:
             # Store the result in MongoDB
-            insert_result = results_collection.insert_one(mongo_document)
+            await results_collection.insert_one(mongo_document)
     except Exception as e:
         print(f"Error storing result in MongoDB: {e}")
 
-    # Rest of the existing code for Redis operations...
-    # Remove from processing set
-    try:
-        processing_items = redis_client.lrange(PROCESSING_SET, 0, -1)
-        for i, item in enumerate(processing_items):
-            try:
-                item_data = json.loads(item)
-                if item_data.get("id") == document_id:
-                    redis_client.lrem(PROCESSING_SET, 1, item)
-                    break
-            except:
-                continue
-    except Exception as e:
-        print(f"Error removing from processing set: {e}")
-
-    # Update worker status
-    redis_client.hset(
-        f"worker:{worker_id}",
-        mapping={
-            "status": WorkerState.IDLE,
-            "current_document": ""
-        }
-    )
-
-    # Increment processed documents counter for system
-    redis_client.incr(PROCESSED_COUNTER)
-
-    # Increment processed documents counter for worker
-    redis_client.hincrby(f"worker:{worker_id}", "processed_documents", 1)
-
-    # Delete document from Redis after processing is complete
-    redis_client.delete(f"document:{document_id}")
-
     return {"status": "Document processed and result saved to MongoDB"}
 
 @app.get("/api/worker/{worker_id}")
 async def get_worker_status(worker_id: str):
     """Get detailed worker status."""
-    if not redis_client.sismember(WORKERS_SET, worker_id):
+    if not await redis_client.sismember(WORKERS_SET, worker_id):
         return {"error": "Worker not found"}
 
-    worker_data = redis_client.hgetall(f"worker:{worker_id}")
+    worker_data = await redis_client.hgetall(f"worker:{worker_id}")
 
     # Remove the unresponsive check
     # No longer checking for heartbeat timeout
@@ -424,15 +624,28 @@ async def get_worker_status(worker_id: str):
 @app.get("/api/system-status")
 async def get_system_status():
     """Get current system status."""
-    # Get document queue stats
-    pending_count = redis_client.llen(DOCUMENT_QUEUE)
-    processing_count = redis_client.llen(PROCESSING_SET)
-    processed_count = int(redis_client.get(PROCESSED_COUNTER) or 0)  # Get processed count
-    error_count = int(redis_client.get(ERROR_COUNTER) or 0)  # Get error count
+    # Get document queue stats and the worker list in one round trip
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.llen(DOCUMENT_QUEUE)
+        pipe.hlen(INFLIGHT_DOCUMENTS)
+        pipe.get(PROCESSED_COUNTER)
+        pipe.get(ERROR_COUNTER)
+        pipe.llen(DEAD_LETTER_QUEUE)
+        pipe.smembers(WORKERS_SET)
+        pending_count, processing_count, processed_count, error_count, dead_letter_count, worker_ids = \
+            await pipe.execute()
+    processed_count = int(processed_count or 0)  # Get processed count
+    error_count = int(error_count or 0)  # Get error count
+
     # Get worker status
+    worker_ids = list(worker_ids)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for worker_id in worker_ids:
+            pipe.hgetall(f"worker:{worker_id}")
+        worker_hashes = await pipe.execute()
+
     workers = []
-    for worker_id in redis_client.smembers(WORKERS_SET):
-        worker_data = redis_client.hgetall(f"worker:{worker_id}")
+    for worker_id, worker_data in zip(worker_ids, worker_hashes):
         if worker_data:
             workers.append({
                 "id": worker_id,
@@ -448,11 +661,44 @@ async def get_system_status():
             "pending": pending_count,
             "processing": processing_count,
             "processed": processed_count,
-            "errors": error_count
+            "errors": error_count,
+            "dead_letter": dead_letter_count
         },
         "workers": workers
     }
 
+async def reap_expired_leases(now=None):
+    """Requeue documents whose lease has expired; dead-letter them after DOCUMENT_MAX_ATTEMPTS.
+
+    Returns (requeued, dead_lettered).
+    """
+    now = time.time() if now is None else now
+    requeued = dead = 0
+    while True:
+        batch_requeued, batch_dead, expired = await reap_leases(
+            keys=[DOCUMENT_LEASES, INFLIGHT_DOCUMENTS, INFLIGHT_WORKERS, DOCUMENT_QUEUE, DOCUMENT_ATTEMPTS,
+                  DEAD_LETTER_QUEUE],
+            args=[now, DOCUMENT_MAX_ATTEMPTS, LEASE_REAPER_BATCH]
+        )
+        requeued += batch_requeued
+        dead += batch_dead
+        if expired < LEASE_REAPER_BATCH:
+            return requeued, dead
+
+
+async def lease_reaper():
+    while True:
+        try:
+            requeued, dead = await reap_expired_leases()
+            if requeued:
+                await announce_documents(requeued)
+            if requeued or dead:
+                print(f"[i] Expired leases: {requeued} requeued, {dead} dead-lettered")
+        except Exception as e:
+            print(f"[!] Lease reaper error: {e}")
+        await asyncio.sleep(LEASE_REAPER_INTERVAL)
+
+
 @app.post("/api/schema")
 async def add_schema(request: Request):
     """Add a schema to the system."""
@@ -460,19 +706,30 @@ async def add_schema(request: Request):
         schema_data = await request.json()
         schema_name = schema_data.get("name")
         schema_content = schema_data.get("content")
+        # Optional {key: "collect" | "first" | "last" | "most_common"} used when merging batch results
+        merge_policies = schema_data.get("merge_policies")
 
         if not schema_name:
             return {"error": "Schema name is required"}
 
-        # Store schema in Redis
-        redis_client.hset(f"schema:{schema_name}", mapping={
+        schema_mapping = {
             "name": schema_name,
             "content": json.dumps(schema_content),
-            "created_at": time.time()
-        })
+            "created_at": time.time(),
+            "version": await redis_client.incr(SCHEMA_VERSION_COUNTER)
+        }
+        if merge_policies:
+            schema_mapping["merge_policies"] = json.dumps(merge_policies)
 
-        # Add to schemas set
-        redis_client.sadd(SCHEMAS_SET, schema_name)
+        # Store schema in Redis; MULTI so a worker never reads the hash between DEL and HSET
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(f"schema:{schema_name}")
+            pipe.hset(f"schema:{schema_name}", mapping=schema_mapping)
+            pipe.sadd(SCHEMAS_SET, schema_name)
+            await pipe.execute()
+
+        # Workers drop their cached copy of this schema and its prompts, only after the write committed
+        await redis_client.publish(SCHEMA_UPDATES_CHANNEL, schema_name)
 
         return {
             "status": "Schema added successfully",
@@ -485,11 +742,14 @@ async def add_schema(request: Request):
 async def get_schemas():
     """List all available schemas."""
     try:
-        schema_names = redis_client.smembers(SCHEMAS_SET)
+        schema_names = await redis_client.smembers(SCHEMAS_SET)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for name in schema_names:
+                pipe.hgetall(f"schema:{name}")
+            schema_hashes = await pipe.execute()
         schemas = []
 
-        for name in schema_names:
-            schema_data = redis_client.hgetall(f"schema:{name}")
+        for schema_data in schema_hashes:
             if schema_data:
                 schemas.append({
                     "name": schema_data.get("name"),
@@ -505,11 +765,11 @@ async def get_schema(schema_name: str):
     """Get a schema by name."""
     try:
         # Check if schema exists
-        if not redis_client.sismember(SCHEMAS_SET, schema_name):
+        if not await redis_client.sismember(SCHEMAS_SET, schema_name):
             return {"error": "Schema not found"}
 
         # Get schema data
-        schema_data = redis_client.hgetall(f"schema:{schema_name}")
+        schema_data = await redis_client.hgetall(f"schema:{schema_name}")
         if not schema_data:
             return {"error": "Schema data not found"}
 
@@ -533,14 +793,16 @@ async def delete_schema(schema_name: str):
     """Delete a schema by name."""
     try:
         # Check if schema exists
-        if not redis_client.sismember(SCHEMAS_SET, schema_name):
+        if not await redis_client.sismember(SCHEMAS_SET, schema_name):
             return {"error": "Schema not found"}
 
         # Delete schema data
-        redis_client.delete(f"schema:{schema_name}")
+        await redis_client.delete(f"schema:{schema_name}")
 
         # Remove from schemas set
-        redis_client.srem(SCHEMAS_SET, schema_name)
+        await redis_client.srem(SCHEMAS_SET, schema_name)
+
+        await redis_client.publish(SCHEMA_UPDATES_CHANNEL, schema_name)
 
         return {
             "status": "Schema deleted successfully",
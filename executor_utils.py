@@ -0,0 +1,14 @@
+# executor_utils.py
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# Rasterize/encode, önbellek ve dosya G/Ç işlerinin event loop dışında çalıştığı sınırlı havuz
+EXECUTOR_WORKERS = int(os.environ.get("ASYNC_EXECUTOR_WORKERS", os.cpu_count() or 4))
+
+CPU_EXECUTOR = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="extract")
+
+
+async def run_blocking(func, *args):
+    """Run a blocking call on the bounded executor shared by the API, extractor and upload store."""
+    return await asyncio.get_running_loop().run_in_executor(CPU_EXECUTOR, func, *args)
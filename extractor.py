@@ -1,80 +1,231 @@
 import os
-import shutil
-import requests
-import base64
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 
-from pdf_optimizer import PDFOptimizer
+from pdf_optimizer import PDFOptimizer, USE_TEXT_LAYER
+from image_encoder import ImageEncoder
+from result_cache import get_page_cache, make_cache_key
+from json_utils import extract_json_objects
+from http_session import get_session, CONNECT_TIMEOUT, LLM_READ_TIMEOUT
+from retry_policy import RetryPolicy, RetryBudget
+from batch_planner import BatchPlanner
+from page_filter import PageFilter, FILTER_ENABLED
+
+# Bir doküman için aynı anda yapılabilecek en fazla API isteği
+MAX_CONCURRENT_BATCHES = int(os.environ.get("EXTRACTOR_MAX_CONCURRENCY", 4))
 
 
 class Extractor:
 
+    def __init__(self, max_concurrency=None, encoder=None, use_page_cache=True, use_text_layer=None,
+                 filter_pages=None, on_batch=None):
+        self.max_concurrency = max(1, max_concurrency or MAX_CONCURRENT_BATCHES)
+        self.encoder = encoder or ImageEncoder()
+        self.use_text_layer = USE_TEXT_LAYER if use_text_layer is None else use_text_layer
+        self.filter_pages = FILTER_ENABLED if filter_pages is None else filter_pages
+        self.page_cache = get_page_cache() if use_page_cache else None
+        self.retry_policy = RetryPolicy()
+        self.retry_budget = RetryBudget()
+        self.planner = None
+        self.stats = {}
+        # on_batch(batch_index, page_numbers, result) her batch'in yanıtı geldiğinde çağrılır
+        self.on_batch = on_batch
+
+    def cache_key(self):
+        """Stable string describing every setting that changes what is sent to the LLM."""
+        return json.dumps({
+            "encoding": self.encoder.cache_key(),
+            "text_layer": self.use_text_layer,
+            "filter_pages": self.filter_pages
+        }, sort_keys=True)
+
     def run_inference(self, api_url, model, api_key, input_data):
         if not input_data or not input_data[0].get("file_path"):
             return [], 0
 
+        self._start_run()
+        prompt = input_data[0].get("text_input", "")
+        batches, num_pages = self._plan_batches(model, input_data)
+        results = self._dispatch_batches(api_url, model, api_key, batches, prompt)
+        self._finish_run()
+        # Tüm sayfalar elendiyse LLM çağrısı yapılmaz
+        return results or [{}], num_pages
+
+    def _start_run(self):
+        self.encoder.reset_stats()
+        self.retry_budget = RetryBudget()
+        self.stats = {}
+        self.planner = None
+        self._run_started = time.perf_counter()
+        self._llm_timings = []
+
+    def _finish_run(self):
+        if self.planner:
+            self.stats["batching"] = self.planner.get_stats()
+        self.stats["image_encoding"] = self.encoder.get_stats()
+        self.stats["retries"] = self.retry_budget.get_stats()
+        # Aşama süreleri (saniye); LLM çağrıları paralel çalıştığı için toplamları inference süresini aşabilir
+        self.stats["timings"] = {
+            "inference": round(time.perf_counter() - self._run_started, 3),
+            "llm_calls": len(self._llm_timings),
+            "llm_call_total": round(sum(self._llm_timings), 3),
+            "llm_call_max": round(max(self._llm_timings, default=0), 3)
+        }
+
+    def _plan_batches(self, model, input_data):
+        """Return a lazy iterable of page batches and the document's page count."""
         file_path = input_data[0]["file_path"]
+        prompt = input_data[0].get("text_input", "")
 
         if file_path.lower().endswith('.pdf'):
-            return self._process_pdf(api_url, model, api_key, input_data)
+            return self._pdf_batches(file_path, model, prompt)
         else:
-            return self._process_non_pdf(api_url, model, api_key, input_data)
+            return self._non_pdf_batches(file_path, model, prompt)
 
-    def _process_pdf(self, api_url, model, api_key, input_data):
+    def _pdf_batches(self, file_path, model, prompt):
         pdf_optimizer = PDFOptimizer()
-        num_pages, output_files, temp_dir = pdf_optimizer.split_pdf_to_pages(
-            input_data[0]["file_path"],
-            convert_to_images=True
+        num_pages = pdf_optimizer.get_page_count(file_path)
+
+        # Batch boyutu modelin token/byte bütçesine ve gecikme hedefine göre seçilir
+        self.planner = BatchPlanner(model, prompt, self.max_concurrency)
+        pages_per_batch = self.planner.plan(num_pages)
+
+        # Sayfalar batch batch rasterize edilir; ilk batch'lerin API istekleri
+        # sonraki sayfalar render edilirken başlar. Metin katmanı olan sayfalar metin olarak gider.
+        rendered_pages = (
+            (first_page + offset, page)
+            for first_page, page_batch in pdf_optimizer.iter_page_batches(
+                file_path,
+                batch_size=pages_per_batch,
+                dpi=self.encoder.dpi,
+                num_pages=num_pages,
+                grayscale=self.encoder.settings.get("grayscale") is True,
+                use_text_layer=self.use_text_layer
+            )
+            for offset, page in enumerate(page_batch)
+        )
+        pages = (
+            self._encode_page(page, page_number)
+            for page_number, page in self._skip_unneeded_pages(rendered_pages)
         )
+        return self.planner.pack(pages), num_pages
 
-        base64_images = []
-        for page_file in output_files:
-            with open(page_file, "rb") as f:
-                base64_images.append(base64.b64encode(f.read()).decode("utf-8"))
+    def _non_pdf_batches(self, file_path, model, prompt):
+        page = self.encoder.encode_file(file_path)
+        page["page"] = 1
+        self.planner = BatchPlanner(model, prompt, self.max_concurrency)
+        self.planner.plan(1)
+        return self.planner.pack([page]), 1
 
-        results = self._process_pages(api_url, model, api_key, base64_images, input_data)
+    def _skip_unneeded_pages(self, pages):
+        """Drop blank and duplicate pages before they are encoded and sent."""
+        if not self.filter_pages:
+            yield from pages
+            return
 
-        shutil.rmtree(temp_dir, ignore_errors=True)
-        return results, num_pages
+        page_filter = PageFilter()
+        for page_number, page in pages:
+            if page_filter.check(page, page_number) is None:
+                yield page_number, page
+        self.stats["skipped_pages"] = page_filter.skipped
 
-    def _process_non_pdf(self, api_url, model, api_key, input_data):
-        file_path = input_data[0]["file_path"]
+    def _encode_page(self, page, page_number):
+        encoded = self.encoder.encode_text(page) if isinstance(page, str) else self.encoder.encode_image(page)
+        encoded["page"] = page_number
+        return encoded
 
-        with open(file_path, "rb") as f:
-            base64_image = base64.b64encode(f.read()).decode("utf-8")
+    def _dispatch_batches(self, api_url, model, api_key, batches, prompt):
+        """Send batches as they are produced, keeping at most max_concurrency of them in flight.
 
-        results = self._process_pages(api_url, model, api_key, [base64_image], input_data)
-        return results, 1
+        The iterable is only advanced when a slot is free, so a lazy producer never
+        holds more than max_concurrency + 1 batches in memory. Results are returned
+        in batch order.
+        """
+        slots = threading.BoundedSemaphore(self.max_concurrency)
+        futures = []
+        cache_hits = 0
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for index, batch in enumerate(batches):
+                page_numbers = [page.get("page") for page in batch]
+                # Daha önce görülmüş sayfalardan oluşan batch'ler için API çağrısı yapılmaz
+                cache_key, cached_result = self._lookup_page_cache(batch, prompt, model)
+                if cached_result is not None:
+                    future = Future()
+                    future.set_result(cached_result)
+                    futures.append(future)
+                    cache_hits += 1
+                    self._notify_batch(index, page_numbers, cached_result)
+                    continue
 
-    def _process_pages(self, api_url, model, api_key, base64_images, input_data):
-        results = []
-        prompt = input_data[0].get("text_input", "")
+                slots.acquire()
+                future = executor.submit(self._call_api_cached, api_url, model, api_key, batch, prompt, cache_key)
+                future.add_done_callback(lambda _: slots.release())
+                future.add_done_callback(
+                    lambda done, index=index, page_numbers=page_numbers:
+                    self._notify_batch(index, page_numbers, done.result())
+                )
+                futures.append(future)
 
-        if len(base64_images) <= 4:
-            # print(f"[+] Tek API isteği ile {len(base64_images)} sayfa/görüntü gönderiliyor.")
-            results.append(self._call_api(api_url,model, api_key, base64_images, prompt))
-        else:
-            batch_size = 4
-            for i in range(0, len(base64_images), batch_size):
-                batch_images = base64_images[i:i + batch_size]
-                page_range = f"{i + 1}-{i + len(batch_images)}"
-                # print(f"[+] Sayfa/Görüntü {page_range} gönderiliyor ({len(batch_images)} sayfa/görüntü).")
-                results.append(self._call_api(api_url, model, api_key, batch_images, prompt))
+        if self.page_cache:
+            self.stats["page_cache"] = {"hits": cache_hits, "misses": len(futures) - cache_hits}
 
-        return results
+        return [future.result() for future in futures]
 
-    def _call_api(self, api_url, model, api_key, base64_images, prompt):
-        # print(prompt + "------\n")
+    def _notify_batch(self, index, page_numbers, result):
+        if not self.on_batch:
+            return
+        try:
+            self.on_batch(index, page_numbers, result)
+        except Exception as e:
+            # Dinleyicideki bir hata çıkarımı durdurmamalı
+            print(f"[!] on_batch hatası: {e}")
+
+    def _lookup_page_cache(self, pages, prompt, model):
+        """Return (cache_key, cached LLM text or None) for a batch.
+
+        The LLM answers a whole batch at once, so the reply is cached under the batch's
+        page hashes plus the prompt and model. Only a batch made of exactly the same pages
+        hits; a batch that mixes previously seen pages with new ones is always sent.
+        """
+        if not self.page_cache or not pages:
+            return None, None
+        cache_key = make_cache_key(*[page["hash"] for page in pages], prompt, model)
+        cached_result = self.page_cache.get(cache_key)
+        return cache_key, cached_result if isinstance(cached_result, str) else None
+
+    def _store_page_cache(self, cache_key, result):
+        # Yalnızca JSON içeren yanıtlar saklanır; hata sözlükleri ve JSON'suz model metni
+        # önbelleğe girmez, bir sonraki çalıştırmada batch yeniden gönderilir
+        if cache_key and isinstance(result, str) and extract_json_objects(result):
+            self.page_cache.set(cache_key, result)
+
+    def _call_api_cached(self, api_url, model, api_key, pages, prompt, cache_key):
+        started = time.perf_counter()
+        result = self._call_api(api_url, model, api_key, pages, prompt)
+        self._llm_timings.append(time.perf_counter() - started)
+        self._store_page_cache(cache_key, result)
+        return result
+
+    def _build_request(self, model, api_key, pages, prompt):
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {api_key}"
         }
 
         content_block = [{"type": "text", "text": prompt}]
-        for b64 in base64_images:
+        for page in pages:
+            if "text" in page:
+                content_block.append({
+                    "type": "text",
+                    "text": f"--- Sayfa {page.get('page', '')} (metin katmanı) ---\n{page['text']}"
+                })
+                continue
             content_block.append({
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/jpeg;base64,{b64}"
+                    "url": f"data:{page['mime']};base64,{page['data']}"
                 }
             })
 
@@ -88,14 +239,31 @@ class Extractor:
             ],
             "temperature": 0.2
         }
+        return headers, data
+
+    def _read_response(self, response):
+        response.raise_for_status()
+        result_text = response.json()["choices"][0]["message"]["content"]
+        print("[✓] API yanıtı alındı:")
+        print(result_text)
+        return result_text
+
+    def _call_api(self, api_url, model, api_key, pages, prompt):
+        # print(prompt + "------\n")
+        headers, data = self._build_request(model, api_key, pages, prompt)
 
         try:
-            response = requests.post(api_url, headers=headers, json=data)
-            response.raise_for_status()
-            result_text = response.json()["choices"][0]["message"]["content"]
-            print("[✓] API yanıtı alındı:")
-            print(result_text)
-            return result_text
+            # 429/5xx yanıtları ve bağlantı hataları doküman bütçesi dahilinde yeniden denenir
+            response = self.retry_policy.send(
+                lambda: get_session().post(
+                    api_url,
+                    headers=headers,
+                    json=data,
+                    timeout=(CONNECT_TIMEOUT, LLM_READ_TIMEOUT)
+                ),
+                budget=self.retry_budget
+            )
+            return self._read_response(response)
         except Exception as e:
             print(f"[!] API hatası: {e}")
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
@@ -0,0 +1,61 @@
+# http_session.py
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Bağlantı ve okuma zaman aşımları (saniye)
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 30))
+# LLM yanıtları uzun sürebildiği için okuma zaman aşımı ayrı tutulur
+LLM_READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", 180))
+
+# Host başına açık tutulacak en fazla bağlantı sayısı
+DEFAULT_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 10))
+
+
+def _parse_pool_sizes(value):
+    """Parse "https://api.openai.com=32,http://localhost:8000=4" into {prefix: size}."""
+    pool_sizes = {}
+    for item in value.split(","):
+        if "=" in item:
+            prefix, size = item.rsplit("=", 1)
+            pool_sizes[prefix.strip()] = int(size)
+    return pool_sizes
+
+
+HOST_POOL_SIZES = _parse_pool_sizes(os.environ.get("HTTP_HOST_POOL_SIZES", ""))
+
+
+class PooledSession(requests.Session):
+    """requests.Session with keep-alive connection pools per host and a default timeout."""
+
+    def __init__(self, timeout=None, pool_size=DEFAULT_POOL_SIZE, host_pool_sizes=None):
+        super().__init__()
+        self.timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+        # Daha uzun önek daha özel olduğu için requests onu tercih eder
+        for prefix, size in (host_pool_sizes if host_pool_sizes is not None else HOST_POOL_SIZES).items():
+            self.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=size))
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide pooled session shared by the extractor and the worker."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = PooledSession()
+    return _session
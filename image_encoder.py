@@ -0,0 +1,168 @@
+# image_encoder.py
+import os
+import json
+import base64
+import hashlib
+import mimetypes
+from io import BytesIO
+
+from PIL import Image, ImageChops, ImageOps, ImageStat, UnidentifiedImageError
+
+# Hazır kodlama ayarları. "lossless" eski davranıştır (300 DPI PNG);
+# diğerleri LLM'e giden byte ve görüntü token sayısını düşürür.
+ENCODING_PRESETS = {
+    "lossless": {"dpi": 300, "max_dimension": None, "grayscale": False, "format": "PNG", "quality": None},
+    "high": {"dpi": 200, "max_dimension": 2048, "grayscale": "auto", "format": "JPEG", "quality": 85},
+    "balanced": {"dpi": 150, "max_dimension": 1600, "grayscale": "auto", "format": "JPEG", "quality": 75},
+    "compact": {"dpi": 110, "max_dimension": 1280, "grayscale": True, "format": "WEBP", "quality": 60},
+}
+DEFAULT_PRESET = os.environ.get("IMAGE_ENCODING_PRESET", "balanced")
+# Açıkken PDF sayfaları için eski 300 DPI PNG boyutu da ölçülür (ek CPU maliyeti var)
+MEASURE_BASELINE = os.environ.get("IMAGE_ENCODING_MEASURE_BASELINE", "0") == "1"
+BASELINE_DPI = 300
+
+FORMAT_MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+# EXIF "Orientation" etiketi
+EXIF_ORIENTATION = 0x0112
+# "auto" modunda kanallar arası ortalama farkı bu değerin altındaki sayfalar gri tonlamaya çevrilir
+GRAYSCALE_COLOR_THRESHOLD = 6
+
+
+class ImageEncoder:
+
+    def __init__(self, preset=None, measure_baseline=None, **overrides):
+        preset = preset or DEFAULT_PRESET
+        if preset not in ENCODING_PRESETS:
+            raise ValueError(f"Bilinmeyen görüntü kodlama ayarı: '{preset}'")
+
+        self.preset = preset
+        self.settings = dict(ENCODING_PRESETS[preset])
+        self.settings.update({key: value for key, value in overrides.items() if value is not None})
+        self.measure_baseline = MEASURE_BASELINE if measure_baseline is None else measure_baseline
+        self.reset_stats()
+
+    @property
+    def dpi(self):
+        return self.settings["dpi"]
+
+    def cache_key(self):
+        """Stable string describing the settings, for use in cache keys."""
+        return json.dumps(self.settings, sort_keys=True)
+
+    def reset_stats(self):
+        self.stats = {"preset": self.preset, "pages": 0, "text_pages": 0, "encoded_bytes": 0, "original_bytes": 0}
+        self._baseline_known = True
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        if self._baseline_known and stats["pages"]:
+            stats["bytes_saved"] = stats["original_bytes"] - stats["encoded_bytes"]
+        else:
+            stats.pop("original_bytes")
+        return stats
+
+    def encode_image(self, image):
+        """Encode a rendered page with the configured settings."""
+        if self.measure_baseline:
+            self._record_baseline(self._baseline_size(image))
+        else:
+            self._baseline_known = False
+
+        prepared = self._prepare(image)
+        # Dosya modunda sayfa diskte zaten PNG olarak durur; değişmediyse yeniden kodlanmaz
+        if prepared is image and image.format == self.settings["format"] == "PNG" and getattr(image, "filename", None):
+            with open(image.filename, "rb") as f:
+                return self._to_page(f.read(), image)
+        return self._to_page(self._save(prepared), prepared)
+
+    def encode_text(self, text):
+        """Wrap a page's text layer; such pages are sent as text and skip image encoding."""
+        self.stats["text_pages"] += 1
+        return {
+            "text": text,
+            "hash": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        }
+
+    def encode_file(self, file_path):
+        """Encode an uploaded file, re-encoding it only when that makes it smaller."""
+        with open(file_path, "rb") as f:
+            raw = f.read()
+        self._record_baseline(len(raw))
+
+        try:
+            image = Image.open(BytesIO(raw))
+            image.load()
+        except (UnidentifiedImageError, OSError):
+            # Görüntü değilse dosya olduğu gibi gönderilir
+            mime = mimetypes.guess_type(file_path)[0] or "image/jpeg"
+            return self._to_page(raw, None, mime=mime)
+
+        original_format = image.format
+        # Telefon fotoğrafları EXIF yönüyle gelir; model yan dönmüş sayfa görmesin
+        rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+        if rotated:
+            image = ImageOps.exif_transpose(image)
+        prepared = self._prepare(image)
+        encoded = self._save(prepared)
+        # Orijinal byte'lar yalnızca EXIF döndürmesi gerekmiyorsa ve daha küçükse gönderilir
+        if (not rotated and len(encoded) >= len(raw) and prepared.size == image.size
+                and original_format in FORMAT_MIME_TYPES):
+            return self._to_page(raw, image, mime=FORMAT_MIME_TYPES[original_format])
+        return self._to_page(encoded, prepared)
+
+    def _prepare(self, image):
+        max_dimension = self.settings.get("max_dimension")
+        if max_dimension and max(image.size) > max_dimension:
+            image = image.copy()
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        grayscale = self.settings.get("grayscale")
+        if grayscale == "auto":
+            grayscale = self._is_monochrome(image)
+
+        if grayscale:
+            return image.convert("L")
+        if image.mode not in ("RGB", "L"):
+            return image.convert("RGB")
+        return image
+
+    def _is_monochrome(self, image):
+        if image.mode in ("1", "L"):
+            return True
+        thumbnail = image.convert("RGB")
+        thumbnail.thumbnail((128, 128))
+        red, green, blue = thumbnail.split()
+        difference = ImageChops.add(ImageChops.difference(red, green), ImageChops.difference(green, blue))
+        return ImageStat.Stat(difference).mean[0] < GRAYSCALE_COLOR_THRESHOLD
+
+    def _save(self, image):
+        image_format = self.settings["format"]
+        options = {}
+        if image_format in ("JPEG", "WEBP") and self.settings.get("quality"):
+            options["quality"] = self.settings["quality"]
+        if image_format == "JPEG":
+            options["optimize"] = True
+
+        buffer = BytesIO()
+        image.save(buffer, image_format, **options)
+        return buffer.getvalue()
+
+    def _baseline_size(self, image):
+        buffer = BytesIO()
+        image.save(buffer, "PNG")
+        scale = (BASELINE_DPI / self.dpi) ** 2
+        return int(buffer.tell() * scale)
+
+    def _record_baseline(self, size):
+        self.stats["original_bytes"] += size
+
+    def _to_page(self, data, image, mime=None):
+        self.stats["pages"] += 1
+        self.stats["encoded_bytes"] += len(data)
+        return {
+            "mime": mime or FORMAT_MIME_TYPES[self.settings["format"]],
+            "data": base64.b64encode(data).decode("utf-8"),
+            "hash": hashlib.sha256(data).hexdigest(),
+            "width": image.width if image else None,
+            "height": image.height if image else None,
+        }
@@ -1,131 +1,227 @@
+import os
 import json
 import re
 from dicttoxml import dicttoxml
+from schema_validator import get_validator
+
+# "auto": orjson kuruluysa tek parça yanıtlar onunla ayrıştırılır, "json": yalnızca standart kütüphane
+JSON_BACKEND = os.environ.get("JSON_BACKEND", "auto")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None and JSON_BACKEND != "json":
+    def _fast_loads(text):
+        return orjson.loads(text)
+else:
+    _fast_loads = json.loads
+
+_DECODER = json.JSONDecoder()
+_JSON_START = re.compile(r"[{\[]")
+_JSON_STRUCTURE = re.compile(r'[{}\[\]"\\]')
+# Kesilmiş yanıtın sonunda kalan yarım sayı veya true/false/null parçası
+_PARTIAL_TOKEN = re.compile(r"\s*[\w.+-]*\s*")
+_FENCED_BLOCK = re.compile(r"```(?:json|JSON)?[ \t]*\n(.*?)```", re.DOTALL)
+
+
+def extract_json_objects(text):
+    """Return every top-level JSON object in an LLM response, in order.
+
+    Fenced ```json blocks are preferred when present; otherwise the whole text is
+    scanned. Top-level arrays contribute the objects they contain. A bracket that
+    does not start valid JSON is skipped together with everything up to its matching
+    close, so objects nested inside a broken value are never returned as results. A
+    bracket that never closes skips the rest of the text when the response was cut
+    off mid-value, and only itself otherwise (e.g. a stray "{" in prose).
+    """
+    if not isinstance(text, str):
+        return []
+
+    blocks = _FENCED_BLOCK.findall(text)
+    if blocks:
+        objects = [value for block in blocks for value in _scan_json_objects(block)]
+        if objects:
+            return objects
+    return _scan_json_objects(text)
 
 
 def extract_json_from_text(text):
-    try:
-        print(text)
-        json_match = re.search(r"\{.*\}", text, re.DOTALL)
-        print(json_match)
-        if json_match:
-            json_data = json.loads(json_match.group())
-            return json_data
-        else:
-            raise ValueError("Geçerli bir JSON bulunamadı.")
-    except json.JSONDecodeError as e:
-        raise ValueError(f"JSON ayrıştırma hatası: {e}")
+    """Return the JSON object in the text; several objects are merged into one."""
+    objects = extract_json_objects(text)
+    if not objects:
+        raise ValueError("Geçerli bir JSON bulunamadı.")
+    return objects[0] if len(objects) == 1 else merge_json_list(objects)
 
 
-def validate_keys(result, schema, type):
-    if type == "field":
-        fields = [field.split(":")[0].strip() for field in schema.split(",")]
-
-        for field in fields:
-            if field not in result:
-                return False
-        return True
-
-    elif type == "schema":
+def _scan_json_objects(text):
+    stripped = text.strip()
+    # Yanıtların çoğu tek bir JSON nesnesidir; önce tamamı hızlı yoldan denenir
+    if stripped[:1] in ("{", "[") and stripped[-1:] in ("}", "]"):
         try:
-            schema = json.loads(schema)
-        except:
-            return False
-        return _validate_schema_keys(result, schema)
-
-    return True
-
-
-def _validate_schema_keys(result, schema):
-    for key in schema.keys():
-        if key not in result:
-            return False
-        elif isinstance(schema[key], dict) and isinstance(result[key], dict):
-            if not _validate_schema_keys(result[key], schema[key]):
-                return False
-        elif isinstance(schema[key], list) and isinstance(result[key], list):
-            if len(schema[key]) > 0 and isinstance(schema[key][0], dict):
-                for item in result[key]:
-                    if not _validate_schema_keys(item, schema[key][0]):
-                        return False
-    for key in result.keys():
-        if key not in schema:
-            return False
-    return True
-
-
-def validate_types(result, schema, type):
-    if type == "field":
-        fields = {field.split(":")[0].strip(): field.split(":")[1].strip() for field in schema.split(",")}
-
-        for key, expected_type in fields.items():
-            if key not in result:
-                continue
-            value = result[key]
-            if value is None:
-                continue
-            if expected_type == "string" and not isinstance(value, str):
-                return False
-            elif expected_type == "number" and not isinstance(value, (int, float)):
-                return False
-            elif expected_type == "boolean" and not isinstance(value, bool):
-                return False
-        return True
-
-    elif type == "schema":
+            return _collect_objects(_fast_loads(stripped), [])
+        except ValueError:
+            pass
+
+    # Tek geçiş: her konum derinlik 0'dadır, başarısız bir değer kapanışıyla birlikte atlanır
+    objects = []
+    position = 0
+    while True:
+        match = _JSON_START.search(text, position)
+        if not match:
+            return objects
         try:
-            schema = json.loads(schema)
-        except:
-            return False
-        return _validate_schema_types(result, schema)
-
-    return False
+            value, position = _DECODER.raw_decode(text, match.start())
+        except json.JSONDecodeError as error:
+            position = _skip_value(text, match.start())
+            if position is None:
+                # Hiç kapanmayan parantez: yanıt yarıda kesildiyse iç nesneler atlanır,
+                # düz metindeki tek bir "{" ise asıl yükü yutmamalı
+                position = len(text) if _is_truncated(text, error) else match.start() + 1
+            continue
+        _collect_objects(value, objects)
+
+
+def _is_truncated(text, error):
+    """True when the value was valid JSON up to where the text ends (a cut-off response)."""
+    return error.msg.startswith("Unterminated string") or _PARTIAL_TOKEN.fullmatch(text, error.pos) is not None
+
+
+def _skip_value(text, start):
+    """Return the index just past the bracket closing the one at start, or None if it never closes."""
+    depth = 0
+    in_string = False
+    position = start
+    while True:
+        match = _JSON_STRUCTURE.search(text, position)
+        if not match:
+            return None
+        char = match.group()
+        position = match.end()
+        if in_string:
+            if char == "\\":
+                position += 1
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return position
+
+
+def _collect_objects(value, objects):
+    if isinstance(value, dict):
+        objects.append(value)
+    elif isinstance(value, list):
+        objects.extend(item for item in value if isinstance(item, dict))
+    return objects
 
 
-def _validate_schema_types(result, schema):
-    for key, expected_type in schema.items():
-        if key not in result:
-            continue
-        value = result[key]
-        if isinstance(expected_type, dict) and isinstance(value, dict):
-            if not _validate_schema_types(value, expected_type):
-                return False
-        elif isinstance(expected_type, list) and isinstance(value, list):
-            if len(expected_type) > 0 and isinstance(expected_type[0], dict):
-                for item in value:
-                    if not _validate_schema_types(item, expected_type[0]):
-                        return False
-        else:
-            if value is None:
-                continue
-            if expected_type == "string" and not isinstance(value, str):
-                return False
-            elif expected_type == "number" and not isinstance(value, (int, float)):
-                return False
-            elif expected_type == "boolean" and not isinstance(value, bool):
-                return False
-    return True
+def validate_keys(result, schema, type):
+    return get_validator(schema, type).check(result)[0]
 
 
-def validate(result, schema, type):
-    is_keys_valid = validate_keys(result, schema, type)
-    is_types_valid = validate_types(result, schema, type)
-    return is_keys_valid, is_types_valid
+def validate_types(result, schema, type):
+    return get_validator(schema, type).check(result)[1]
 
 
-# TODO: aynı keyli farklı değerleri birleştirirken ne yapıalcağına karar ver
-def merge_json_list(json_list):
+def validate(result, schema, type):
+    """Return (keys_valid, types_valid); the schema is compiled once and checked in one pass."""
+    return get_validator(schema, type).check(result)
+
+
+def validation_errors(result, schema, type):
+    """Per-path violations, e.g. [{"path": "items[2].price", "kind": "type_mismatch", ...}]."""
+    return get_validator(schema, type).validate(result)
+
+
+MERGE_POLICIES = ("collect", "first", "last", "most_common")
+
+
+def _canonical(item):
+    """Hashable identity of a JSON value; equal JSON values get equal keys."""
+    if isinstance(item, (dict, list)):
+        return json.dumps(item, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    # 1, 1.0 ve True ayrı değerler olarak tutulur
+    return type(item).__name__, item
+
+
+def _resolve_values(values, policy):
+    """Merge the non-None values one key received from several batches."""
+    if len(values) == 1:
+        return values[0]
+
+    if any(isinstance(value, list) for value in values):
+        # Diziler birleştirilir: sıra korunur, tekrarlar ve null'lar atılır
+        merged, seen = [], set()
+        for value in values:
+            for item in value if isinstance(value, list) else [value]:
+                if item is None:
+                    continue
+                key = _canonical(item)
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(item)
+        return merged
+
+    if policy == "first":
+        return values[0]
+    if policy == "last":
+        return values[-1]
+
+    counts = {}
+    unique = []
+    for value in values:
+        key = _canonical(value)
+        if key not in counts:
+            counts[key] = 0
+            unique.append((key, value))
+        counts[key] += 1
+
+    if len(unique) == 1:
+        return unique[0][1]
+    if policy == "most_common":
+        # Eşitlikte ilk görülen değer kazanır
+        return max(unique, key=lambda entry: counts[entry[0]])[1]
+    return [value for _, value in unique]
+
+
+def merge_json_list(json_list, policies=None):
+    """Merge batch results in one pass over all of them.
+
+    Keys keep the order they are first seen in. A key with a single non-None value
+    keeps it as is; lists are concatenated and deduplicated. Conflicting scalar
+    values follow the key's policy from policies ({key: policy, "*": default}):
+    "collect" (default) returns the distinct values as a list, "first"/"last" pick
+    one, "most_common" picks the most frequent one.
+    """
     if not json_list:
         raise ValueError("JSON listesi boş olamaz.")
 
     if len(json_list) == 1:
         return json_list[0]
 
-    merged_json = json_list[0]
-    for json_obj in json_list[1:]:
-        merged_json = merge_deneysel(merged_json, json_obj)
+    policies = policies or {}
+    default_policy = policies.get("*", "collect")
+
+    collected = {}
+    for json_obj in json_list:
+        if not isinstance(json_obj, dict):
+            continue
+        for key, value in json_obj.items():
+            values = collected.setdefault(key, [])
+            if value is not None:
+                values.append(value)
 
-    return merged_json
+    return {
+        key: _resolve_values(values, policies.get(key, default_policy)) if values else None
+        for key, values in collected.items()
+    }
 
 
 def merge_jsons(json1, json2):
@@ -158,48 +254,8 @@ def merge_jsons(json1, json2):
 
 
 # valueler sıralı, keyler sıralı, null'lar alınmıyor
-# dizi olmayan aynı keyleri nasıl birleştirileceğine bakılmalı
-from collections import OrderedDict
-
-
 def merge_deneysel(json1, json2):
-    merged = OrderedDict()
-    all_keys = list(json1.keys()) + [key for key in json2.keys() if key not in json1]
-
-    for key in all_keys:
-        value1 = json1.get(key)
-        value2 = json2.get(key)
-
-        if value1 is None and value2 is None:
-            merged[key] = None
-            continue
-        if value1 is None:
-            merged[key] = value2
-            continue
-        if value2 is None:
-            merged[key] = value1
-            continue
-
-        if isinstance(value1, list) and isinstance(value2, list):
-            merged[key] = []
-            for item in value1 + value2:
-                if item is not None and item not in merged[key]:
-                    merged[key].append(item)
-        elif isinstance(value1, list):
-            merged[key] = [item for item in value1 if item is not None]
-            if value2 not in merged[key] and value2 is not None:
-                merged[key].append(value2)
-        elif isinstance(value2, list):
-            merged[key] = [item for item in value2 if item is not None]
-            if value1 not in merged[key] and value1 is not None:
-                merged[key].append(value1)
-        elif not isinstance(value1, list) and not isinstance(value2, list):
-            if value1 == value2:
-                merged[key] = value1
-            else:
-                merged[key] = [value1, value2]
-
-    return merged
+    return merge_json_list([json1, json2])
 
 
 def json_to_xml(json):
@@ -0,0 +1,289 @@
+# mock_llm_server.py - OpenAI-compatible chat completions stand-in for offline benchmarking
+import os
+import re
+import ast
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+DEFAULT_RESPONSE = {"mock": True}
+
+_SCHEMA_MARKER = re.compile(r"Schema:\s*")
+_FIELD_LINE = re.compile(r"^\s*-\s*([^:\n]+?)\s*(?::\s*(\w+))?\s*$", re.MULTILINE)
+
+
+def parse_latency(spec):
+    """Parse "fixed:0.5", "uniform:0.2,1.5", "normal:1.0,0.3" or "lognormal:0.0,0.5" into a sampler."""
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value.strip()]
+    if kind == "fixed":
+        return lambda rng: values[0] if values else 0.0
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Bilinmeyen gecikme dağılımı: {spec}")
+
+
+def request_key(body):
+    """Stable hash of the parts of a request that decide the answer."""
+    relevant = {key: body.get(key) for key in ("model", "messages", "temperature", "response_format")}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _message_parts(body):
+    """Return (prompt text, number of page blocks) of the first user message."""
+    texts, pages = [], 0
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+            continue
+        for block in content or []:
+            if block.get("type") == "image_url":
+                pages += 1
+            elif block.get("type") == "text":
+                if block.get("text", "").startswith("--- Sayfa"):
+                    pages += 1
+                else:
+                    texts.append(block.get("text", ""))
+    return "\n".join(texts), pages
+
+
+def _sample_value(template):
+    if isinstance(template, dict):
+        return {key: _sample_value(value) for key, value in template.items()}
+    if isinstance(template, list):
+        return [_sample_value(template[0])] if template else []
+    return {"number": 0, "integer": 0, "boolean": False, "null": None}.get(str(template).lower(), "örnek")
+
+
+def schema_shaped_response(prompt):
+    """Build a JSON answer that matches the schema or field list embedded in the prompt."""
+    marker = _SCHEMA_MARKER.search(prompt)
+    if marker:
+        start = prompt.find("{", marker.end())
+        if start != -1:
+            try:
+                schema, _ = json.JSONDecoder().raw_decode(prompt, start)
+                return _sample_value(schema)
+            except ValueError:
+                pass
+            # prompt_generator adlandırılmış şemaları Python repr'i olarak ({'alan': 'string'}) tek satırda yazar
+            end = prompt.find("\n", start)
+            try:
+                schema = ast.literal_eval(prompt[start:end if end != -1 else None].strip())
+                if isinstance(schema, dict):
+                    return _sample_value(schema)
+            except (ValueError, SyntaxError):
+                pass
+
+    fields = _FIELD_LINE.findall(prompt)
+    if fields:
+        return {name: _sample_value(field_type or "string") for name, field_type in fields}
+    return dict(DEFAULT_RESPONSE)
+
+
+class Cassette:
+    """Append-only JSONL file of recorded responses keyed by request hash."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def record(self, key, status, body):
+        entry = {"key": key, "status": status, "body": body}
+        with self._lock:
+            self.entries[key] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class MockLLM:
+    """Decides latency, injected failures and the body of every mocked response."""
+
+    def __init__(self, latency="fixed:0", latency_per_page=0.0, error_rate=0.0, throttle_rate=0.0,
+                 retry_after=1.0, mode="schema", canned=None, cassette=None, record_url=None,
+                 replay_fallback=False, seed=None):
+        self.sample_latency = parse_latency(latency)
+        self.latency_per_page = latency_per_page
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.mode = mode
+        self.canned = canned if canned is not None else DEFAULT_RESPONSE
+        self.cassette = Cassette(cassette) if cassette else None
+        self.record_url = record_url
+        self.replay_fallback = replay_fallback
+        self.rng = random.Random(seed)
+        self.stats = {"requests": 0, "completed": 0, "errors": 0, "throttled": 0,
+                      "recorded": 0, "replayed": 0, "replay_misses": 0, "pages": 0}
+
+    async def handle(self, body, headers):
+        self.stats["requests"] += 1
+        prompt, pages = _message_parts(body)
+        self.stats["pages"] += pages
+
+        if self.cassette and self.record_url:
+            # Kayıt modunda hata/429 enjeksiyonu ve yapay gecikme uygulanmaz; istek doğrudan upstream'e gider
+            return await self._record(body, headers)
+
+        # Hata enjeksiyonu gecikmeden önce karar verir; 429 yanıtları hızlı döner
+        roll = self.rng.random()
+        if roll < self.throttle_rate:
+            self.stats["throttled"] += 1
+            return 429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}, \
+                {"Retry-After": str(self.retry_after)}
+
+        await asyncio.sleep(self.sample_latency(self.rng) + pages * self.latency_per_page)
+
+        if roll < self.throttle_rate + self.error_rate:
+            self.stats["errors"] += 1
+            return 500, {"error": {"message": "Injected server error", "type": "server_error"}}, {}
+
+        if self.cassette:
+            key = request_key(body)
+            entry = self.cassette.get(key)
+            if entry:
+                self.stats["replayed"] += 1
+                return entry["status"], entry["body"], {}
+            self.stats["replay_misses"] += 1
+            if not self.replay_fallback:
+                return 404, {"error": {"message": f"Kasette kayıt yok: {key}", "type": "replay_miss"}}, {}
+
+        content = self.canned if self.mode == "canned" else schema_shaped_response(prompt)
+        self.stats["completed"] += 1
+        return 200, self._completion(body, json.dumps(content, ensure_ascii=False), prompt, pages), {}
+
+    async def _record(self, body, headers):
+        status, response = await self._forward(body, headers)
+        # Geçici hatalar kaydedilmez; yeniden denenen istek başarılı yanıtla kaydedilir
+        if status < 400:
+            self.cassette.record(request_key(body), status, response)
+            self.stats["recorded"] += 1
+        return status, response, {}
+
+    async def _forward(self, body, headers):
+        forwarded = {"Authorization": headers.get("authorization", ""), "Content-Type": "application/json"}
+        async with httpx.AsyncClient(timeout=httpx.Timeout(180, connect=5)) as client:
+            response = await client.post(self.record_url, headers=forwarded, json=body)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, {"error": {"message": response.text}}
+
+    def _completion(self, body, content, prompt, pages):
+        prompt_tokens = len(prompt) // 4 + pages * 765
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+
+def create_app(mock):
+    app = FastAPI(title="Mock LLM")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        status, body, headers = await mock.handle(await request.json(), request.headers)
+        return JSONResponse(body, status_code=status, headers=headers)
+
+    @app.get("/stats")
+    async def stats():
+        return mock.stats
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        for key in mock.stats:
+            mock.stats[key] = 0
+        return mock.stats
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM server")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address")
+    parser.add_argument("--port", type=int, default=8100, help="Port")
+    parser.add_argument("--latency", default="fixed:0",
+                        help="Per-request latency: fixed:S, uniform:A,B, normal:MU,SIGMA or lognormal:MU,SIGMA")
+    parser.add_argument("--latency-per-page", type=float, default=0.0, help="Extra seconds per page in the request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429")
+    parser.add_argument("--mode", choices=["schema", "canned"], default="schema",
+                        help="schema: answer shaped like the schema in the prompt, canned: fixed answer")
+    parser.add_argument("--canned-file", help="JSON file with the canned answer")
+    parser.add_argument("--cassette", help="JSONL cassette for record/replay")
+    parser.add_argument("--record", metavar="UPSTREAM_URL",
+                        help="Forward requests to this chat completions URL and record them into the cassette "
+                             "(no injected failures or latency)")
+    parser.add_argument("--replay-fallback", action="store_true",
+                        help="Generate an answer instead of 404 when a request is not in the cassette")
+    parser.add_argument("--seed", type=int, help="Random seed for latency and failure injection")
+    args = parser.parse_args(argv)
+
+    if args.record and not args.cassette:
+        parser.error("--record requires --cassette")
+    if args.record and (args.error_rate or args.throttle_rate):
+        print("[!] --record modunda --error-rate ve --throttle-rate uygulanmaz")
+
+    canned = None
+    if args.canned_file:
+        with open(args.canned_file, "r", encoding="utf-8") as f:
+            canned = json.load(f)
+
+    mock = MockLLM(
+        latency=args.latency,
+        latency_per_page=args.latency_per_page,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        mode=args.mode,
+        canned=canned,
+        cassette=args.cassette,
+        record_url=args.record,
+        replay_fallback=args.replay_fallback,
+        seed=args.seed
+    )
+    print(f"[i] Mock LLM: http://{args.host}:{args.port}/v1/chat/completions")
+    uvicorn.run(create_app(mock), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# page_filter.py
+import os
+import zlib
+import hashlib
+
+from PIL import Image, ImageChops
+
+# Boş ve birbirinin tekrarı olan sayfaların LLM'e gönderilmeden elenmesi
+FILTER_ENABLED = os.environ.get("PAGE_FILTER", "1") != "0"
+# Koyu piksel oranı bunun altındaki (ya da 1 - bu değerin üstündeki) sayfalar boş sayılır
+BLANK_INK_RATIO = float(os.environ.get("PAGE_BLANK_INK_RATIO", 0.0005))
+# Algısal hash'leri arasındaki Hamming mesafesi bu değere eşit veya küçük olan sayfalar tekrar adayıdır
+DUPLICATE_MAX_DISTANCE = int(os.environ.get("PAGE_DUPLICATE_MAX_DISTANCE", 10))
+# Tekrar adayı sayfa, hizalanmış piksel karşılaştırmasında en fazla bu kadar piksel farklıysa elenir
+DUPLICATE_MAX_PIXELS = int(os.environ.get("PAGE_DUPLICATE_MAX_PIXELS", 8))
+# İkinci kez taranan sayfanın kayabileceği en fazla mesafe (imza pikseli)
+DUPLICATE_MAX_SHIFT = int(os.environ.get("PAGE_DUPLICATE_MAX_SHIFT", 24))
+
+INK_THRESHOLD = 160  # 0-255 gri ton; bundan koyu pikseller mürekkep sayılır
+# Bir piksel, diğer sayfada 3x3 komşuluğundaki en koyu pikselden bu kadar koyuysa farklı sayılır;
+# 1 piksellik kayma, hafif bulanıklık ve JPEG gürültüsü fark üretmez
+PIXEL_DIFF_THRESHOLD = 128
+# İmzalar tek karakter farkını görebilecek çözünürlükte tutulur
+SIGNATURE_WIDTH = 1800
+# Hizalama önce 1/8 ve 1/2 ölçekte kaba, en son tam çözünürlükte ±1 piksel içinde aranır
+ALIGN_SCALES = (8, 2, 1)
+HASH_SIZE = 16
+
+
+def ink_ratio(image):
+    """Fraction of dark pixels, computed on the full-resolution page so thin strokes are not lost."""
+    histogram = image.convert("L").histogram()
+    return sum(histogram[:INK_THRESHOLD]) / max(1, image.width * image.height)
+
+
+def perceptual_hash(image):
+    """Difference hash: compare neighbouring pixels of a (HASH_SIZE+1) x HASH_SIZE grayscale thumbnail."""
+    pixels = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR).tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for column in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+def page_signature(image):
+    """Reduced grayscale copy used for the pixel-level duplicate check."""
+    gray = image.convert("L")
+    if gray.width <= SIGNATURE_WIDTH:
+        return gray
+    return gray.resize((SIGNATURE_WIDTH, round(gray.height * SIGNATURE_WIDTH / gray.width)), Image.BOX)
+
+
+def _overlap(signature, other, dx, dy):
+    """Crop both images to the region where signature shifted by (dx, dy) overlaps other."""
+    width = min(signature.width, other.width) - abs(dx)
+    height = min(signature.height, other.height) - abs(dy)
+    left, top = max(dx, 0), max(dy, 0)
+    return (signature.crop((left, top, left + width, top + height)),
+            other.crop((left - dx, top - dy, left - dx + width, top - dy + height)))
+
+
+def _alignment_cost(signature, other, dx, dy):
+    histogram = ImageChops.difference(*_overlap(signature, other, dx, dy)).histogram()
+    return sum(value * count for value, count in enumerate(histogram))
+
+
+def align(signature, other, max_shift=DUPLICATE_MAX_SHIFT):
+    """Return the (dx, dy) that best lines signature up with other, searched coarse to fine."""
+    dx = dy = 0
+    previous = None
+    for scale in ALIGN_SCALES:
+        if previous is None:
+            radius = -(-max_shift // scale)
+        else:
+            dx, dy = dx * previous // scale, dy * previous // scale
+            # Kaba adımın yuvarlama payı kadar çevresine bakılır
+            radius = previous // scale // 2
+        small, small_other = (signature, other) if scale == 1 else (signature.reduce(scale), other.reduce(scale))
+        _, dx, dy = min(
+            (_alignment_cost(small, small_other, x, y), x, y)
+            for x in range(dx - radius, dx + radius + 1)
+            for y in range(dy - radius, dy + radius + 1)
+            if abs(x) * scale <= max_shift and abs(y) * scale <= max_shift
+        )
+        previous = scale
+    return dx * previous, dy * previous
+
+
+def _shifted(image, dx, dy):
+    shifted = Image.new("L", image.size, 255)
+    shifted.paste(image, (dx, dy))
+    return shifted
+
+
+def _darkest_neighbour(image):
+    """3x3 minimum filter built from shifted copies; much faster than ImageFilter.MinFilter."""
+    rows = ImageChops.darker(ImageChops.darker(image, _shifted(image, 1, 0)), _shifted(image, -1, 0))
+    return ImageChops.darker(ImageChops.darker(rows, _shifted(rows, 0, 1)), _shifted(rows, 0, -1))
+
+
+def differing_pixels(signature, other, max_shift=DUPLICATE_MAX_SHIFT):
+    """Pixels that are clearly darker in one page than anywhere near them in the other, after alignment.
+
+    Returns None when the pages differ in size by more than max_shift.
+    """
+    if abs(signature.width - other.width) > max_shift or abs(signature.height - other.height) > max_shift:
+        return None
+    first, second = _overlap(signature, other, *align(signature, other, max_shift))
+    differing = 0
+    for page, reference in ((first, second), (second, first)):
+        # Referansın 3x3 komşuluğundaki en koyu değerden belirgin şekilde koyu pikseller sayılır
+        darker = ImageChops.subtract(_darkest_neighbour(reference), page)
+        differing = max(differing, sum(darker.histogram()[PIXEL_DIFF_THRESHOLD:]))
+    return differing
+
+
+class PageFilter:
+    """Decides per page whether it is blank or a duplicate of an earlier page of the same document.
+
+    Duplicates are found in two steps: a perceptual hash picks candidates cheaply,
+    then an aligned, blur-tolerant pixel comparison confirms them. A rescan that is
+    shifted, slightly blurred or recompressed still matches; pages that differ in even
+    a single character are kept.
+    """
+
+    def __init__(self, blank_ink_ratio=BLANK_INK_RATIO, duplicate_max_distance=DUPLICATE_MAX_DISTANCE,
+                 duplicate_max_pixels=DUPLICATE_MAX_PIXELS):
+        self.blank_ink_ratio = blank_ink_ratio
+        self.duplicate_max_distance = duplicate_max_distance
+        self.duplicate_max_pixels = duplicate_max_pixels
+        self.seen_pages = []
+        self.seen_texts = {}
+        self.skipped = []
+
+    def check(self, page, page_number):
+        """Return the skip reason for a page (PIL image or text layer), or None to keep it."""
+        if isinstance(page, str):
+            return self._check_text(page, page_number)
+
+        ratio = ink_ratio(page)
+        if ratio < self.blank_ink_ratio or ratio > 1 - self.blank_ink_ratio:
+            return self._skip(page_number, "blank")
+
+        signature = page_signature(page)
+        page_hash = perceptual_hash(signature)
+        for seen_hash, seen_size, seen_data, seen_page in self.seen_pages:
+            if bin(page_hash ^ seen_hash).count("1") > self.duplicate_max_distance:
+                continue
+            seen_signature = Image.frombytes("L", seen_size, zlib.decompress(seen_data))
+            difference = differing_pixels(signature, seen_signature)
+            if difference is not None and difference <= self.duplicate_max_pixels:
+                return self._skip(page_number, "duplicate", seen_page)
+
+        # Uzun dokümanlarda bellek kullanımını sınırlamak için imzalar sıkıştırılarak saklanır
+        self.seen_pages.append((page_hash, signature.size, zlib.compress(signature.tobytes(), 1), page_number))
+        return None
+
+    def _check_text(self, text, page_number):
+        text_hash = hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+        if text_hash in self.seen_texts:
+            return self._skip(page_number, "duplicate", self.seen_texts[text_hash])
+        self.seen_texts[text_hash] = page_number
+        return None
+
+    def _skip(self, page_number, reason, duplicate_of=None):
+        entry = {"page": page_number, "reason": reason}
+        if duplicate_of is not None:
+            entry["duplicate_of"] = duplicate_of
+        self.skipped.append(entry)
+        return reason
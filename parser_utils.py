@@ -1,25 +1,50 @@
 import os
+import copy
 import json
+import time
 from extractor import Extractor
-from json_utils import extract_json_from_text, validate, merge_json_list
-from prompt_utils import prompt_generator, select_schema
+from async_extractor import AsyncExtractor
+from executor_utils import run_blocking
+from json_utils import extract_json_objects, validate, validation_errors, merge_json_list
+from prompt_utils import prompt_generator, get_schema_prompt, get_merge_policies, get_schema_validator
+from result_cache import get_result_cache, make_cache_key, file_sha256
 
+# LLM metninde JSON bulunamayan batch için dönen hata kaydı
+PARSE_ERROR = {"error": "Geçerli bir JSON bulunamadı."}
+# Bir çalıştırmaya ait ölçümler; önbellekten dönen sonuçta orijinal çalıştırmanın değerleri yanıltıcı olur
+PER_RUN_META = ("timings", "image_encoding", "page_cache", "retries", "batching")
+# meta.validation içinde raporlanan en fazla ihlal sayısı
+MAX_REPORTED_VIOLATIONS = int(os.environ.get("MAX_REPORTED_VIOLATIONS", 20))
 
-def _serve_result(results, num_pages, query, file_path, model):
-    # Convert results to a serializable format
+
+def _serve_result(results, num_pages, query, file_path, model, stats=None, merge_policies=None):
+    # Convert results to a serializable format; batches that failed or had no JSON are counted
+    failed_batches = 0
     if isinstance(results, dict):
         # Handle any sets in the dictionary
         json_result = convert_sets_to_lists(results)
+        failed_batches += _is_batch_error(json_result)
     elif isinstance(results, list):
-        # Process list of results
-        json_result = [convert_sets_to_lists(item) if isinstance(item, dict) else item for item in results]
+        # Process list of results; every JSON object in each batch's raw LLM text is merged
+        json_result = []
+        for item in results:
+            if isinstance(item, dict):
+                json_result.append(convert_sets_to_lists(item))
+                failed_batches += _is_batch_error(item)
+            elif isinstance(item, str):
+                objects = _parse_batch_text(item)
+                json_result.extend(objects)
+                failed_batches += objects == [PARSE_ERROR]
+            else:
+                json_result.append(item)
     else:
         # Extract JSON from text
-        json_result = extract_json_from_text(results)
+        json_result = _parse_batch_text(results)
+        failed_batches += json_result == [PARSE_ERROR]
 
     # If json_result is still a list, merge it into a single dict
     if isinstance(json_result, list):
-        json_result = merge_json_list(json_result)
+        json_result = merge_json_list(json_result, merge_policies)
 
     # Add metadata
     if isinstance(json_result, dict):
@@ -28,13 +53,48 @@ def _serve_result(results, num_pages, query, file_path, model):
                 "num_pages": num_pages,
                 "query": query,
                 "file": os.path.basename(file_path),
-                "model": model
+                "model": model,
+                "failed_batches": failed_batches,
+                **(stats or {})
             }
         })
 
     return json_result
 
 
+def _is_batch_error(result):
+    """True for the {"error": ...} a batch returns when its LLM call failed."""
+    return list(result) == ["error"]
+
+
+def _parse_batch_text(text):
+    """Return the JSON objects in one batch's LLM text, or an error entry when there are none."""
+    objects = extract_json_objects(text)
+    return objects or [dict(PARSE_ERROR)]
+
+
+class PartialResultMerger:
+    """Collects per-batch results as they arrive and merges them in page order."""
+
+    def __init__(self, merge_policies=None):
+        self.batches = {}
+        self.merge_policies = merge_policies
+
+    def add(self, index, result):
+        """Return (parsed batch result, merged result of all batches received so far)."""
+        if isinstance(result, str):
+            objects = _parse_batch_text(result)
+            parsed = objects[0] if len(objects) == 1 else merge_json_list(objects, self.merge_policies)
+        elif isinstance(result, dict):
+            parsed = convert_sets_to_lists(result)
+        else:
+            parsed = result
+        self.batches[index] = parsed
+        # Batch'ler tamamlanma sırasıyla gelir; birleştirme her seferinde sayfa sırasıyla yeniden yapılır
+        merged = merge_json_list([copy.deepcopy(self.batches[i]) for i in sorted(self.batches)], self.merge_policies)
+        return parsed, merged
+
+
 def convert_sets_to_lists(d):
     """Convert any sets in a dictionary to lists recursively."""
     result = {}
@@ -54,17 +114,95 @@ def convert_sets_to_lists(d):
     return result
 
 
-def run_parser(file_path, api_url, model, api_key, query=None, type=None, schema=None):
+def _build_query_text(type, query, schema):
+    if schema == "*" or schema is None:
+        return prompt_generator(type, query)
+    # Şema ve prompt süreç içinde önbelleklenir; şema değişince coordinator yayını ile yenilenir
+    return get_schema_prompt(type, schema)
+
+
+def _lookup_result_cache(cache, file_path, file_hash, query_text, model, extractor, file_name=None,
+                         merge_policies=None):
+    """Return (cache_key, cached_result or None) for the same file, prompt, model and encoding settings."""
+    key_parts = [file_hash or file_sha256(file_path), query_text, model, extractor.cache_key()]
+    if merge_policies:
+        key_parts.append(json.dumps(merge_policies, sort_keys=True))
+    cache_key = make_cache_key(*key_parts)
+    cached_result = cache.get(cache_key)
+    if isinstance(cached_result, dict):
+        meta = cached_result.setdefault("meta", {})
+        for key in PER_RUN_META:
+            meta.pop(key, None)
+        meta.update({
+            "file": os.path.basename(file_name or file_path),
+            "cache": "hit"
+        })
+        return cache_key, cached_result
+    return cache_key, None
+
+
+def _add_hit_timings(result, started):
+    result["meta"]["timings"] = {"total": round(time.perf_counter() - started, 3)}
+
+
+def _add_validation(result, type, query, schema):
+    """Check the merged result against its named schema or field list and report it in meta.
+
+    Violations are informational; the result is returned either way.
+    """
+    if not isinstance(result, dict) or "error" in result or not isinstance(result.get("meta"), dict):
+        return
+    data = {key: value for key, value in result.items() if key != "meta"}
+    if type == "schema" and schema not in (None, "*"):
+        # Derlenmiş doğrulayıcı şema sürümüyle birlikte önbelleklenir
+        violations = get_schema_validator(type, schema).validate(data)
+    elif type == "field" and query and query != "*":
+        violations = validation_errors(data, query, type)
+    else:
+        return
+    result["meta"]["validation"] = {
+        "valid": not violations,
+        "violations": violations[:MAX_REPORTED_VIOLATIONS],
+        "violation_count": len(violations)
+    }
+
+
+def _add_timings(result, started, merge_started):
+    if isinstance(result, dict) and isinstance(result.get("meta"), dict):
+        now = time.perf_counter()
+        timings = result["meta"].setdefault("timings", {})
+        timings["merge"] = round(now - merge_started, 3)
+        timings["total"] = round(now - started, 3)
+
+
+def _store_result_cache(cache, cache_key, result):
+    if cache and isinstance(result, dict):
+        result["meta"]["cache"] = "miss"
+        # Yalnızca tüm batch'leri başarıyla ayrıştırılmış sonuçlar önbelleğe alınır;
+        # hatalı veya JSON içermeyen batch'ler bir sonraki denemede yeniden işlenir
+        if "error" not in result and not result["meta"].get("failed_batches"):
+            cache.set(cache_key, result)
+
+
+def run_parser(file_path, api_url, model, api_key, query=None, type=None, schema=None, file_hash=None,
+               use_cache=True, on_batch=None):
     if not os.path.exists(file_path):
         return {"error": f"Dosya bulunamadı: {file_path}"}
 
-    extractor = Extractor()
+    started = time.perf_counter()
+    extractor = Extractor(on_batch=on_batch)
+    query_text = _build_query_text(type, query, schema)
+    merge_policies = get_merge_policies(schema)
 
-    if schema == "*" or schema is None:
-        query_text = prompt_generator(type, query)
-    else:
-        selected_schema = select_schema(schema)
-        query_text = prompt_generator(type, selected_schema)
+    # Aynı dosya, prompt, model ve kodlama ayarları için önceki sonucu döndür
+    cache = get_result_cache() if use_cache else None
+    cache_key = None
+    if cache:
+        cache_key, cached_result = _lookup_result_cache(cache, file_path, file_hash, query_text, model, extractor,
+                                                        merge_policies=merge_policies)
+        if cached_result is not None:
+            _add_hit_timings(cached_result, started)
+            return cached_result
 
     input_data = [
         {
@@ -80,4 +218,59 @@ def run_parser(file_path, api_url, model, api_key, query=None, type=None, schema
         input_data,
     )
 
-    return _serve_result(results, num_pages, query, file_path, model)
\ No newline at end of file
+    merge_started = time.perf_counter()
+    result = _serve_result(results, num_pages, query, file_path, model, stats=extractor.stats,
+                           merge_policies=merge_policies)
+    _add_validation(result, type, query, schema)
+    _add_timings(result, started, merge_started)
+    _store_result_cache(cache, cache_key, result)
+    return result
+
+
+async def run_parser_async(file_path, api_url, model, api_key, query=None, type=None, schema=None,
+                           file_hash=None, use_cache=True, file_name=None, on_batch=None):
+    """Non-blocking run_parser for the API: LLM calls are awaited, CPU and disk work runs on CPU_EXECUTOR.
+
+    file_name is the original upload name reported in meta when file_path is a stored copy.
+    on_batch is called for every batch as it completes (not on a result cache hit).
+    """
+    if not os.path.exists(file_path):
+        return {"error": f"Dosya bulunamadı: {file_path}"}
+
+    started = time.perf_counter()
+    extractor = AsyncExtractor(on_batch=on_batch)
+    query_text = await run_blocking(_build_query_text, type, query, schema)
+    merge_policies = await run_blocking(get_merge_policies, schema)
+
+    cache = get_result_cache() if use_cache else None
+    cache_key = None
+    if cache:
+        cache_key, cached_result = await run_blocking(
+            _lookup_result_cache, cache, file_path, file_hash, query_text, model, extractor, file_name,
+            merge_policies
+        )
+        if cached_result is not None:
+            _add_hit_timings(cached_result, started)
+            return cached_result
+
+    input_data = [
+        {
+            "file_path": file_path,
+            "text_input": query_text
+        }
+    ]
+
+    results, num_pages = await extractor.run_inference_async(
+        api_url,
+        model,
+        api_key,
+        input_data,
+    )
+
+    merge_started = time.perf_counter()
+    result = await run_blocking(_serve_result, results, num_pages, query, file_name or file_path, model,
+                                extractor.stats, merge_policies)
+    await run_blocking(_add_validation, result, type, query, schema)
+    _add_timings(result, started, merge_started)
+    await run_blocking(_store_result_cache, cache, cache_key, result)
+    return result
@@ -1,12 +1,117 @@
 import os
 import tempfile
 import shutil
+import subprocess
 import pdf2image
 import logging
 
 
+DEFAULT_DPI = 300
+# Sayfaları geçici dizine yazmadan bellekte rasterize et ("0" ile dosya moduna dönülür)
+RASTERIZE_IN_MEMORY = os.environ.get("PDF_RASTERIZE_IN_MEMORY", "1") != "0"
+# Metin katmanı olan (dijital) sayfalar rasterize edilmeden metin olarak gönderilir
+USE_TEXT_LAYER = os.environ.get("PDF_TEXT_LAYER", "1") != "0"
+# Bir sayfanın metin olarak gönderilmesi için gereken en az karakter sayısı
+TEXT_LAYER_MIN_CHARS = int(os.environ.get("PDF_TEXT_LAYER_MIN_CHARS", 200))
+
+
 class PDFOptimizer:
 
+    def get_page_count(self, pdf_path):
+        info = pdf2image.pdfinfo_from_path(pdf_path)
+        return int(info.get("Pages", 0))
+
+    def extract_text_layer(self, pdf_path, first_page, last_page):
+        """Return the text layer of each page in the range using poppler's pdftotext.
+
+        Returns None when pdftotext is not available or fails, so callers can fall
+        back to rasterizing every page.
+        """
+        try:
+            completed = subprocess.run(
+                ["pdftotext", "-layout", "-enc", "UTF-8",
+                 "-f", str(first_page), "-l", str(last_page), pdf_path, "-"],
+                capture_output=True,
+                check=True
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            logging.warning(f"Metin katmanı okunamadı, sayfalar rasterize edilecek: {e}")
+            return None
+
+        # pdftotext her sayfanın sonuna form feed (\f) koyar
+        texts = completed.stdout.decode("utf-8", errors="replace").split("\f")
+        texts = texts[:last_page - first_page + 1]
+        texts += [""] * (last_page - first_page + 1 - len(texts))
+        return texts
+
+    def has_text_layer(self, text):
+        return len("".join(text.split())) >= TEXT_LAYER_MIN_CHARS
+
+    def iter_page_batches(self, pdf_path, batch_size=4, dpi=DEFAULT_DPI, num_pages=None, in_memory=None,
+                          grayscale=False, use_text_layer=None):
+        """PDF'i batch_size sayfalık aralıklar halinde işler ve her aralığı hazır olduğunda döndürür.
+
+        Her adımda (ilk_sayfa_no, sayfalar) üretilir. Metin katmanı yeterli olan sayfalar str,
+        diğerleri PIL görüntüsü olarak gelir. Varsayılan olarak sayfalar pdftoppm çıktısından
+        doğrudan belleğe okunur; in_memory=False verilirse geçici dizine PNG olarak yazılıp
+        oradan okunur ve aralığın dosyaları bir sonraki aralığa geçilirken silinir.
+        """
+        if num_pages is None:
+            num_pages = self.get_page_count(pdf_path)
+        if in_memory is None:
+            in_memory = RASTERIZE_IN_MEMORY
+        if use_text_layer is None:
+            use_text_layer = USE_TEXT_LAYER
+
+        for first_page in range(1, num_pages + 1, batch_size):
+            last_page = min(first_page + batch_size - 1, num_pages)
+            temp_dir = None if in_memory else tempfile.mkdtemp()
+            try:
+                texts = self.extract_text_layer(pdf_path, first_page, last_page) if use_text_layer else None
+                if texts is None:
+                    texts = [""] * (last_page - first_page + 1)
+
+                pages = []
+                # Metni olmayan (taranmış) ardışık sayfalar tek pdftoppm çağrısıyla rasterize edilir
+                for run_first, run_last in self._scanned_runs(texts, first_page):
+                    # Bellekte çalışırken sıkıştırmasız ppm kullanılır; PNG kodlaması
+                    # sonradan yalnızca bir kez yapılır
+                    images = pdf2image.convert_from_path(
+                        pdf_path,
+                        dpi=dpi,
+                        first_page=run_first,
+                        last_page=run_last,
+                        output_folder=temp_dir,
+                        fmt="ppm" if in_memory else "png",
+                        grayscale=grayscale
+                    )
+                    pages.extend(images)
+
+                images = iter(pages)
+                yield first_page, [
+                    text if self.has_text_layer(text) else next(images)
+                    for text in texts
+                ]
+            except Exception as e:
+                logging.error(f"PDF işleme hatası (sayfa {first_page}-{last_page}): {e}")
+                raise
+            finally:
+                if temp_dir:
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _scanned_runs(self, texts, first_page):
+        run_first = None
+        for offset, text in enumerate(texts):
+            page_number = first_page + offset
+            if not self.has_text_layer(text):
+                if run_first is None:
+                    run_first = page_number
+            elif run_first is not None:
+                yield run_first, page_number - 1
+                run_first = None
+        if run_first is not None:
+            yield run_first, first_page + len(texts) - 1
+
     def split_pdf_to_pages(self, pdf_path, convert_to_images=True):
         try:
             temp_dir = tempfile.mkdtemp()
@@ -14,7 +119,7 @@ class PDFOptimizer:
             if convert_to_images:
                 images = pdf2image.convert_from_path(
                     pdf_path,
-                    dpi=300,
+                    dpi=DEFAULT_DPI,
                     output_folder=temp_dir,
                     fmt="png"
                 )
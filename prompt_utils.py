@@ -1,8 +1,12 @@
 # prompt_utils.py
 import json
 import os
+import time
+import threading
 from string import Template
 import redis
+from json_utils import MERGE_POLICIES
+from schema_validator import SchemaValidator
 from redis import ConnectionPool
 
 # Initialize connection pool at module level
@@ -18,6 +22,11 @@ REDIS_POOL = ConnectionPool(
 
 SCHEMAS_SET = "available_schemas"
 SCHEMA_DIR = "./schemas"
+# Coordinator şema eklediğinde veya sildiğinde şema adını bu kanala yayınlar
+SCHEMA_UPDATES_CHANNEL = "schema_updates"
+# Yayın kaçırılırsa önbellekteki şema en geç bu kadar saniye sonra yeniden okunur
+SCHEMA_CACHE_TTL = float(os.environ.get("SCHEMA_CACHE_TTL", 300))
+SCHEMA_LISTENER_RETRY = 5  # seconds
 
 TEMPLATES = {
     "extract_fields": Template(
@@ -79,30 +88,150 @@ def prompt_generator(type, query):
     return get_prompt_template()
 
 
-def select_schema(name):
-    """Retrieve schema from Redis by name or from filesystem as fallback."""
-    try:
-        # Use connection pool instead of creating new connection
-        redis_client = redis.Redis(connection_pool=REDIS_POOL)
+class SchemaCache:
+    """Process-local cache of parsed schemas, rendered prompts and compiled validators.
+
+    Entries are keyed by schema name and carry the schema's version; the coordinator
+    publishes the name on SCHEMA_UPDATES_CHANNEL whenever a schema is added or deleted,
+    and a background subscriber drops the entry. SCHEMA_CACHE_TTL bounds staleness if
+    a message is missed. A load that overlaps an invalidation is returned but not cached.
+    """
+
+    def __init__(self, ttl=SCHEMA_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._prompts = {}
+        self._validators = {}
+        self._lock = threading.Lock()
+        # invalidate() her çağrıldığında artar; yükleme sırasında değiştiyse sonuç önbelleğe yazılmaz
+        self._generation = 0
+        self._listener = None
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, name):
+        """Return {"schema", "version", "merge_policies"} for a schema, loading it on a miss."""
+        self._ensure_listener()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry and entry["expires_at"] > time.time():
+                self.stats["hits"] += 1
+                return entry
+            self.stats["misses"] += 1
+            generation = self._generation
+
+        entry = _load_schema(name)
+        entry["expires_at"] = time.time() + self.ttl
+        with self._lock:
+            if generation == self._generation:
+                self._entries[name] = entry
+        return entry
+
+    def prompt(self, type, name):
+        with self._lock:
+            generation = self._generation
+        entry = self.get(name)
+        key = (type, name, entry["version"])
+        with self._lock:
+            prompt = self._prompts.get(key)
+        if prompt is None:
+            prompt = prompt_generator(type, entry["schema"])
+            with self._lock:
+                if generation == self._generation:
+                    self._prompts[key] = prompt
+        return prompt
+
+    def validator(self, type, name):
+        with self._lock:
+            generation = self._generation
+        entry = self.get(name)
+        key = (type, name, entry["version"])
+        with self._lock:
+            validator = self._validators.get(key)
+        if validator is None:
+            validator = SchemaValidator(entry["schema"], type)
+            with self._lock:
+                if generation == self._generation:
+                    self._validators[key] = validator
+        return validator
 
-        # Check if schema exists in Redis with timeout
-        schema_exists = redis_client.sismember(SCHEMAS_SET, name)
-        if schema_exists:
-            # Get schema content from Redis with pipeline for efficiency
-            pipe = redis_client.pipeline()
-            pipe.hgetall(f"schema:{name}")
-            results = pipe.execute()
-            schema_data = results[0] if results else {}
+    def invalidate(self, name=None):
+        with self._lock:
+            if name:
+                self._entries.pop(name, None)
+                self._prompts = {key: value for key, value in self._prompts.items() if key[1] != name}
+                self._validators = {key: value for key, value in self._validators.items() if key[1] != name}
+            else:
+                self._entries.clear()
+                self._prompts.clear()
+                self._validators.clear()
+            self._generation += 1
+            self.stats["invalidations"] += 1
 
-            if schema_data and "content" in schema_data:
-                # Parse the schema content from JSON string
-                return json.loads(schema_data["content"])
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name="schema-cache", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        connected = True
+        while True:
+            pubsub = None
+            try:
+                # Abonelik bağlantısı uzun süre boşta kalabileceği için havuzdaki socket_timeout kullanılmaz
+                connection = REDIS_POOL.connection_kwargs
+                client = redis.Redis(host=connection["host"], port=connection["port"], db=connection["db"],
+                                     decode_responses=True, socket_connect_timeout=2, health_check_interval=30)
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(SCHEMA_UPDATES_CHANNEL)
+                # Abonelikten önce yapılmış değişiklikler kaçırılmış olabilir
+                self.invalidate()
+                if not connected:
+                    print("[i] Şema güncelleme aboneliği yeniden kuruldu")
+                connected = True
+                for message in pubsub.listen():
+                    self.invalidate(message.get("data") or None)
+                # listen() abonelik düşünce hata vermeden de bitebilir; kopma gibi ele alınır
+                error = "abonelik sonlandı"
+            except Exception as e:
+                error = e
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+            if connected:
+                print(f"[!] Şema güncelleme aboneliği koptu, yeniden bağlanılacak: {error}")
+            connected = False
+            self.invalidate()
+            time.sleep(SCHEMA_LISTENER_RETRY)
+
+
+def _load_schema(name):
+    try:
+        # Tek round trip: şema, sürümü ve birleştirme politikaları aynı hash'te tutulur
+        redis_client = redis.Redis(connection_pool=REDIS_POOL)
+        schema_data = redis_client.hgetall(f"schema:{name}")
+        if schema_data and "content" in schema_data:
+            return {
+                "schema": json.loads(schema_data["content"]),
+                "version": schema_data.get("version") or schema_data.get("created_at"),
+                "merge_policies": _load_merge_policies(name, schema_data.get("merge_policies"))
+            }
 
         # If schema not found in Redis, try filesystem as fallback
         schema_path = os.path.join(SCHEMA_DIR, f"{name}.json")
         if os.path.exists(schema_path):
             with open(schema_path, "r", encoding="utf-8") as schema_file:
-                return json.load(schema_file)
+                return {
+                    "schema": json.load(schema_file),
+                    "version": f"file:{os.path.getmtime(schema_path)}",
+                    "merge_policies": _load_merge_policies(name, None)
+                }
 
         # If schema not found in either location
         raise ValueError(f"Şema bulunamadı: '{name}' şeması Redis'te veya dosya sisteminde bulunamadı")
@@ -111,5 +240,71 @@ def select_schema(name):
         raise ValueError(f"Redis bağlantı hatası: {str(re)}")
     except json.JSONDecodeError as je:
         raise ValueError(f"Şema JSON hatası '{name}': {str(je)}")
+    except ValueError:
+        raise
     except Exception as e:
-        raise ValueError(f"Şema yükleme hatası '{name}': {str(e)}")
\ No newline at end of file
+        raise ValueError(f"Şema yükleme hatası '{name}': {str(e)}")
+
+
+def _load_merge_policies(name, stored):
+    """Parse and check a schema's merge policies once, when the schema is loaded into the cache."""
+    policies = None
+    if stored:
+        try:
+            policies = json.loads(stored)
+        except json.JSONDecodeError as e:
+            print(f"[!] Birleştirme politikaları okunamadı '{name}': {e}")
+
+    if policies is None:
+        policy_path = os.path.join(SCHEMA_DIR, f"{name}.merge.json")
+        if os.path.exists(policy_path):
+            try:
+                with open(policy_path, "r", encoding="utf-8") as policy_file:
+                    policies = json.load(policy_file)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[!] Birleştirme politikaları okunamadı '{name}': {e}")
+
+    if not isinstance(policies, dict):
+        return None
+
+    unknown = {key: policy for key, policy in policies.items() if policy not in MERGE_POLICIES}
+    if unknown:
+        print(f"[!] Bilinmeyen birleştirme politikaları yok sayıldı '{name}': {unknown}")
+    return {key: policy for key, policy in policies.items() if policy in MERGE_POLICIES} or None
+
+
+SCHEMA_CACHE = SchemaCache()
+
+
+def select_schema(name):
+    """Retrieve schema from Redis by name or from filesystem as fallback.
+
+    The parsed schema is shared through SCHEMA_CACHE and must not be modified.
+    """
+    return SCHEMA_CACHE.get(name)["schema"]
+
+
+def get_schema_prompt(type, name):
+    """Rendered prompt for a named schema, cached per schema version."""
+    return SCHEMA_CACHE.prompt(type, name)
+
+
+def get_schema_validator(type, name):
+    """Compiled validator for a named schema, cached per schema version."""
+    return SCHEMA_CACHE.validator(type, name)
+
+
+def get_merge_policies(name):
+    """Return the schema's merge policies ({key: policy, "*": default}) or None.
+
+    Policies are read from the "merge_policies" field of the schema in Redis,
+    or from ./schemas/<name>.merge.json, and cached with the schema in SCHEMA_CACHE.
+    """
+    if not name or name == "*":
+        return None
+
+    try:
+        return SCHEMA_CACHE.get(name)["merge_policies"]
+    except ValueError as e:
+        print(f"[!] Birleştirme politikaları okunamadı '{name}': {e}")
+        return None
@@ -0,0 +1,226 @@
+# result_cache.py
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import redis
+from redis import ConnectionPool
+
+# Önbellek ayarları: "disk", "redis" veya "none"
+CACHE_BACKEND = os.environ.get("RESULT_CACHE_BACKEND", "disk")
+CACHE_TTL = int(os.environ.get("RESULT_CACHE_TTL", 7 * 24 * 3600))  # seconds
+CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", "./cache/results")
+CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 100000))
+# Sınır aşılınca disk önbelleği bu orana kadar boşaltılır; böylece tarama her yazmada tekrarlanmaz
+CACHE_EVICT_TARGET = 0.9
+
+# Sayfa (batch) bazlı LLM çıktısı önbelleği; varsayılan olarak doküman önbelleğiyle aynı arka ucu kullanır
+PAGE_CACHE_BACKEND = os.environ.get("PAGE_CACHE_BACKEND", CACHE_BACKEND)
+PAGE_CACHE_DIR = os.environ.get("PAGE_CACHE_DIR", "./cache/pages")
+
+CACHE_KEY_PREFIX = "result_cache:"
+PAGE_CACHE_KEY_PREFIX = "page_cache:"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+REDIS_POOL = ConnectionPool(
+    host="localhost",
+    port=6379,
+    db=0,
+    decode_responses=True,
+    max_connections=5,
+    socket_timeout=5,
+    socket_connect_timeout=2
+)
+
+
+def file_sha256(file_path):
+    """Hash a file's contents without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(*parts):
+    """Build a cache key from the given parts (file hash, prompt, model, encoding settings...)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class RedisResultCache:
+    """Results stored as JSON strings with a TTL; a sorted set of access times drives LRU eviction."""
+
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, namespace=CACHE_KEY_PREFIX):
+        self.redis_client = redis.Redis(connection_pool=REDIS_POOL)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.namespace = namespace
+        self.lru_key = f"{namespace}lru"
+
+    def get(self, key):
+        value = self.redis_client.get(self.namespace + key)
+        if value is None:
+            return None
+        self.redis_client.zadd(self.lru_key, {key: time.time()})
+        return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        pipe = self.redis_client.pipeline()
+        pipe.set(self.namespace + key, json.dumps(value), ex=self.ttl)
+        pipe.zadd(self.lru_key, {key: now})
+        pipe.zremrangebyscore(self.lru_key, "-inf", now - self.ttl)
+        pipe.zcard(self.lru_key)
+        size = pipe.execute()[-1]
+
+        if size > self.max_entries:
+            evicted = [member for member, _ in self.redis_client.zpopmin(self.lru_key, size - self.max_entries)]
+            if evicted:
+                self.redis_client.delete(*[self.namespace + member for member in evicted])
+
+
+class DiskResultCache:
+    """Results stored as JSON files; file mtime tracks last access for LRU eviction by total size.
+
+    The total size is kept in memory (seeded by one directory scan) so a write only scans the
+    directory when it pushes the cache over max_bytes.
+    """
+
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.total_bytes = sum(size for _, size, _ in self._scan())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if time.time() - entry.get("created_at", 0) > self.ttl:
+            with self._lock:
+                self.total_bytes -= self._remove(path)
+            return None
+
+        os.utime(path)
+        return entry["value"]
+
+    def set(self, key, value):
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time(), "value": value}, f, ensure_ascii=False)
+        new_size = os.path.getsize(temp_path)
+
+        with self._lock:
+            try:
+                old_size = os.path.getsize(path)
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(temp_path, path)
+            self.total_bytes += new_size - old_size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        # Diğer süreçlerin yazdıkları da sayılsın diye toplam tarama ile yeniden hesaplanır
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * CACHE_EVICT_TARGET
+
+        # En uzun süredir erişilmeyen kayıtlardan başlayarak sil
+        for _, _, path in sorted(entries):
+            if total <= target:
+                break
+            total -= self._remove(path)
+        self.total_bytes = total
+
+    def _remove(self, path):
+        """Delete a cache file; return its size, or 0 if it was already gone."""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except FileNotFoundError:
+            return 0
+
+
+class SafeCache:
+    """Wraps a backend so cache failures are logged and treated as misses instead of failing extraction."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            logging.warning(f"Önbellek okuma hatası: {e}")
+            return None
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            logging.warning(f"Önbellek yazma hatası: {e}")
+
+
+_result_cache = None
+_page_cache = None
+_cache_lock = threading.Lock()
+
+
+def _build_cache(backend, directory, namespace):
+    if backend == "redis":
+        return SafeCache(RedisResultCache(namespace=namespace))
+    return SafeCache(DiskResultCache(directory=directory))
+
+
+def get_result_cache():
+    """Return the process-wide result cache, or None when caching is disabled."""
+    global _result_cache
+    if CACHE_BACKEND == "none":
+        return None
+    if _result_cache is None:
+        with _cache_lock:
+            if _result_cache is None:
+                _result_cache = _build_cache(CACHE_BACKEND, CACHE_DIR, CACHE_KEY_PREFIX)
+    return _result_cache
+
+
+def get_page_cache():
+    """Return the process-wide per-batch page cache, or None when it is disabled."""
+    global _page_cache
+    if PAGE_CACHE_BACKEND == "none":
+        return None
+    if _page_cache is None:
+        with _cache_lock:
+            if _page_cache is None:
+                _page_cache = _build_cache(PAGE_CACHE_BACKEND, PAGE_CACHE_DIR, PAGE_CACHE_KEY_PREFIX)
+    return _page_cache
@@ -0,0 +1,199 @@
+# retry_policy.py
+import os
+import re
+import time
+import asyncio
+import random
+import threading
+import logging
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# LLM isteklerinde yeniden denenecek durum kodları
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+MAX_ATTEMPTS = int(os.environ.get("LLM_RETRY_MAX_ATTEMPTS", 5))
+BASE_DELAY = float(os.environ.get("LLM_RETRY_BASE_DELAY", 1.0))  # seconds
+MAX_DELAY = float(os.environ.get("LLM_RETRY_MAX_DELAY", 60.0))  # seconds
+# Bir doküman için tüm batch'ler boyunca yapılabilecek toplam yeniden deneme sayısı
+DOCUMENT_RETRY_BUDGET = int(os.environ.get("LLM_DOCUMENT_RETRY_BUDGET", 20))
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def _parse_duration(value):
+    """Parse rate-limit reset values such as "20ms", "1s" or "6m0s" into seconds."""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def parse_retry_after(headers):
+    """Return the server-requested wait in seconds, or None if the response gives no hint."""
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    # OpenAI uyumlu rate-limit başlıkları: yalnızca tükenmiş limitin sıfırlanma süresi dikkate alınır
+    waits = []
+    for limit in ("requests", "tokens"):
+        if headers.get(f"x-ratelimit-remaining-{limit}") == "0":
+            reset = headers.get(f"x-ratelimit-reset-{limit}")
+            wait = _parse_duration(reset) if reset else None
+            if wait is not None:
+                waits.append(wait)
+    return max(waits) if waits else None
+
+
+class RetryBudget:
+    """Thread-safe retry allowance shared by all batches of one document."""
+
+    def __init__(self, limit=DOCUMENT_RETRY_BUDGET):
+        self.limit = limit
+        self.retries = 0
+        self.give_ups = 0
+        self._lock = threading.Lock()
+
+    def consume(self):
+        with self._lock:
+            if self.retries >= self.limit:
+                return False
+            self.retries += 1
+            return True
+
+    def record_give_up(self):
+        with self._lock:
+            self.give_ups += 1
+
+    def get_stats(self):
+        return {"retries": self.retries, "give_ups": self.give_ups, "budget": self.limit}
+
+
+class RetryStats:
+    """Process-wide retry counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {"retries": 0, "give_ups": 0, "throttled": 0}
+
+    def increment(self, name):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+RETRY_STATS = RetryStats()
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter that honors Retry-After and rate-limit headers."""
+
+    def __init__(self, max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def delay_for(self, response, attempt):
+        """Seconds to wait before the next attempt, or None if the server asks for more than max_delay."""
+        if response is not None:
+            server_delay = parse_retry_after(response.headers)
+            if server_delay is not None:
+                if server_delay > self.max_delay:
+                    # Süre kırpılıp erken denenirse istek yine reddedilir; hata çağırana bırakılır
+                    return None
+                # Sunucunun istediği süreye küçük bir jitter eklenir; tüm istekler aynı anda dönmesin
+                return min(self.max_delay, server_delay + random.uniform(0, self.base_delay))
+        return self.backoff(attempt)
+
+    def send(self, request_func, budget=None):
+        """Call request_func until it returns a non-retryable response or retries run out.
+
+        The last response is returned (or the last connection error re-raised) when
+        giving up, so callers keep their existing error handling. A response whose
+        Retry-After exceeds max_delay is returned right away instead of being retried early.
+        """
+        for attempt in range(self.max_attempts):
+            try:
+                response = request_func()
+            except (requests.ConnectionError, requests.Timeout):
+                delay = self._retry_delay(None, attempt, budget)
+                if delay is None:
+                    raise
+            else:
+                if not self._is_retryable(response):
+                    return response
+                delay = self._retry_delay(response, attempt, budget)
+                if delay is None:
+                    return response
+            time.sleep(delay)
+
+    async def send_async(self, request_func, budget=None, retry_exceptions=()):
+        """Async variant of send(); request_func returns an awaitable response."""
+        for attempt in range(self.max_attempts):
+            try:
+                response = await request_func()
+            except retry_exceptions:
+                delay = self._retry_delay(None, attempt, budget)
+                if delay is None:
+                    raise
+            else:
+                if not self._is_retryable(response):
+                    return response
+                delay = self._retry_delay(response, attempt, budget)
+                if delay is None:
+                    return response
+            await asyncio.sleep(delay)
+
+    def _is_retryable(self, response):
+        if response.status_code == 429:
+            RETRY_STATS.increment("throttled")
+        return response.status_code in RETRYABLE_STATUS_CODES
+
+    def _retry_delay(self, response, attempt, budget):
+        """Delay before the next attempt, or None when giving up."""
+        reason = response.status_code if response is not None else "bağlantı hatası"
+        delay = self.delay_for(response, attempt)
+        if delay is None:
+            logging.warning(f"LLM isteği yeniden denenmeyecek ({reason}): sunucu {self.max_delay:.0f}s "
+                            f"sınırından uzun bekleme istedi")
+            self._give_up(budget)
+            return None
+        if attempt + 1 >= self.max_attempts or (budget is not None and not budget.consume()):
+            self._give_up(budget)
+            return None
+        RETRY_STATS.increment("retries")
+        logging.warning(f"LLM isteği yeniden denenecek ({reason}), {delay:.1f}s bekleniyor "
+                        f"(deneme {attempt + 1}/{self.max_attempts})")
+        return delay
+
+    def _give_up(self, budget):
+        RETRY_STATS.increment("give_ups")
+        if budget is not None:
+            budget.record_give_up()
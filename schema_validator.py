@@ -0,0 +1,165 @@
+# schema_validator.py
+import os
+import json
+import threading
+from collections import OrderedDict
+
+# Derlenmiş doğrulayıcıların bellekte tutulacağı en fazla şema sayısı
+VALIDATOR_CACHE_SIZE = int(os.environ.get("SCHEMA_VALIDATOR_CACHE_SIZE", 256))
+
+TYPE_CHECKS = {
+    "string": str,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+KEY_VIOLATIONS = {"missing_key", "unexpected_key", "not_object", "invalid_schema"}
+TYPE_VIOLATIONS = {"type_mismatch", "not_object", "invalid_schema", "unsupported_mode"}
+
+
+class _Leaf:
+    __slots__ = ("expected", "check")
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.check = TYPE_CHECKS.get(expected) if isinstance(expected, str) else None
+
+
+class _List:
+    __slots__ = ("item",)
+
+    def __init__(self, item):
+        self.item = item
+
+
+class _Object:
+    __slots__ = ("fields", "allow_extra")
+
+    def __init__(self, fields, allow_extra=False):
+        self.fields = fields
+        self.allow_extra = allow_extra
+
+
+def _compile_node(schema):
+    if isinstance(schema, dict):
+        return _Object({key: _compile_node(value) for key, value in schema.items()})
+    # Yalnızca nesne dizilerinin elemanları doğrulanır
+    if isinstance(schema, list):
+        return _List(_compile_node(schema[0]) if schema and isinstance(schema[0], dict) else None)
+    return _Leaf(schema)
+
+
+def _parse_fields(fields):
+    """"name:string, total:number" -> _Object; a field without ":type" is only checked for presence."""
+    compiled = {}
+    for field in fields.split(","):
+        name, _, expected = field.partition(":")
+        if name.strip():
+            compiled[name.strip()] = _Leaf(expected.strip() or None)
+    return _Object(compiled, allow_extra=True)
+
+
+class SchemaValidator:
+    """A schema ("schema" mode JSON or "field" mode list) compiled once into a tree of checks.
+
+    validate() walks the result once and returns every violation with its path.
+    """
+
+    def __init__(self, schema, type="schema"):
+        self.type = type
+        self.error = None
+        self.error_message = None
+        self.root = None
+        try:
+            if type == "field":
+                self.root = _parse_fields(schema)
+            elif type == "schema":
+                parsed = json.loads(schema) if isinstance(schema, str) else schema
+                if not isinstance(parsed, dict):
+                    raise ValueError("şema bir JSON nesnesi olmalı")
+                self.root = _compile_node(parsed)
+            else:
+                self.error = "unsupported_mode"
+        except (ValueError, TypeError, AttributeError) as e:
+            self.error = "invalid_schema"
+            self.error_message = str(e)
+
+    def validate(self, result):
+        """Return a list of {"path", "kind", ...} violations; an empty list means valid."""
+        if self.error:
+            violation = {"path": "", "kind": self.error}
+            if self.error_message:
+                violation["message"] = self.error_message
+            return [violation]
+        violations = []
+        self._check_object(self.root, result, "", violations)
+        return violations
+
+    def check(self, result):
+        """Return (keys_valid, types_valid) like json_utils.validate."""
+        kinds = {violation["kind"] for violation in self.validate(result)}
+        return not (kinds & KEY_VIOLATIONS), not (kinds & TYPE_VIOLATIONS)
+
+    def _check_object(self, node, value, path, violations):
+        if not isinstance(value, dict):
+            violations.append({"path": path, "kind": "not_object", "actual": type(value).__name__})
+            return
+
+        for key, child in node.fields.items():
+            child_path = f"{path}.{key}" if path else key
+            if key not in value:
+                violations.append({"path": child_path, "kind": "missing_key"})
+            else:
+                self._check_value(child, value[key], child_path, violations)
+
+        if not node.allow_extra:
+            for key in value:
+                if key not in node.fields:
+                    violations.append({"path": f"{path}.{key}" if path else key, "kind": "unexpected_key"})
+
+    def _check_value(self, node, value, path, violations):
+        if value is None:
+            return
+        if isinstance(node, _Leaf):
+            if node.check and not isinstance(value, node.check):
+                violations.append({"path": path, "kind": "type_mismatch", "expected": node.expected,
+                                   "actual": type(value).__name__})
+        elif isinstance(node, _Object):
+            # Şemada nesne beklenen yerde başka tür gelmesi şimdiye kadar olduğu gibi hata sayılmaz
+            if isinstance(value, dict):
+                self._check_object(node, value, path, violations)
+        elif node.item is not None and isinstance(value, list):
+            for index, item in enumerate(value):
+                self._check_object(node.item, item, f"{path}[{index}]", violations)
+
+
+_validators = OrderedDict()
+_validators_lock = threading.Lock()
+
+
+def get_validator(schema, type="schema"):
+    """Return the compiled validator for a schema.
+
+    Schema text and field lists are compiled once and kept in an LRU cache keyed by the
+    text. A named schema should come from prompt_utils.get_schema_validator, which keeps
+    its validator with the cached schema version; a SchemaValidator is returned as is
+    and any other parsed schema is compiled without caching.
+    """
+    if isinstance(schema, SchemaValidator):
+        return schema
+    if not isinstance(schema, str):
+        return SchemaValidator(schema, type)
+
+    cache_key = (type, schema)
+    with _validators_lock:
+        validator = _validators.get(cache_key)
+        if validator is not None:
+            _validators.move_to_end(cache_key)
+            return validator
+
+    validator = SchemaValidator(schema, type)
+    with _validators_lock:
+        _validators[cache_key] = validator
+        while len(_validators) > VALIDATOR_CACHE_SIZE:
+            _validators.popitem(last=False)
+    return validator
@@ -0,0 +1,79 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+
+pytest.importorskip("multipart")
+httpx = pytest.importorskip("httpx")
+
+import api
+from upload_store import UploadStore
+
+
+def test_batch_meta_counts_every_failed_file(monkeypatch):
+    async def store_batch_files(files):
+        return [
+            {"file": "bozuk.zip", "error": "Zip arşivi açılamadı"},
+            {"file": "a.pdf", "path": "/tmp/a.pdf", "hash": "a"},
+            {"file": "b.pdf", "path": "/tmp/b.pdf", "hash": "b"},
+            {"file": "c.pdf", "path": "/tmp/c.pdf", "hash": "c"},
+            {"file": "d.pdf", "path": "/tmp/d.pdf", "hash": "d"},
+        ]
+
+    async def run_parser_async(file_path, **params):
+        if file_path.endswith("b.pdf"):
+            raise RuntimeError("LLM yanıt vermedi")
+        if file_path.endswith("c.pdf"):
+            return {"error": "Geçerli bir JSON bulunamadı.", "meta": {"failed_batches": 1}}
+        if file_path.endswith("d.pdf"):
+            return {"error": "Dosya bulunamadı: /tmp/d.pdf"}
+        return {"no": "A1", "meta": {"failed_batches": 0}}
+
+    monkeypatch.setattr(api, "_store_batch_files", store_batch_files)
+    monkeypatch.setattr(api, "run_parser_async", run_parser_async)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return (await client.post("/api/extract-batch", files={"files": ("a.pdf", b"%PDF")})).json()
+
+    response = asyncio.run(scenario())
+    assert [item["file"] for item in response["results"]] == ["bozuk.zip", "a.pdf", "b.pdf", "c.pdf", "d.pdf"]
+    assert "error" in response["results"][3]["result"]
+    assert response["meta"] == {"files": 5, "errors": 4}
+
+
+def _encrypted_zip():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("fatura.pdf", b"%PDF-1.4")
+        archive.writestr("ek.pdf", b"%PDF-1.5")
+    data = bytearray(buffer.getvalue())
+    # İlk üyenin merkezi dizin kaydında "şifreli" bayrağı işaretlenir
+    flags = data.index(b"PK\x01\x02") + 8
+    data[flags] |= 0x1
+    return bytes(data)
+
+
+def test_unreadable_archive_is_a_per_file_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "upload_store", UploadStore(str(tmp_path)))
+
+    async def run_parser_async(file_path, **params):
+        return {"no": "A1"}
+
+    monkeypatch.setattr(api, "run_parser_async", run_parser_async)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            files = [("files", ("arsiv.zip", _encrypted_zip())), ("files", ("a.pdf", b"%PDF-1.4"))]
+            return await client.post("/api/extract-batch", files=files)
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["file"] == "arsiv.zip"
+    assert "encrypted" in results[0]["error"]
+    assert results[1]["result"] == {"no": "A1"}
+    assert response.json()["meta"] == {"files": 2, "errors": 1}
@@ -0,0 +1,64 @@
+import batch_planner
+from batch_planner import BatchPlanner, estimate_image_tokens, get_model_budget
+
+
+def _pages(*sizes):
+    return [{"text": "x" * size} for size in sizes]
+
+
+def test_model_budget_longest_prefix():
+    assert get_model_budget("gpt-4o-mini-2024")["base_tokens"] == 2833
+    assert get_model_budget("gpt-4o")["base_tokens"] == 85
+    assert get_model_budget("llava") == batch_planner.MODEL_BUDGETS["default"]
+
+
+def test_image_tokens():
+    # 1700x2200 -> 768x994 -> 2x2 karo
+    assert estimate_image_tokens(1700, 2200) == 85 + 4 * 170
+    assert estimate_image_tokens(None, None) == 85 + 6 * 170
+
+
+def test_pack_respects_page_limit_in_order():
+    planner = BatchPlanner("gpt-4o")
+    planner.pages_per_batch = 2
+    pages = _pages(4, 8, 12, 16, 20)
+    batches = list(planner.pack(pages))
+    assert batches == [pages[0:2], pages[2:4], pages[4:]]
+    assert planner.get_stats() == {"batches": 3, "pages": 5, "estimated_tokens": 15, "bytes": 60,
+                                   "pages_per_batch": 2}
+
+
+def test_pack_splits_on_token_and_byte_budgets(monkeypatch):
+    monkeypatch.setattr(batch_planner, "OUTPUT_TOKEN_RESERVE", 0)
+    planner = BatchPlanner("gpt-4o")
+    planner.budget.update(max_tokens=10, max_bytes=1000)
+    pages = _pages(20, 20, 60, 4)
+    # Tek başına bütçeyi aşan sayfa kendi batch'inde gönderilir
+    assert list(planner.pack(pages)) == [pages[0:2], [pages[2]], [pages[3]]]
+
+    planner = BatchPlanner("gpt-4o", prompt="abcd")
+    planner.budget.update(max_bytes=30)
+    assert list(planner.pack(pages[:2])) == [[pages[0]], [pages[1]]]
+
+
+def test_pack_is_lazy():
+    planner = BatchPlanner("gpt-4o")
+    planner.pages_per_batch = 1
+    consumed = []
+
+    def pages():
+        for page in _pages(4, 4, 4):
+            consumed.append(page)
+            yield page
+
+    batches = planner.pack(pages())
+    next(batches)
+    # İkinci sayfa okununca ilk batch hemen döner
+    assert len(consumed) == 2
+
+
+def test_plan_evens_out_batches():
+    planner = BatchPlanner("gpt-4o", max_concurrency=1, latency_target=1000)
+    assert planner.plan(20) == 10
+    planner = BatchPlanner("gpt-4o", max_concurrency=4, latency_target=1)
+    assert planner.plan(8) == 2
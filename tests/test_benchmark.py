@@ -0,0 +1,26 @@
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("pymongo")
+
+from benchmark import DEAD_LETTER_QUEUE, PROCESSED_COUNTER, ProgressProbe, counter_delta
+
+
+def test_probe_counts_dead_letters_and_its_own_commands():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    client.set(PROCESSED_COUNTER, 5)
+    client.rpush(DEAD_LETTER_QUEUE, "old")
+    probe = ProgressProbe(client)
+    probe.start_counting()
+
+    client.incr(PROCESSED_COUNTER)
+    client.rpush(DEAD_LETTER_QUEUE, "doc-2")
+    assert probe.progress() == (1, 1)
+    assert sum(probe.progress()) == 2
+    assert probe.own_commands() == {"info": 1, "get": 2, "llen": 2}
+
+
+def test_counter_delta_excludes_own_commands():
+    before = {"get": 10, "info": 3, "evalsha": 4}
+    after = {"get": 25, "info": 4, "evalsha": 10, "llen": 3}
+    assert counter_delta(before, after, {"get": 12, "llen": 3, "info": 1}) == {"evalsha": 6, "get": 3}
@@ -0,0 +1,270 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("lupa")
+fakeredis = pytest.importorskip("fakeredis")
+httpx = pytest.importorskip("httpx")
+
+import coordinator
+
+SCRIPTS = {
+    "claim_document": coordinator.CLAIM_DOCUMENT_LUA,
+    "complete_document": coordinator.COMPLETE_DOCUMENT_LUA,
+    "renew_lease": coordinator.RENEW_LEASE_LUA,
+    "reap_leases": coordinator.REAP_LEASES_LUA,
+}
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+
+    async def insert_one(self, document):
+        self.documents.append(document)
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    server = fakeredis.FakeServer()
+    client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    monkeypatch.setattr(coordinator, "redis_client", client)
+    monkeypatch.setattr(coordinator, "_queue_events_client",
+                        lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+    for name, lua in SCRIPTS.items():
+        monkeypatch.setattr(coordinator, name, client.register_script(lua))
+    monkeypatch.setattr(coordinator, "results_collection", FakeCollection())
+    monkeypatch.setattr(coordinator, "errors_collection", FakeCollection())
+    return client
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def _register(client, name):
+    response = await client.post("/api/register-worker", json={"worker_name": name, "api_url": "x", "model": "m"})
+    return response.json()["worker_id"]
+
+
+async def _complete(client, worker_id, document_id, result=None):
+    return await client.post("/api/document-processed", params={"worker_id": worker_id, "document_id": document_id},
+                             json={"result": result or {}})
+
+
+def _app_client():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=coordinator.app), base_url="http://test")
+
+
+def test_claim_and_complete(redis_client):
+    async def scenario():
+        async with _app_client() as client:
+            worker_id = await _register(client, "w1")
+            empty = await client.get(f"/api/next-document/{worker_id}", params={"wait": 0})
+            assert empty.json() == {"status": "No documents in queue"}
+
+            await client.post("/api/enqueue", params={"file_path": "/a.pdf"})
+            claimed = (await client.get(f"/api/next-document/{worker_id}", params={"wait": 0})).json()
+            document_id = claimed["document"]["id"]
+            assert claimed["status"] == "Document assigned"
+            assert await redis_client.hget(coordinator.INFLIGHT_WORKERS, document_id) == worker_id
+            assert await redis_client.zscore(coordinator.DOCUMENT_LEASES, document_id) is not None
+
+            assert (await _complete(client, worker_id, document_id)).status_code == 200
+            assert await redis_client.hlen(coordinator.INFLIGHT_DOCUMENTS) == 0
+            assert await redis_client.zcard(coordinator.DOCUMENT_LEASES) == 0
+            assert await redis_client.get(coordinator.PROCESSED_COUNTER) == "1"
+            assert len(coordinator.results_collection.documents) == 1
+
+            # Tekrar bildirim sahiplik kontrolünden geçemez
+            assert (await _complete(client, worker_id, document_id)).status_code == 409
+            assert await redis_client.get(coordinator.PROCESSED_COUNTER) == "1"
+
+    run(scenario())
+
+
+def test_complete_by_previous_owner_is_rejected(redis_client):
+    async def scenario():
+        async with _app_client() as client:
+            first = await _register(client, "w1")
+            second = await _register(client, "w2")
+            await client.post("/api/enqueue", params={"file_path": "/a.pdf"})
+            document_id = (await client.get(f"/api/next-document/{first}", params={"wait": 0})).json()["document"]["id"]
+
+            # Kira dolar, belge ikinci worker'a geçer
+            await redis_client.hset(coordinator.INFLIGHT_WORKERS, document_id, second)
+
+            assert (await _complete(client, first, document_id)).status_code == 409
+            assert await redis_client.hexists(coordinator.INFLIGHT_DOCUMENTS, document_id)
+            assert await redis_client.zscore(coordinator.DOCUMENT_LEASES, document_id) is not None
+            assert coordinator.results_collection.documents == []
+
+            assert (await _complete(client, second, document_id)).status_code == 200
+            assert len(coordinator.results_collection.documents) == 1
+
+    run(scenario())
+
+
+def test_claim_rejects_unregistered_and_stopped_workers(redis_client):
+    async def scenario():
+        async with _app_client() as client:
+            response = await client.get("/api/next-document/unknown", params={"wait": 0})
+            assert response.json() == {"error": "Worker not registered"}
+
+            worker_id = await _register(client, "w1")
+            await client.post("/api/enqueue", params={"file_path": "/a.pdf"})
+            await client.post(f"/api/worker/stop/{worker_id}")
+            response = (await client.get(f"/api/next-document/{worker_id}", params={"wait": 0})).json()
+            assert response["worker_state"] == "stopped"
+            assert await redis_client.llen(coordinator.DOCUMENT_QUEUE) == 1
+
+    run(scenario())
+
+
+async def _claim(worker_id):
+    outcome = await coordinator._claim_next_document(worker_id)
+    return json.loads(outcome[1])["id"] if outcome[0] == "assigned" else None
+
+
+def test_renew_lease_only_for_owner(redis_client):
+    async def scenario():
+        await redis_client.sadd(coordinator.WORKERS_SET, "w1")
+        await redis_client.lpush(coordinator.DOCUMENT_QUEUE, json.dumps({"id": "d1", "path": "/a.pdf"}))
+        assert await _claim("w1") == "d1"
+
+        keys = [coordinator.INFLIGHT_WORKERS, coordinator.DOCUMENT_LEASES]
+        assert await coordinator.renew_lease(keys=keys, args=["w1", "d1", 10 ** 10]) == 1
+        assert await redis_client.zscore(coordinator.DOCUMENT_LEASES, "d1") == 10 ** 10
+        assert await coordinator.renew_lease(keys=keys, args=["w2", "d1", 1]) == 0
+        assert await coordinator.renew_lease(keys=keys, args=["w1", "missing", 1]) == 0
+        assert await redis_client.zcard(coordinator.DOCUMENT_LEASES) == 1
+
+    run(scenario())
+
+
+def test_reaper_requeues_then_dead_letters(redis_client, monkeypatch):
+    monkeypatch.setattr(coordinator, "DOCUMENT_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(coordinator, "LEASE_REAPER_BATCH", 2)
+
+    async def scenario():
+        await redis_client.sadd(coordinator.WORKERS_SET, "w1")
+        for index in range(3):
+            await redis_client.lpush(coordinator.DOCUMENT_QUEUE, json.dumps({"id": f"d{index}", "path": "/a.pdf"}))
+        claimed = [await _claim("w1") for _ in range(3)]
+        assert claimed == ["d0", "d1", "d2"]
+
+        # Kirası dolmayan belgeye dokunulmaz
+        assert await coordinator.reap_expired_leases(now=0) == (0, 0)
+
+        far_future = 10 ** 10
+        assert await coordinator.reap_expired_leases(now=far_future) == (3, 0)
+        assert await redis_client.hlen(coordinator.INFLIGHT_DOCUMENTS) == 0
+        assert await redis_client.hget(coordinator.DOCUMENT_ATTEMPTS, "d0") == "1"
+        # Yeniden kuyruğa giren belgeler yeni belgelerden önce alınır
+        await redis_client.lpush(coordinator.DOCUMENT_QUEUE, json.dumps({"id": "new", "path": "/b.pdf"}))
+        assert {await _claim("w1") for _ in range(3)} == {"d0", "d1", "d2"}
+
+        assert await coordinator.reap_expired_leases(now=far_future) == (0, 3)
+        assert await redis_client.llen(coordinator.DEAD_LETTER_QUEUE) == 3
+        assert await redis_client.lrange(coordinator.DOCUMENT_QUEUE, 0, -1) == [json.dumps({"id": "new", "path": "/b.pdf"})]
+        assert await redis_client.hlen(coordinator.DOCUMENT_ATTEMPTS) == 0
+
+    run(scenario())
+
+
+def test_lifespan_starts_and_cancels_background_tasks(redis_client, monkeypatch):
+    class FakeMongoClient:
+        async def close(self):
+            self.closed = True
+
+    mongo_client = FakeMongoClient()
+    monkeypatch.setattr(coordinator, "mongo_client", mongo_client)
+
+    async def scenario():
+        tasks_before = asyncio.all_tasks()
+        async with coordinator.lifespan(coordinator.app):
+            background = asyncio.all_tasks() - tasks_before - {asyncio.current_task()}
+            assert len(background) == 2
+        assert all(task.done() for task in background)
+        assert mongo_client.closed
+
+    run(scenario())
+
+
+def test_long_poll_parks_without_polling_redis(redis_client, monkeypatch):
+    claims = []
+    claim = coordinator._claim_next_document
+
+    async def counting_claim(worker_id):
+        claims.append(worker_id)
+        return await claim(worker_id)
+
+    monkeypatch.setattr(coordinator, "_claim_next_document", counting_claim)
+
+    async def scenario():
+        async with _app_client() as client:
+            worker_id = await _register(client, "w1")
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            parked = asyncio.create_task(client.get(f"/api/next-document/{worker_id}", params={"wait": 10}))
+            await asyncio.sleep(1.5)
+            assert len(claims) == 1
+
+            await client.post("/api/enqueue", params={"file_path": "/a.pdf"})
+            response = (await parked).json()
+            assert response["status"] == "Document assigned"
+            assert loop.time() - started < 3
+            assert len(claims) == 2
+            assert coordinator._document_waiters == {}
+
+            timed_out = await client.get(f"/api/next-document/{worker_id}", params={"wait": 0.2})
+            assert timed_out.json() == {"status": "No documents in queue"}
+
+    run(scenario())
+
+
+def test_documents_queued_by_another_process_wake_waiters(redis_client):
+    async def scenario():
+        listener = asyncio.create_task(coordinator.queue_events_listener())
+        waiter = asyncio.get_running_loop().create_future()
+        coordinator._document_waiters[waiter] = None
+        try:
+            await asyncio.sleep(0.1)
+            # Kendi yayınları yok sayılır, diğer süreçlerinki uyandırır
+            await redis_client.publish(coordinator.DOCUMENTS_QUEUED_CHANNEL, coordinator._queued_event(1))
+            await asyncio.sleep(0.1)
+            assert not waiter.done()
+            await redis_client.publish(coordinator.DOCUMENTS_QUEUED_CHANNEL,
+                                       json.dumps({"origin": "other", "count": 1}))
+            await asyncio.wait_for(waiter, 2)
+        finally:
+            coordinator._document_waiters.pop(waiter, None)
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+
+    run(scenario())
+
+
+def test_add_schema_replaces_hash_then_publishes(redis_client):
+    async def scenario():
+        pubsub = redis_client.pubsub()
+        await pubsub.subscribe(coordinator.SCHEMA_UPDATES_CHANNEL)
+        await pubsub.get_message(timeout=1)
+        async with _app_client() as client:
+            await client.post("/api/schema", json={"name": "invoice", "content": {"a": 1},
+                                                   "merge_policies": {"a": "last"}})
+            await client.post("/api/schema", json={"name": "invoice", "content": {"b": 2}})
+
+        schema = await redis_client.hgetall("schema:invoice")
+        # Eski hash'in alanları (merge_policies) yeni sürümde kalmaz
+        assert json.loads(schema["content"]) == {"b": 2}
+        assert "merge_policies" not in schema
+        assert schema["version"] == "2"
+        assert await redis_client.smembers(coordinator.SCHEMAS_SET) == {"invoice"}
+
+        published = [await pubsub.get_message(timeout=1) for _ in range(2)]
+        assert [message["data"] for message in published] == ["invoice", "invoice"]
+        await pubsub.aclose()
+
+    run(scenario())
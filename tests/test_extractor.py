@@ -0,0 +1,42 @@
+from extractor import Extractor
+
+
+class DictCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries[key] = value
+
+
+def _extractor(replies):
+    extractor = Extractor(use_page_cache=False)
+    extractor.page_cache = DictCache()
+    extractor._start_run()
+    calls = []
+
+    def call_api(api_url, model, api_key, pages, prompt):
+        calls.append([page["page"] for page in pages])
+        return replies.pop(0)
+
+    extractor._call_api = call_api
+    return extractor, calls
+
+
+def _run(extractor, batches):
+    return extractor._dispatch_batches("http://llm", "m", "k", batches, "prompt")
+
+
+def test_only_replies_with_json_are_page_cached():
+    batches = [[{"page": 1, "hash": "a"}], [{"page": 2, "hash": "b"}], [{"page": 3, "hash": "c"}]]
+    extractor, calls = _extractor(['{"no": "A1"}', "Sorry, I cannot read this invoice.", {"error": "timeout"}])
+    _run(extractor, batches)
+    assert len(extractor.page_cache.entries) == 1
+
+    extractor._call_api = lambda *args: calls.append("api") or '{"no": "B2"}'
+    assert _run(extractor, batches) == ['{"no": "A1"}', '{"no": "B2"}', '{"no": "B2"}']
+    assert extractor.stats["page_cache"] == {"hits": 1, "misses": 2}
+    assert calls.count("api") == 2
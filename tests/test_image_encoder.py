@@ -0,0 +1,38 @@
+import base64
+import io
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from image_encoder import EXIF_ORIENTATION, ImageEncoder
+
+
+def _photo(path, orientation=None):
+    # Sol yarısı siyah yatay fotoğraf; orientation=6 telefonun dik tutulduğunu söyler
+    image = Image.new("RGB", (400, 200), "white")
+    image.paste((0, 0, 0), (0, 0, 200, 200))
+    exif = Image.Exif()
+    if orientation:
+        exif[EXIF_ORIENTATION] = orientation
+    image.save(path, "JPEG", quality=90, exif=exif.tobytes())
+    return path
+
+
+def _decode(page):
+    return Image.open(io.BytesIO(base64.b64decode(page["data"])))
+
+
+def test_exif_orientation_is_applied(tmp_path):
+    page = ImageEncoder().encode_file(str(_photo(tmp_path / "dik.jpg", orientation=6)))
+    image = _decode(page)
+    assert (page["width"], page["height"]) == image.size == (200, 400)
+    assert image.getexif().get(EXIF_ORIENTATION, 1) == 1
+    # 90° saat yönünde döndürülünce siyah yarı üste gelir
+    assert image.convert("L").getpixel((100, 50)) < 64
+    assert image.convert("L").getpixel((100, 350)) > 192
+
+
+def test_upright_photo_keeps_its_size(tmp_path):
+    page = ImageEncoder().encode_file(str(_photo(tmp_path / "yatay.jpg")))
+    assert (page["width"], page["height"]) == _decode(page).size == (400, 200)
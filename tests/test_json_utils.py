@@ -0,0 +1,92 @@
+import pytest
+
+from json_utils import (extract_json_objects, extract_json_from_text, merge_json_list, validate,
+                        validation_errors)
+from parser_utils import _parse_batch_text
+from schema_validator import get_validator
+
+
+def test_single_object():
+    assert extract_json_objects('{"a": 1}') == [{"a": 1}]
+
+
+def test_truncated_response_yields_no_nested_objects():
+    text = 'Fatura: {"items": [{"name": "pen", "price": 1}, {"name": "ink", "price": 2}'
+    assert extract_json_objects(text) == []
+    assert _parse_batch_text(text) == [{"error": "Geçerli bir JSON bulunamadı."}]
+
+
+def test_fenced_blocks_are_preferred():
+    text = 'Sonuç:\n```json\n{"a": 1}\n```\nayrıca {"z": 9}'
+    assert extract_json_objects(text) == [{"a": 1}]
+
+
+def test_multiple_objects_in_order():
+    text = '{"a": 1}\n{"b": 2}\n[{"c": 3}, {"d": 4}]'
+    assert extract_json_objects(text) == [{"a": 1}, {"b": 2}, {"c": 3}, {"d": 4}]
+    assert extract_json_from_text('{"a": 1} {"a": 2}') == {"a": [1, 2]}
+
+
+def test_prose_with_braces_is_skipped():
+    text = 'Alanlar {isim} ve {tutar} şeklinde: {"isim": "x", "not": "a}b{\\"c"}'
+    assert extract_json_objects(text) == [{"isim": "x", "not": 'a}b{"c'}]
+
+
+def test_broken_outer_value_skips_its_nested_objects():
+    text = '{"items": [{"name": "pen"}], oops} {"ok": true}'
+    assert extract_json_objects(text) == [{"ok": True}]
+
+
+def test_non_string_input():
+    assert extract_json_objects(None) == []
+
+
+BATCHES = [
+    {"no": "A1", "total": 10, "items": [1, 2], "note": None},
+    {"no": "A1", "total": 12, "items": [2, 3]},
+    {"no": "A1", "total": 12, "note": "x"},
+]
+
+
+def test_merge_collects_conflicts_and_concatenates_lists():
+    assert merge_json_list(BATCHES) == {"no": "A1", "total": [10, 12], "items": [1, 2, 3], "note": "x"}
+
+
+@pytest.mark.parametrize("policy, expected", [
+    ("collect", [10, 12]),
+    ("first", 10),
+    ("last", 12),
+    ("most_common", 12),
+])
+def test_merge_policies(policy, expected):
+    assert merge_json_list(BATCHES, {"total": policy})["total"] == expected
+
+
+def test_merge_default_policy_and_ties():
+    merged = merge_json_list([{"a": 1, "b": "x"}, {"a": 2, "b": "y"}], {"*": "most_common", "b": "last"})
+    assert merged == {"a": 1, "b": "y"}
+    assert merge_json_list([{"a": 1}, {"a": True}, {"a": 1.0}]) == {"a": [1, True, 1.0]}
+
+
+def test_merge_edge_cases():
+    with pytest.raises(ValueError):
+        merge_json_list([])
+    assert merge_json_list([{"a": None}, "not a dict", {"b": 1}]) == {"a": None, "b": 1}
+
+
+def test_validation_reuses_compiled_text_schemas():
+    schema = '{"no": "string", "items": [{"price": "number"}]}'
+    assert get_validator(schema) is get_validator(schema)
+    assert get_validator(get_validator(schema)) is get_validator(schema)
+    assert validate({"no": "A1", "items": []}, schema, "schema") == (True, True)
+    assert validation_errors({"no": "A1", "items": [{"price": "1"}]}, schema, "schema") == [
+        {"path": "items[0].price", "kind": "type_mismatch", "expected": "number", "actual": "str"}]
+    assert validate({"name": "x"}, "name:string, total", "field") == (False, True)
+
+
+def test_unclosed_bracket_in_prose_does_not_swallow_payload():
+    assert extract_json_objects('Use { to open. Result: {"a": 1}') == [{"a": 1}]
+    assert extract_json_objects('Alanlar {isim ve [tutar: {"a": 2} sonra {"b": 3}') == [{"a": 2}, {"b": 3}]
+    # Yarıda kesilen değerlerin iç nesneleri yine döndürülmez
+    assert extract_json_objects('{"a": {"b": 1}, "c": "yarım') == []
+    assert extract_json_objects('{"a": {"b": 1}, "c": tr') == []
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("uvicorn")
+pytest.importorskip("httpx")
+
+from mock_llm_server import MockLLM, schema_shaped_response
+from prompt_utils import prompt_generator
+
+BODY = {"model": "m", "messages": [{"role": "user", "content": "- total: number"}]}
+
+
+def test_record_mode_skips_injected_failures(tmp_path, monkeypatch):
+    cassette = tmp_path / "cassette.jsonl"
+    mock = MockLLM(error_rate=0.5, throttle_rate=0.5, latency="fixed:30", cassette=str(cassette),
+                   record_url="http://upstream", seed=1)
+    upstream = iter([(200, {"answer": 1}), (503, {"error": {"message": "busy"}})])
+
+    async def forward(body, headers):
+        return next(upstream)
+
+    monkeypatch.setattr(mock, "_forward", forward)
+    assert asyncio.run(mock.handle(BODY, {})) == (200, {"answer": 1}, {})
+    assert asyncio.run(mock.handle(BODY, {}))[0] == 503
+
+    entries = [json.loads(line) for line in cassette.read_text(encoding="utf-8").splitlines()]
+    assert [entry["status"] for entry in entries] == [200]
+    assert mock.stats["errors"] == mock.stats["throttled"] == 0
+    assert mock.stats["recorded"] == 1
+
+
+def test_injection_and_replay_miss(tmp_path):
+    throttled = MockLLM(throttle_rate=1.0, seed=1)
+    status, _, headers = asyncio.run(throttled.handle(BODY, {}))
+    assert (status, headers) == (429, {"Retry-After": "1.0"})
+
+    generated = MockLLM(seed=1)
+    status, body, _ = asyncio.run(generated.handle(BODY, {}))
+    assert status == 200
+    assert json.loads(body["choices"][0]["message"]["content"]) == {"total": 0}
+
+    replay = MockLLM(cassette=str(tmp_path / "cassette.jsonl"))
+    assert asyncio.run(replay.handle(BODY, {}))[0] == 404
+
+
+def test_schema_shaped_answer_for_app_prompts():
+    schema = {"fatura_no": "string", "tutar": "number", "kalemler": [{"ad": "string", "adet": "integer"}],
+              "onay": None}
+    assert schema_shaped_response(prompt_generator("schema", schema)) == {
+        "fatura_no": "örnek", "tutar": 0, "kalemler": [{"ad": "örnek", "adet": 0}], "onay": "örnek"}
+    assert schema_shaped_response(prompt_generator("schema", '{"a": "boolean"}')) == {"a": False}
+    assert schema_shaped_response(prompt_generator("field", "fatura_no, tutar:number")) == {
+        "fatura_no": "örnek", "tutar": 0}
@@ -0,0 +1,77 @@
+import io
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+ImageFont = pytest.importorskip("PIL.ImageFont")
+ImageFilter = pytest.importorskip("PIL.ImageFilter")
+
+from page_filter import PageFilter
+
+
+def _page(lines, size=(1700, 2200), shift=(0, 0)):
+    """A 200 DPI A4-like scan with body-size text."""
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=32)
+    for index, line in enumerate(lines):
+        draw.text((120 + shift[0], 120 + index * 60 + shift[1]), line, fill="black", font=font)
+    return image
+
+
+def _jpeg(image, quality=50):
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue())).convert("RGB")
+
+
+LINES = [f"Fatura kalemi {index}: kalem aciklamasi ve tutar {index * 17} TL" for index in range(20)]
+
+
+def test_blank_pages_are_skipped():
+    page_filter = PageFilter()
+    assert page_filter.check(Image.new("RGB", (1700, 2200), "white"), 1) == "blank"
+    assert page_filter.check(Image.new("RGB", (1700, 2200), "black"), 2) == "blank"
+    assert page_filter.check(_page(LINES), 3) is None
+    assert page_filter.skipped == [{"page": 1, "reason": "blank"}, {"page": 2, "reason": "blank"}]
+
+
+def test_repeated_page_is_skipped_but_edited_page_kept():
+    page_filter = PageFilter()
+    assert page_filter.check(_page(LINES), 1) is None
+    assert page_filter.check(_page(LINES), 2) == "duplicate"
+
+    edited = list(LINES)
+    edited[7] = edited[7].replace("119", "118")
+    assert page_filter.check(_page(edited), 3) is None
+    assert page_filter.skipped == [{"page": 2, "reason": "duplicate", "duplicate_of": 1}]
+
+
+@pytest.mark.parametrize("rescan", [
+    lambda: _page(LINES, shift=(2, 2)),
+    lambda: _page(LINES, shift=(9, -7)),
+    lambda: _page(LINES).filter(ImageFilter.GaussianBlur(1)),
+    lambda: _page(LINES, shift=(3, 1)).filter(ImageFilter.GaussianBlur(1)),
+    lambda: _jpeg(_page(LINES, shift=(1, 0))),
+], ids=["shift-2px", "shift-9px", "blur", "shift-blur", "jpeg"])
+def test_rescanned_page_is_skipped(rescan):
+    page_filter = PageFilter()
+    assert page_filter.check(_page(LINES), 1) is None
+    assert page_filter.check(rescan(), 2) == "duplicate"
+
+
+def test_edited_rescan_is_kept():
+    edited = list(LINES)
+    edited[7] = edited[7].replace("119", "118")
+    page_filter = PageFilter()
+    assert page_filter.check(_page(LINES), 1) is None
+    assert page_filter.check(_page(edited, shift=(2, 1)).filter(ImageFilter.GaussianBlur(1)), 2) is None
+
+
+def test_text_pages_compare_normalized_whitespace():
+    page_filter = PageFilter()
+    assert page_filter.check("Toplam:  100 TL\n", 1) is None
+    assert page_filter.check("Toplam: 100 TL", 2) == "duplicate"
+    assert page_filter.check("Toplam: 101 TL", 3) is None
+    assert page_filter.skipped == [{"page": 2, "reason": "duplicate", "duplicate_of": 1}]
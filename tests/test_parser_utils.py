@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+import parser_utils
+import prompt_utils
+from extractor import Extractor
+from parser_utils import _add_validation, _serve_result, _store_result_cache, run_parser
+
+
+class DictCache:
+    def __init__(self):
+        self.entries = {}
+
+    def set(self, key, value):
+        self.entries[key] = value
+
+
+def _serve_and_store(results):
+    cache = DictCache()
+    result = _serve_result(results, 2, "q", "/tmp/a.pdf", "m")
+    _store_result_cache(cache, "key", result)
+    return result, cache.entries
+
+
+def test_parsed_result_is_cached():
+    result, entries = _serve_and_store(['{"no": "A1"}', '{"total": 5}'])
+    assert result["meta"]["failed_batches"] == 0
+    assert result["meta"]["cache"] == "miss"
+    assert entries == {"key": result}
+
+
+def test_partially_failed_results_are_not_cached():
+    for results in (['{"no": "A1"}', "JSON yok"], ['{"no": "A1"}', {"error": "timeout"}], "JSON yok"):
+        result, entries = _serve_and_store(results)
+        assert result["meta"]["failed_batches"] == 1
+        assert entries == {}
+
+
+@pytest.fixture
+def invoice_schema(monkeypatch):
+    def load_schema(name):
+        return {"schema": {"no": "string", "total": "number"}, "version": "1", "merge_policies": None}
+
+    monkeypatch.setattr(prompt_utils, "_load_schema", load_schema)
+    monkeypatch.setattr(prompt_utils.SchemaCache, "_ensure_listener", lambda self: None)
+    monkeypatch.setattr(prompt_utils, "SCHEMA_CACHE", prompt_utils.SchemaCache())
+
+
+def test_run_parser_validates_named_schema(invoice_schema, tmp_path, monkeypatch):
+    document = tmp_path / "a.png"
+    document.write_bytes(b"png")
+    monkeypatch.setattr(Extractor, "run_inference", lambda self, *args: (['{"no": "A1", "total": "12"}'], 1))
+
+    result = run_parser(str(document), "http://llm", "m", "k", query="*", type="schema", schema="invoice",
+                        use_cache=False)
+    assert result["meta"]["validation"] == {
+        "valid": False,
+        "violations": [{"path": "total", "kind": "type_mismatch", "expected": "number", "actual": "str"}],
+        "violation_count": 1
+    }
+    assert prompt_utils.SCHEMA_CACHE.validator("schema", "invoice") is prompt_utils.get_schema_validator(
+        "schema", "invoice")
+
+
+def test_validation_for_field_queries_and_skipped_otherwise():
+    result = _serve_result(['{"no": "A1"}'], 1, "no, total:number", "/tmp/a.pdf", "m")
+    _add_validation(result, "field", "no, total:number", "*")
+    assert result["meta"]["validation"]["violations"] == [{"path": "total", "kind": "missing_key"}]
+
+    result = _serve_result(['{"no": "A1"}'], 1, "*", "/tmp/a.pdf", "m")
+    _add_validation(result, "schema", "*", "*")
+    assert "validation" not in result["meta"]
+
+
+class JsonCache(DictCache):
+    """Round-trips values through JSON like the Redis and disk backends."""
+
+    def get(self, key):
+        value = self.entries.get(key)
+        return json.loads(value) if value else None
+
+    def set(self, key, value):
+        self.entries[key] = json.dumps(value)
+
+
+def test_cache_hit_reports_its_own_timings(tmp_path, monkeypatch):
+    document = tmp_path / "a.png"
+    document.write_bytes(b"png")
+    cache = JsonCache()
+    monkeypatch.setattr(parser_utils, "get_result_cache", lambda: cache)
+
+    def run_inference(self, *args):
+        self.stats = {"timings": {"inference": 5.0}, "retries": {"retries": 2}, "page_cache": {"hits": 0},
+                      "image_encoding": {"bytes": 10}, "batching": {"batches": 1}}
+        return ['{"no": "A1"}'], 1
+
+    monkeypatch.setattr(Extractor, "run_inference", run_inference)
+    miss = run_parser(str(document), "http://llm", "m", "k", file_hash="h")
+    assert miss["meta"]["cache"] == "miss"
+    assert miss["meta"]["retries"] == {"retries": 2}
+
+    hit = run_parser(str(document), "http://llm", "m", "k", file_hash="h")
+    assert hit["no"] == "A1"
+    assert hit["meta"]["cache"] == "hit"
+    assert set(hit["meta"]["timings"]) == {"total"}
+    assert not {"retries", "page_cache", "image_encoding", "batching"} & set(hit["meta"])
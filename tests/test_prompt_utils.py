@@ -0,0 +1,83 @@
+import pytest
+
+import prompt_utils
+from prompt_utils import SchemaCache
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+
+    def load_schema(name):
+        calls.append(name)
+        return {"schema": {"total": "number"}, "version": str(len(calls)), "merge_policies": None}
+
+    monkeypatch.setattr(prompt_utils, "_load_schema", load_schema)
+    monkeypatch.setattr(SchemaCache, "_ensure_listener", lambda self: None)
+    return calls
+
+
+def test_entries_are_cached_until_invalidated(loads):
+    cache = SchemaCache()
+    assert cache.get("invoice")["version"] == "1"
+    assert cache.get("invoice")["version"] == "1"
+    assert loads == ["invoice"]
+
+    cache.invalidate("invoice")
+    assert cache.get("invoice")["version"] == "2"
+
+
+def test_invalidation_during_load_is_not_lost(loads, monkeypatch):
+    cache = SchemaCache()
+    load_schema = prompt_utils._load_schema
+
+    def load_and_invalidate(name):
+        entry = load_schema(name)
+        # Yükleme sürerken coordinator şemayı günceller
+        cache.invalidate(name)
+        return entry
+
+    monkeypatch.setattr(prompt_utils, "_load_schema", load_and_invalidate)
+    assert cache.get("invoice")["version"] == "1"
+
+    monkeypatch.setattr(prompt_utils, "_load_schema", load_schema)
+    assert cache.get("invoice")["version"] == "2"
+    assert cache.get("invoice")["version"] == "2"
+
+
+def test_prompt_cached_per_version(loads):
+    cache = SchemaCache()
+    first = cache.prompt("schema", "invoice")
+    assert cache.prompt("schema", "invoice") is first
+    assert "total" in first
+    cache.invalidate()
+    cache.prompt("schema", "invoice")
+    assert loads == ["invoice", "invoice"]
+
+
+def test_merge_policies_file_read_once(tmp_path, monkeypatch):
+    (tmp_path / "invoice.json").write_text('{"total": "number"}', encoding="utf-8")
+    (tmp_path / "invoice.merge.json").write_text('{"total": "last", "no": "bogus"}', encoding="utf-8")
+    monkeypatch.setattr(prompt_utils, "SCHEMA_DIR", str(tmp_path))
+    monkeypatch.setattr(prompt_utils.redis.Redis, "hgetall", lambda self, key: {})
+    monkeypatch.setattr(SchemaCache, "_ensure_listener", lambda self: None)
+    monkeypatch.setattr(prompt_utils, "SCHEMA_CACHE", SchemaCache())
+
+    assert prompt_utils.get_merge_policies("invoice") == {"total": "last"}
+    (tmp_path / "invoice.merge.json").write_text('{"total": "first"}', encoding="utf-8")
+    # Önbellekteki şema girdisi geçersiz kılınana kadar dosya tekrar okunmaz
+    assert prompt_utils.get_merge_policies("invoice") == {"total": "last"}
+
+    prompt_utils.SCHEMA_CACHE.invalidate("invoice")
+    assert prompt_utils.get_merge_policies("invoice") == {"total": "first"}
+
+
+def test_validator_cached_per_version(loads):
+    cache = SchemaCache()
+    validator = cache.validator("schema", "invoice")
+    assert cache.validator("schema", "invoice") is validator
+    assert validator.check({"total": "x"}) == (True, False)
+
+    cache.invalidate("invoice")
+    assert cache.validator("schema", "invoice") is not validator
+    assert loads == ["invoice", "invoice"]
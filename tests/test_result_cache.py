@@ -0,0 +1,36 @@
+import os
+
+from result_cache import DiskResultCache
+
+
+def test_total_size_is_tracked_without_rescanning(tmp_path, monkeypatch):
+    cache = DiskResultCache(directory=str(tmp_path), max_bytes=10 ** 6)
+    scans = []
+    monkeypatch.setattr(cache, "_scan", lambda: scans.append(1) or [])
+
+    cache.set("a", {"x": 1})
+    cache.set("a", {"x": 12345})
+    cache.set("b", {"x": 1})
+    assert scans == []
+    assert cache.total_bytes == sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path))
+    assert cache.get("a") == {"x": 12345}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskResultCache(directory=str(tmp_path), max_bytes=10 ** 6)
+    for index in range(5):
+        cache.set(str(index), {"payload": "x" * 100})
+        os.utime(tmp_path / f"{index}.json", (index, index))
+    entry_size = os.path.getsize(tmp_path / "0.json")
+
+    # Sınır aşılınca en eski kayıtlar hedef orana inene kadar silinir
+    cache.max_bytes = entry_size * 5
+    cache.set("5", {"payload": "x" * 100})
+    remaining = sorted(name[:-5] for name in os.listdir(tmp_path))
+    assert remaining == ["2", "3", "4", "5"]
+    assert cache.total_bytes == sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path))
+
+
+def test_existing_files_seed_the_total(tmp_path):
+    DiskResultCache(directory=str(tmp_path)).set("a", {"x": 1})
+    assert DiskResultCache(directory=str(tmp_path)).total_bytes == os.path.getsize(tmp_path / "a.json")
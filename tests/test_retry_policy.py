@@ -0,0 +1,114 @@
+import asyncio
+from email.utils import formatdate
+import time
+
+import pytest
+import requests
+
+import retry_policy
+from retry_policy import RetryBudget, RetryPolicy, parse_retry_after
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def _responses(*responses):
+    calls = []
+    responses = list(responses)
+
+    def request():
+        calls.append(1)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    return request, calls
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(retry_policy.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({"retry-after-ms": "1500"}) == 1.5
+    assert parse_retry_after({"Retry-After": "7"}) == 7.0
+    assert parse_retry_after({"Retry-After": "-3"}) == 0.0
+    assert 28 < parse_retry_after({"Retry-After": formatdate(time.time() + 30, usegmt=True)}) <= 30
+    assert parse_retry_after({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "6m0s",
+                              "x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "20ms"}) == 360
+    # Tükenmemiş limitin sıfırlanma süresi dikkate alınmaz
+    assert parse_retry_after({"x-ratelimit-remaining-tokens": "5", "x-ratelimit-reset-tokens": "1s"}) is None
+    assert parse_retry_after({"Retry-After": "soon"}) is None
+
+
+def test_retries_until_success_honoring_retry_after(no_sleep):
+    request, calls = _responses(FakeResponse(503), FakeResponse(429, {"Retry-After": "2"}), FakeResponse(200))
+    policy = RetryPolicy(max_attempts=5, base_delay=0.5, max_delay=10)
+    assert policy.send(request).status_code == 200
+    assert len(calls) == 3
+    assert 0 <= no_sleep[0] <= 0.5
+    assert 2 <= no_sleep[1] <= 2.5
+
+
+def test_non_retryable_and_conflict_returned_immediately(no_sleep):
+    for status in (400, 409):
+        request, calls = _responses(FakeResponse(status), FakeResponse(200))
+        assert RetryPolicy().send(request).status_code == status
+        assert len(calls) == 1
+    assert no_sleep == []
+
+
+def test_retry_after_over_cap_fails_fast(no_sleep):
+    budget = RetryBudget(limit=5)
+    request, calls = _responses(FakeResponse(429, {"Retry-After": "120"}), FakeResponse(200))
+    assert RetryPolicy(max_delay=60).send(request, budget).status_code == 429
+    assert len(calls) == 1
+    assert no_sleep == []
+    assert budget.get_stats() == {"retries": 0, "give_ups": 1, "budget": 5}
+
+
+def test_gives_up_when_attempts_or_budget_run_out():
+    request, calls = _responses(*[FakeResponse(500)] * 3)
+    assert RetryPolicy(max_attempts=3, base_delay=0).send(request).status_code == 500
+    assert len(calls) == 3
+
+    budget = RetryBudget(limit=1)
+    request, calls = _responses(*[FakeResponse(502)] * 5)
+    assert RetryPolicy(max_attempts=5, base_delay=0).send(request, budget).status_code == 502
+    assert len(calls) == 2
+    assert budget.get_stats() == {"retries": 1, "give_ups": 1, "budget": 1}
+
+
+def test_connection_errors_reraised_after_last_attempt():
+    request, calls = _responses(requests.ConnectionError("down"), requests.Timeout("slow"))
+    with pytest.raises(requests.Timeout):
+        RetryPolicy(max_attempts=2, base_delay=0).send(request)
+    assert len(calls) == 2
+
+
+def test_send_async(monkeypatch):
+    sleeps = []
+
+    async def sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(retry_policy.asyncio, "sleep", sleep)
+    responses = [ConnectionError("reset"), FakeResponse(429, {"retry-after-ms": "100"}), FakeResponse(200)]
+
+    async def request():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    policy = RetryPolicy(base_delay=0)
+    response = asyncio.run(policy.send_async(request, retry_exceptions=(ConnectionError,)))
+    assert response.status_code == 200
+    assert sleeps[1] == pytest.approx(0.1)
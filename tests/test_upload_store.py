@@ -0,0 +1,48 @@
+import io
+import os
+import time
+
+from upload_store import UploadStore
+
+
+def _store_file(store, content, age):
+    path, _ = store.save_fileobj(io.BytesIO(content), "doc.pdf")
+    old = time.time() - age
+    os.utime(path, (old, old))
+    return path
+
+
+def test_gc_removes_old_and_oversized_files_but_not_held_ones(tmp_path):
+    store = UploadStore(directory=str(tmp_path), max_age=3600, max_bytes=30)
+    expired = _store_file(store, b"expired", 7200)
+    held = _store_file(store, b"held-and-expired", 7200)
+    oldest = _store_file(store, b"0123456789", 1000)
+    newest = _store_file(store, b"abcdefghij", 900)
+
+    with store.holding(held):
+        result = store.gc()
+
+    assert not os.path.exists(expired)
+    assert not os.path.exists(oldest)
+    assert os.path.exists(held)
+    assert os.path.exists(newest)
+    assert result["removed"] == 2
+
+    store.gc()
+    assert not os.path.exists(held)
+
+
+def test_recent_files_survive_size_limit(tmp_path):
+    store = UploadStore(directory=str(tmp_path), max_bytes=1)
+    path = _store_file(store, b"just uploaded", 0)
+    store.gc()
+    assert os.path.exists(path)
+
+
+def test_same_content_is_stored_once(tmp_path):
+    store = UploadStore(directory=str(tmp_path))
+    first, first_hash = store.save_fileobj(io.BytesIO(b"same"), "a.PDF")
+    second, second_hash = store.save_fileobj(io.BytesIO(b"same"), "b.pdf")
+    assert first == second and first_hash == second_hash
+    assert first.endswith(".pdf")
+    assert len(os.listdir(tmp_path)) == 1
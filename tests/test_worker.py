@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+import requests
+
+import worker
+from worker import DocumentWorker
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self.body = body or {}
+        self.text = str(self.body)
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    """Answers heartbeats from a script of responses/exceptions and records processed posts."""
+
+    def __init__(self, heartbeats):
+        self.heartbeats = list(heartbeats)
+        self.processed = []
+
+    def post(self, url, json=None, params=None, timeout=None):
+        if url.endswith("/api/worker-heartbeat"):
+            reply = self.heartbeats.pop(0) if self.heartbeats else FakeResponse(body={"lease_extended": True})
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+        self.processed.append(json)
+        return FakeResponse()
+
+
+@pytest.fixture
+def make_worker(monkeypatch):
+    monkeypatch.setattr(worker, "LEASE_RETRY_INTERVAL", 0.01)
+
+    def make(heartbeats, lease_timeout=0.2):
+        monkeypatch.setattr(worker, "LEASE_TIMEOUT", lease_timeout)
+        document_worker = DocumentWorker("http://coordinator", "w", "http://llm", "m")
+        document_worker.worker_id = "worker-1"
+        document_worker.heartbeat_interval = 0.02
+        document_worker.session = FakeSession(heartbeats)
+        return document_worker
+
+    return make
+
+
+def _keep_lease_for(document_worker, seconds):
+    stop, lost = threading.Event(), threading.Event()
+    thread = threading.Thread(target=document_worker._keep_lease, args=("doc-1", stop, lost))
+    thread.start()
+    stop.wait(seconds)
+    stop.set()
+    thread.join()
+    return lost.is_set()
+
+
+def test_transient_renewal_error_keeps_result(make_worker, monkeypatch):
+    # İlk yanıt process_document'ın PROCESSING heartbeat'i içindir; ardından iki yenileme başarısız olur
+    document_worker = make_worker([FakeResponse(), requests.ConnectionError("reset"),
+                                   FakeResponse(500, {"detail": "x"})])
+
+    def run_parser(*args, **kwargs):
+        threading.Event().wait(0.15)
+        return {"no": "A1"}
+
+    monkeypatch.setattr(worker, "run_parser", run_parser)
+    assert document_worker.process_document({"id": "doc-1", "path": "/tmp/a.pdf"}) is True
+    assert document_worker.session.heartbeats == []
+    assert [post["result"] for post in document_worker.session.processed] == [{"no": "A1"}]
+
+
+def test_lease_lost_once_deadline_passes(make_worker):
+    errors = [requests.ConnectionError("down")] * 100
+    assert _keep_lease_for(make_worker(errors, lease_timeout=0.1), 0.5) is True
+
+
+def test_refused_renewal_loses_lease_immediately(make_worker):
+    document_worker = make_worker([FakeResponse(body={"lease_extended": False})], lease_timeout=30)
+    assert _keep_lease_for(document_worker, 0.5) is True
@@ -0,0 +1,192 @@
+# upload_store.py
+import os
+import time
+import hashlib
+import zipfile
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from executor_utils import run_blocking
+
+# Yüklenen dosyalar içerik hash'i ile adlandırılarak bu dizinde saklanır
+UPLOAD_DIR = os.environ.get("UPLOAD_STORE_DIR", "./uploads")
+CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+# Bu süreden uzun süredir kullanılmayan dosyalar silinir (saniye)
+MAX_AGE = int(os.environ.get("UPLOAD_STORE_MAX_AGE", 24 * 3600))
+# Dizin bu boyutu aşarsa en eski dosyalardan başlanarak silinir
+MAX_BYTES = int(os.environ.get("UPLOAD_STORE_MAX_BYTES", 5 * 1024 * 1024 * 1024))
+# Bir zip arşivinden en fazla bu kadar dosya ve toplamda bu kadar açılmış bayt kabul edilir
+ARCHIVE_MAX_FILES = int(os.environ.get("UPLOAD_ARCHIVE_MAX_FILES", 500))
+ARCHIVE_MAX_BYTES = int(os.environ.get("UPLOAD_ARCHIVE_MAX_BYTES", 1024 * 1024 * 1024))
+# Temizlik en fazla bu aralıkla, bir yükleme tamamlandığında çalışır (saniye)
+GC_INTERVAL = int(os.environ.get("UPLOAD_STORE_GC_INTERVAL", 600))
+# Yeni kaydedilen dosya, çağıran hold() edene kadar bu süre boyunca temizlikten korunur (saniye)
+GC_GRACE = 300
+
+TEMP_PREFIX = ".upload-"
+
+
+class UploadStore:
+    """Content-addressed upload directory: <sha256><ext>, one copy per distinct file content.
+
+    Files held with hold()/holding() while an extraction reads them are skipped by gc().
+    """
+
+    def __init__(self, directory=None, max_age=MAX_AGE, max_bytes=MAX_BYTES, gc_interval=GC_INTERVAL):
+        self.directory = directory or UPLOAD_DIR
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.gc_interval = gc_interval
+        self._last_gc = 0
+        self._gc_lock = threading.Lock()
+        self._in_use = Counter()
+        self._in_use_lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    async def save(self, upload):
+        """Stream an UploadFile to disk while hashing it; return (path, sha256)."""
+        hasher = hashlib.sha256()
+        temp = tempfile.NamedTemporaryFile(dir=self.directory, prefix=TEMP_PREFIX, delete=False)
+        try:
+            with temp:
+                while True:
+                    chunk = await upload.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    await run_blocking(self._write_chunk, temp, hasher, chunk)
+            file_hash = hasher.hexdigest()
+            path = await run_blocking(self._commit, temp.name, file_hash, upload.filename)
+        except BaseException:
+            if os.path.exists(temp.name):
+                os.remove(temp.name)
+            raise
+
+        if time.time() - self._last_gc >= self.gc_interval:
+            await run_blocking(self.gc)
+        return path, file_hash
+
+    def save_fileobj(self, fileobj, filename):
+        """Blocking variant of save() for file objects such as zip archive members."""
+        hasher = hashlib.sha256()
+        temp = tempfile.NamedTemporaryFile(dir=self.directory, prefix=TEMP_PREFIX, delete=False)
+        try:
+            with temp:
+                for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                    self._write_chunk(temp, hasher, chunk)
+            file_hash = hasher.hexdigest()
+            return self._commit(temp.name, file_hash, filename), file_hash
+        except BaseException:
+            if os.path.exists(temp.name):
+                os.remove(temp.name)
+            raise
+
+    def extract_archive(self, archive_path):
+        """Store every file of a zip archive; return [(member name, path, sha256)] in archive order."""
+        with zipfile.ZipFile(archive_path) as archive:
+            members = [
+                member for member in archive.infolist()
+                if not member.is_dir()
+                and not member.filename.startswith("__MACOSX/")
+                and not os.path.basename(member.filename).startswith(".")
+            ]
+            if len(members) > ARCHIVE_MAX_FILES:
+                raise ValueError(f"Arşivde en fazla {ARCHIVE_MAX_FILES} dosya olabilir ({len(members)} bulundu)")
+            if sum(member.file_size for member in members) > ARCHIVE_MAX_BYTES:
+                raise ValueError(f"Arşivin açılmış boyutu {ARCHIVE_MAX_BYTES} baytı aşıyor")
+
+            stored = []
+            for member in members:
+                with archive.open(member) as fileobj:
+                    path, file_hash = self.save_fileobj(fileobj, member.filename)
+                stored.append((member.filename, path, file_hash))
+            return stored
+
+    def hold(self, *paths):
+        """Mark files as in use so gc() leaves them alone until release()."""
+        with self._in_use_lock:
+            for path in paths:
+                self._in_use[os.path.abspath(path)] += 1
+
+    def release(self, *paths):
+        with self._in_use_lock:
+            for path in paths:
+                key = os.path.abspath(path)
+                self._in_use[key] -= 1
+                if self._in_use[key] <= 0:
+                    del self._in_use[key]
+
+    @contextmanager
+    def holding(self, *paths):
+        self.hold(*paths)
+        try:
+            yield
+        finally:
+            self.release(*paths)
+
+    def _write_chunk(self, temp, hasher, chunk):
+        hasher.update(chunk)
+        temp.write(chunk)
+
+    def _commit(self, temp_path, file_hash, filename):
+        # Uzantı korunur; extractor dosya türünü uzantıdan belirler
+        extension = os.path.splitext(filename or "")[1].lower()
+        path = os.path.join(self.directory, file_hash + extension)
+        if os.path.exists(path):
+            # Aynı içerik zaten var: yeni kopya atılır, mevcut dosya "son kullanılma" için dokunulur
+            os.remove(temp_path)
+            os.utime(path)
+        else:
+            os.replace(temp_path, path)
+        return path
+
+    def gc(self):
+        """Delete files unused for max_age seconds, then the oldest ones until under max_bytes."""
+        if not self._gc_lock.acquire(blocking=False):
+            return {"removed": 0, "bytes": 0}
+        try:
+            self._last_gc = time.time()
+            now = time.time()
+            entries = []
+            for entry in os.scandir(self.directory):
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+
+            removed = 0
+            kept = []
+            for mtime, size, path, name in entries:
+                # Yarıda kalmış yüklemelerin geçici dosyaları bir saat sonra silinir
+                max_age = min(self.max_age, 3600) if name.startswith(TEMP_PREFIX) else self.max_age
+                if now - mtime > max_age and self._remove_unused(path):
+                    removed += 1
+                else:
+                    kept.append((mtime, size, path))
+
+            total = sum(size for _, size, _ in kept)
+            for mtime, size, path in sorted(kept):
+                if total <= self.max_bytes:
+                    break
+                # Yeni kaydedilmiş ya da işlenmekte olan dosyalar sınır aşılsa da silinmez
+                if now - mtime > GC_GRACE and self._remove_unused(path):
+                    removed += 1
+                    total -= size
+
+            if removed:
+                print(f"[i] Yükleme dizininden {removed} dosya silindi")
+            return {"removed": removed, "bytes": total}
+        finally:
+            self._gc_lock.release()
+
+    def _remove_unused(self, path):
+        """Delete a file unless it is held; return True if it is gone."""
+        with self._in_use_lock:
+            if os.path.abspath(path) in self._in_use:
+                return False
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return True
@@ -2,13 +2,14 @@
 import os
 import time
 import json
-import requests
 import uuid
 import argparse
 import sys
+import threading
 from pathlib import Path
 
 from parser_utils import run_parser
+from http_session import get_session, CONNECT_TIMEOUT, READ_TIMEOUT
 import redis
 from redis import ConnectionPool
 
@@ -23,6 +24,16 @@ REDIS_POOL = ConnectionPool(
     socket_connect_timeout=2
 )
 
+# Coordinator'daki WORKER_HEARTBEAT_TIMEOUT'tan (belge kirası) kısa olmalı
+HEARTBEAT_INTERVAL = float(os.environ.get("WORKER_HEARTBEAT_INTERVAL", 10))
+# Belge kirasının süresi; coordinator ile aynı ortam değişkeninden okunur
+LEASE_TIMEOUT = float(os.environ.get("WORKER_HEARTBEAT_TIMEOUT", 30))
+# Başarısız kira yenilemesi kira süresi dolana kadar bu aralıkla tekrar denenir
+LEASE_RETRY_INTERVAL = float(os.environ.get("WORKER_LEASE_RETRY_INTERVAL", 2))
+# Boş kuyrukta coordinator'ın next-document isteğini bekleteceği en uzun süre (long-poll)
+POLL_WAIT = float(os.environ.get("WORKER_POLL_WAIT", 20))
+
+
 class WorkerState:
     IDLE = "idle"
     PROCESSING = "processing"
@@ -32,19 +43,22 @@ class WorkerState:
 
 
 class DocumentWorker:
-    def __init__(self, coordinator_url, worker_name, api_url, model, api_key=None):
+    def __init__(self, coordinator_url, worker_name, api_url, model, api_key=None, poll_wait=POLL_WAIT):
         self.coordinator_url = coordinator_url
         self.worker_name = worker_name
         self.api_url = api_url
         self.model = model
         self.worker_id = None
         self.running = True
-        self.heartbeat_interval = 10  # seconds
+        self.heartbeat_interval = HEARTBEAT_INTERVAL  # seconds
+        self.poll_wait = poll_wait  # seconds
         self.last_heartbeat = 0
         self.current_state = WorkerState.IDLE
 
         # Use the connection pool instead of creating a new connection
         self.redis_client = redis.Redis(connection_pool=REDIS_POOL)
+        # Keep-alive HTTP session shared with the extractor
+        self.session = get_session()
         # API key handling
         if not api_key and "openai.com" in api_url:
             print("WARNING: OpenAI API endpoint specified without API key")
@@ -75,7 +89,7 @@ class DocumentWorker:
         }
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.coordinator_url}/api/register-worker",
                 json=registration_data
             )
@@ -96,12 +110,12 @@ class DocumentWorker:
             print(f"Error registering worker: {e}")
             return False
 
-    def send_heartbeat(self, status=None, document_id=None):
+    def send_heartbeat(self, status=None, document_id=None, force=False):
         """Send heartbeat to coordinator."""
         if status:
             self.current_state = status
 
-        if time.time() - self.last_heartbeat < self.heartbeat_interval:
+        if not force and time.time() - self.last_heartbeat < self.heartbeat_interval:
             return
 
         heartbeat_data = {
@@ -111,7 +125,7 @@ class DocumentWorker:
         }
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.coordinator_url}/api/worker-heartbeat",
                 json=heartbeat_data
             )
@@ -137,8 +151,11 @@ class DocumentWorker:
             return None
 
         try:
-            response = requests.get(
-                f"{self.coordinator_url}/api/next-document/{self.worker_id}"
+            # Okuma zaman aşımı long-poll süresinden uzun tutulur
+            response = self.session.get(
+                f"{self.coordinator_url}/api/next-document/{self.worker_id}",
+                params={"wait": self.poll_wait},
+                timeout=(CONNECT_TIMEOUT, self.poll_wait + READ_TIMEOUT)
             )
 
             if response.status_code != 200:
@@ -165,65 +182,143 @@ class DocumentWorker:
         }
 
         try:
-            requests.post(
+            self.session.post(
                 f"{self.coordinator_url}/api/worker-error",
                 json=error_data
             )
         except Exception as e:
             print(f"Error reporting worker error: {e}")
 
+    def _keep_lease(self, document_id, stop_event, lease_lost):
+        """Extend the document's lease every heartbeat_interval until stop_event is set.
+
+        Runs in a background thread, so it never exits the process or touches current_state.
+        A failed renewal is retried until the lease deadline has passed; lease_lost is set
+        only then, or when the coordinator answers lease_extended: false.
+        """
+        heartbeat_data = {
+            "worker_id": self.worker_id,
+            "status": WorkerState.PROCESSING,
+            "document_id": document_id
+        }
+        # Kira belge alınırken başladı; ilk yenilemeye kadar en fazla LEASE_TIMEOUT geçerlidir
+        lease_deadline = time.time() + LEASE_TIMEOUT
+        wait = self.heartbeat_interval
+        while not stop_event.wait(wait):
+            sent_at = time.time()
+            try:
+                response = self.session.post(
+                    f"{self.coordinator_url}/api/worker-heartbeat",
+                    json=heartbeat_data,
+                    timeout=(CONNECT_TIMEOUT, max(1.0, min(READ_TIMEOUT, lease_deadline - sent_at)))
+                )
+                result = response.json() if response.status_code == 200 else {"error": response.text}
+            except Exception as e:
+                result = {"error": str(e)}
+
+            if result.get("command") in ("shutdown", "remove"):
+                print("Received shutdown/remove command from coordinator")
+                self.running = False
+                lease_lost.set()
+                return
+            if result.get("lease_extended") is False:
+                print(f"[!] Lease for document {document_id} was not extended")
+                lease_lost.set()
+                return
+            if "error" in result:
+                remaining = lease_deadline - time.time()
+                if remaining <= 0:
+                    print(f"[!] Lease for document {document_id} expired: {result['error']}")
+                    lease_lost.set()
+                    return
+                print(f"[!] Lease renewal failed for document {document_id}, retrying "
+                      f"({remaining:.0f}s left): {result['error']}")
+                wait = min(LEASE_RETRY_INTERVAL, remaining)
+                continue
+
+            lease_deadline = sent_at + LEASE_TIMEOUT
+            wait = self.heartbeat_interval
+            self.last_heartbeat = time.time()
+
     # Modify the process_document method in worker.py
     def process_document(self, document):
         """Process a document with the configured LLM."""
         document_id = document["id"]
-        file_path = document["path"]
-        schema_name = document.get("schema_name", "*")
 
         self.send_heartbeat(WorkerState.PROCESSING, document_id)
 
-        try:
-            # Process document using existing parser
-            result = run_parser(
-                file_path,
-                self.api_url,
-                model=self.model,
-                api_key=self.api_key,
-                query="*",
-                type="schema",
-                schema=schema_name
-            )
-
-            is_error = False
-            if isinstance(result, dict) and ("error" in result or "Error" in result or result.get("success") is False):
-                is_error = True
-
-            # Send result to coordinator for MongoDB storage
-            response = requests.post(
-                f"{self.coordinator_url}/api/document-processed",
-                params={
-                    "worker_id": self.worker_id,
-                    "document_id": document_id
-                },
-                json={
-                    "is_error": is_error,
-                    "file_path": file_path,
-                    "schema_name": schema_name,
-                    "result": result
-                }
-            )
-
-            if response.status_code != 200:
-                print(f"Warning: Error storing result in MongoDB: {response.text}")
+        lease_stop = threading.Event()
+        lease_lost = threading.Event()
+        lease_thread = threading.Thread(target=self._keep_lease, args=(document_id, lease_stop, lease_lost),
+                                        daemon=True)
+        lease_thread.start()
 
-            print(f"Document processed: {Path(file_path).name}")
-            self.send_heartbeat(WorkerState.IDLE)
-            return True
+        try:
+            processed = self._process_leased_document(document, lease_lost)
         except Exception as e:
             error_message = f"Error processing document {document_id}: {e}"
             print(error_message)
             self.current_state = WorkerState.ERROR
             self.send_error(error_message, document_id)
             return False
+        finally:
+            lease_stop.set()
+            lease_thread.join()
+
+        self.send_heartbeat(WorkerState.IDLE, force=True)
+        return processed
+
+    def _process_leased_document(self, document, lease_lost):
+        """Run the parser and report the result unless the lease was lost meanwhile."""
+        document_id = document["id"]
+        file_path = document["path"]
+        schema_name = document.get("schema_name", "*")
+
+        # Process document using existing parser
+        result = run_parser(
+            file_path,
+            self.api_url,
+            model=self.model,
+            api_key=self.api_key,
+            query="*",
+            type="schema",
+            schema=schema_name
+        )
+
+        # Kira yenilenemediyse belge yeniden kuyruğa girecek; sonuç gönderilmez
+        if lease_lost.is_set():
+            print(f"[!] Lease lost for document {document_id}, result discarded")
+            return False
+
+        is_error = False
+        if isinstance(result, dict) and ("error" in result or "Error" in result or result.get("success") is False):
+            is_error = True
+
+        # Send result to coordinator for MongoDB storage
+        response = self.session.post(
+            f"{self.coordinator_url}/api/document-processed",
+            params={
+                "worker_id": self.worker_id,
+                "document_id": document_id
+            },
+            json={
+                "is_error": is_error,
+                "file_path": file_path,
+                "schema_name": schema_name,
+                "result": result
+            }
+        )
+
+        if response.status_code == 409:
+            # Kira dolmuş ve belge başka bir worker'a geçmiş; bu sonuç atılır
+            print(f"[!] Lease lost for document {document_id}, result discarded")
+            return False
+
+        if response.status_code != 200:
+            print(f"Warning: Error storing result in MongoDB: {response.text}")
+
+        print(f"Document processed: {Path(file_path).name}")
+        return True
 
     def run(self):
         """Main worker loop."""
@@ -243,10 +338,13 @@ class DocumentWorker:
                         time.sleep(1)
                         continue
 
-                    # Get next document
+                    # Get next document; the coordinator holds the request until one is queued
+                    poll_started = time.time()
                     document = self.get_next_document()
                     if not document:
-                        time.sleep(1)
+                        # Yalnızca hemen dönen boş yanıtlarda (durdurulmuş worker, hata) beklenir
+                        if time.time() - poll_started < 1:
+                            time.sleep(1)
                         continue
 
                     # Process document
@@ -280,6 +378,8 @@ if __name__ == "__main__":
     parser.add_argument("--api-url", default="https://api.openai.com/v1/chat/completions", help="LLM API URL")
     parser.add_argument("--model", default="gpt-4o-mini", help="LLM model name")
     parser.add_argument("--api-key", default="", help="LLM API key")
+    parser.add_argument("--poll-wait", type=float, default=POLL_WAIT,
+                        help="Seconds the coordinator may hold an empty next-document request")
 
 
     args = parser.parse_args()
@@ -290,7 +390,8 @@ if __name__ == "__main__":
         args.name,
         args.api_url,
         args.model,
-        args.api_key
+        args.api_key,
+        poll_wait=args.poll_wait
     )
 
     worker.run()
\ No newline at end of file